@@ -0,0 +1,227 @@
+"""
+asyncio variant of the web page routines
+"""
+import asyncio
+import sqlite3
+import weakref
+import requests
+import web
+import throttle
+import cassette
+from six.moves.urllib.parse import urlsplit
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Per event loop: the aiohttp session, and the in-flight page fetches as
+# url to asyncio.Task
+_sessions = weakref.WeakKeyDictionary()
+_inflight = weakref.WeakKeyDictionary()
+
+async def get_web_page(url, force = False):
+    """
+    Gets a web page from the web, or from the local cache, in case it is
+    cached. Shares the memory and disk caches, the host throttles and the
+    cassette of the web module.
+
+    Concurrent callers for the same URL share a single fetch. Cancelling a
+    caller does not cancel the fetch for the others.
+
+    Without aiohttp, or with a cassette in use, the page is fetched by
+    web.get_web_page() in the event loop's default executor.
+
+    Arguments:
+    url - the URL to retrieve
+    force - if True, overwrite the cache
+
+    Return value:
+    The contents of the web page
+
+    Raises:
+    requests.HTTPError - as for web.get_web_page()
+    """
+    loop = asyncio.get_running_loop()
+
+    if aiohttp is None or web._cassette is not None:
+        return await loop.run_in_executor(None, web.get_web_page, url, force)
+
+    if not force:
+        content = web._web_cache.get(url)
+        if content is not None:
+            return content
+
+    inflight = _inflight.setdefault(loop, dict())
+    task = inflight.get(url)
+    if task is None:
+        task = loop.create_task(_get_web_page(url, force))
+        inflight[url] = task
+        task.add_done_callback(lambda task: inflight.pop(url, None))
+
+    return await asyncio.shield(task)
+
+async def get_web_pages(urls, force = False):
+    """
+    Fetches web pages concurrently (see get_web_page()).
+
+    Return value:
+    List of the page contents, in the order of urls. Pages that could not
+    be fetched are None.
+    """
+    pages = await asyncio.gather(*[get_web_page(url, force) for url in urls],
+                                 return_exceptions = True)
+
+    return [None if isinstance(page, BaseException) else page for page in pages]
+
+async def _get_web_page(url, force):
+    """
+    Gets a web page from the disk cache, or from the web.
+    """
+    loop = asyncio.get_running_loop()
+    disk_cache = web.get_disk_cache()
+
+    if not force and disk_cache is not None:
+        entry = await loop.run_in_executor(None, _disk_get_entry, disk_cache, url)
+        if entry is not None:
+            content, fetched = entry
+            web._web_cache.put(url, content, fetched)
+            return content
+
+    try:
+        status, content = await http_get(url)
+    except (aiohttp.ClientError, asyncio.TimeoutError, throttle.CircuitOpenError):
+        stale = await loop.run_in_executor(None, web._get_stale_web_page, disk_cache, url)
+        if stale is None:
+            raise
+        return stale
+
+    if status in throttle.RETRYABLE_STATUSES:
+        stale = await loop.run_in_executor(None, web._get_stale_web_page, disk_cache, url)
+        if stale is not None:
+            return stale
+
+        # As web.get_web_page() does
+        raise requests.HTTPError("%d Error for url: %s" % (status, url))
+
+    # Only keep good pages
+    if status == 200:
+        web._web_cache.put(url, content)
+
+        if disk_cache is not None:
+            await loop.run_in_executor(None, _disk_put, disk_cache, url, content)
+
+    return content
+
+def _disk_get_entry(disk_cache, url):
+    try:
+        return disk_cache.get_entry(url)
+    except sqlite3.Error:
+        return None
+
+def _disk_put(disk_cache, url, content):
+    try:
+        disk_cache.put(url, content)
+    except sqlite3.Error:
+        pass
+
+def _get_session():
+    """
+    Gets the aiohttp session of the running event loop, created with the
+    web module session settings.
+    """
+    loop = asyncio.get_running_loop()
+
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        connect, read = web._timeout if isinstance(web._timeout, tuple) else (web._timeout, web._timeout)
+        session = aiohttp.ClientSession(
+            connector = aiohttp.TCPConnector(limit = web._max_workers,
+                                             limit_per_host = web._per_host),
+            timeout = aiohttp.ClientTimeout(sock_connect = connect, sock_read = read),
+            headers = web._headers)
+        _sessions[loop] = session
+
+    return session
+
+async def close():
+    """
+    Closes the aiohttp session of the running event loop.
+    """
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+async def http_get(url, allow_redirects = True):
+    """
+    Does an HTTP GET, under the host's policy in throttle.HOST_POLICIES
+    (see web._http_get()). Requires aiohttp.
+
+    Arguments:
+    url - the URL to retrieve
+    allow_redirects - whether to follow redirects
+
+    Return value:
+    (status, content) tuple. After the last retry, the status may be a
+    retryable error status.
+
+    Raises:
+    throttle.CircuitOpenError - the host's circuit breaker is open
+    aiohttp.ClientError, asyncio.TimeoutError - the last retry failed
+    """
+    # The policy of the real host, also when a stand-in serves it
+    host = urlsplit(url).netloc.lower()
+
+    headers = dict()
+    if web._standin:
+        if not allow_redirects:
+            headers[cassette.NO_REDIRECTS_HEADER] = "1"
+        url = cassette.standin_url(web._standin, url)
+
+    host_throttle = throttle.get_throttle(host)
+    retries = host_throttle.policy["retries"]
+    session = _get_session()
+
+    attempt = 0
+    while True:
+        if not host_throttle.breaker.allow():
+            host_throttle.count("rejected")
+            raise throttle.CircuitOpenError(host)
+
+        try:
+            delay = host_throttle.bucket.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            host_throttle.count("throttled_seconds", delay)
+            host_throttle.count("requests")
+
+            async with session.get(url, allow_redirects = allow_redirects, headers = headers) as r:
+                status = r.status
+                content = await r.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            host_throttle.count("failures")
+            host_throttle.breaker.failure()
+            if attempt >= retries:
+                raise
+        except Exception:
+            # Not retried, e.g. an invalid URL, but still a failure
+            host_throttle.count("failures")
+            host_throttle.breaker.failure()
+            raise
+        except BaseException:
+            # Cancelled, e.g. by a timeout of the caller
+            host_throttle.breaker.cancel()
+            raise
+        else:
+            if status not in throttle.RETRYABLE_STATUSES:
+                host_throttle.breaker.success()
+                return status, content
+
+            host_throttle.count("failures")
+            host_throttle.breaker.failure()
+            if attempt >= retries:
+                return status, content
+
+        await asyncio.sleep(host_throttle.backoff(attempt))
+        host_throttle.count("retries")
+        attempt += 1
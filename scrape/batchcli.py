@@ -0,0 +1,204 @@
+"""
+Multi-ticker command line support for the scrapers: ticker lists from the
+command line, a file or stdin, fetched concurrently, and streamed as table,
+NDJSON or CSV records as each ticker completes.
+"""
+import sys
+import csv
+import json
+import math
+import datetime
+import concurrent.futures
+import numpy as np
+import pandas as pd
+from tabulate import tabulate
+import web
+
+# Exit codes
+EXIT_OK = 0
+EXIT_FAILED = 1        # Some tickers failed
+EXIT_ALL_FAILED = 3    # Every ticker failed (2 is argparse's usage error)
+
+FORMATS = ("table", "ndjson", "csv")
+
+CSV_COLUMNS = ["Ticker", "Row", "Column", "Value", "Error"]
+
+def add_arguments(parser):
+    """
+    Adds the ticker list and output arguments to a subcommand parser.
+    """
+    parser.add_argument('tickers', nargs='*', metavar='ticker', help='Tickers')
+    parser.add_argument('--file', metavar='FILE', help="Read more tickers from a file, one per line ('-' for stdin)")
+    parser.add_argument('--format', choices=FORMATS, default='table', help='Output format (default table)')
+    parser.add_argument('--workers', type=int, help='Concurrent tickers (default: web._max_workers)')
+
+def read_tickers(args):
+    """
+    Returns the tickers of the command line and of the --file list, upper
+    case, without duplicates. Blank lines and '#' comments are skipped.
+    """
+    tickers = list(args.tickers)
+
+    if args.file:
+        f = sys.stdin if args.file == '-' else open(args.file)
+        try:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if line:
+                    tickers.extend(line.replace(',', ' ').split())
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+    seen = set()
+    result = list()
+    for ticker in tickers:
+        ticker = ticker.upper()
+        if ticker not in seen:
+            seen.add(ticker)
+            result.append(ticker)
+
+    return result
+
+def _value(value):
+    """
+    Converts a cell to a JSON value.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (float, np.floating)):
+        return None if math.isnan(value) else float(value)
+    if isinstance(value, (np.integer, np.bool_)):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, datetime.datetime, datetime.date)):
+        return None if pd.isnull(value) else value.isoformat()
+    if value is pd.NaT:
+        return None
+
+    return value if isinstance(value, (str, int, bool)) else str(value)
+
+class _Writer(object):
+    """
+    Writes the per-ticker results in one of FORMATS.
+    """
+    def __init__(self, fmt, single, out = None):
+        self.fmt = fmt
+        self.single = single
+        self.out = out or sys.stdout
+
+        if fmt == "csv":
+            self.csv = csv.writer(self.out, lineterminator = "\n")
+            self.csv.writerow(CSV_COLUMNS)
+
+    def result(self, ticker, result):
+        if self.fmt == "table":
+            self._table(ticker, result)
+        elif isinstance(result, pd.DataFrame):
+            for label, row in result.iterrows():
+                self._record(ticker, label, [(column, row[column]) for column in result.columns])
+        else:
+            self._record(ticker, None, [("Value", result)])
+
+        self.out.flush()
+
+    def error(self, ticker, message):
+        if self.fmt == "table":
+            sys.stderr.write("%s: %s\n" % (ticker, message))
+        elif self.fmt == "ndjson":
+            self.out.write(json.dumps({ "Ticker": ticker, "Error": message }) + "\n")
+        else:
+            self.csv.writerow([ticker, "", "", "", message])
+
+        self.out.flush()
+
+    def _table(self, ticker, result):
+        if not self.single:
+            self.out.write("%s\n" % ticker)
+
+        if isinstance(result, pd.DataFrame):
+            self.out.write(tabulate(result, headers='keys', tablefmt='psql') + "\n")
+        else:
+            self.out.write("%s\n" % result)
+
+    def _record(self, ticker, label, cells):
+        if self.fmt == "ndjson":
+            record = { "Ticker": ticker }
+            if label is not None:
+                record["Row"] = _value(label)
+            for column, value in cells:
+                record[str(column)] = _value(value)
+            self.out.write(json.dumps(record) + "\n")
+        else:
+            for column, value in cells:
+                value = _value(value)
+                self.csv.writerow([ticker, "" if label is None else _value(label), column,
+                                   "" if value is None else value, ""])
+
+def _is_empty(result):
+    if result is None:
+        return True
+    if isinstance(result, pd.DataFrame):
+        return result.empty
+
+    return result == ""
+
+def run(function, args, chunk_size = None):
+    """
+    Runs function for the tickers of the command line, concurrently, and
+    writes each result as it completes. Tickers whose function raises, or
+    returns None, "" or an empty DataFrame, get an error record.
+
+    Arguments:
+    function - called as function(ticker), returns a DataFrame or a string.
+        With chunk_size, called as function(tickers) for lists of up to
+        chunk_size tickers, returns a dict of ticker to result.
+    args - the parsed arguments (see add_arguments())
+    chunk_size - the number of tickers per call, for functions fetching
+        several tickers per request. Default: one ticker per call
+
+    Return value:
+    The exit code: EXIT_OK, EXIT_FAILED or EXIT_ALL_FAILED
+    """
+    tickers = read_tickers(args)
+    if not tickers:
+        sys.stderr.write("No tickers\n")
+        return EXIT_ALL_FAILED
+
+    if chunk_size:
+        chunks = [tickers[i:i + chunk_size] for i in range(0, len(tickers), chunk_size)]
+    else:
+        chunks = [[ticker] for ticker in tickers]
+
+    writer = _Writer(args.format, len(tickers) == 1)
+    workers = args.workers or web._max_workers
+    failed = 0
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers = workers) as executor:
+        if chunk_size:
+            futures = dict((executor.submit(function, chunk), chunk) for chunk in chunks)
+        else:
+            futures = dict((executor.submit(function, chunk[0]), chunk) for chunk in chunks)
+
+        for future in concurrent.futures.as_completed(futures):
+            chunk = futures.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += len(chunk)
+                for ticker in chunk:
+                    writer.error(ticker, "%s: %s" % (type(e).__name__, e))
+                continue
+
+            results = result if chunk_size else { chunk[0]: result }
+            for ticker in chunk:
+                result = results.get(ticker)
+                if _is_empty(result):
+                    failed += 1
+                    writer.error(ticker, "No data")
+                else:
+                    writer.result(ticker, result)
+
+    if failed == 0:
+        return EXIT_OK
+
+    return EXIT_ALL_FAILED if failed == len(tickers) else EXIT_FAILED
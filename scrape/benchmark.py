@@ -0,0 +1,412 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import glob
+import json
+import time
+import inspect
+import argparse
+import tracemalloc
+from bs4 import BeautifulSoup
+import pandas as pd
+from tabulate import tabulate
+import web
+import tickerdb
+import morningstar
+import cassette
+from six.moves.urllib.parse import urlsplit, parse_qs
+
+"""
+Module for benchmarking the scrapers over saved web pages.
+"""
+
+def _soup_tables(web_page):
+    """
+    Reference table extraction: BeautifulSoup parse, and per-cell df.iat
+    fills. This is how web.get_web_page_table worked before the lxml
+    table extraction.
+    """
+    soup = BeautifulSoup(web_page, 'lxml')
+
+    dfs = list()
+    for table in soup.find_all('table'):
+        row_count = len(table.find_all('tr'))
+        column_count = 0
+
+        for row in table.find_all('tr'):
+            column_idx = len(row.find_all('th')) + len(row.find_all('td'))
+            if column_count < column_idx:
+                column_count = column_idx
+
+        df = pd.DataFrame(columns = range(column_count), 
+                          index = range(row_count))
+
+        row_idx = 0
+        for row in table.find_all('tr'):
+            column_idx = 0
+            for column in row.find_all('th') + row.find_all('td'):
+                df.iat[row_idx, column_idx] = column.get_text()
+                column_idx += 1
+            row_idx += 1
+
+        dfs.append(df)
+
+    return dfs
+
+def _lxml_tables(web_page):
+    """
+    Table extraction as done by web.get_web_page_table.
+    """
+    tree = web.parse_html(web_page)
+
+    return [web.table_to_dataframe(table) for table in tree.iter("table")]
+
+def _time(f, arg, repeat):
+    """
+    Returns the result of f(arg), and the median time of repeat calls.
+    """
+    times = list()
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = f(arg)
+        times.append(time.perf_counter() - start)
+
+    times.sort()
+    return result, times[len(times) // 2]
+
+def _same_tables(dfs1, dfs2):
+    if len(dfs1) != len(dfs2):
+        return False
+
+    for df1, df2 in zip(dfs1, dfs2):
+        if df1.shape != df2.shape:
+            return False
+        if not df1.fillna("").astype(str).equals(df2.fillna("").astype(str)):
+            return False
+
+    return True
+
+def benchmark_tables(path, repeat = 5):
+    """
+    Description:
+    Times the table extraction of saved web pages, with the reference
+    BeautifulSoup extraction and with the lxml extraction.
+
+    Parameters:
+    path - directory of saved web pages (*.htm, *.html), or a single page
+    repeat - the number of timed runs per page
+
+    Returns:
+    DataFrame with one row per page: table count, median times in ms,
+    speedup, and whether both extractions returned the same tables.
+    """
+    if os.path.isdir(path):
+        files = sorted(glob.glob(os.path.join(path, "*.htm*")))
+    else:
+        files = [path]
+
+    rows = list()
+    for fname in files:
+        with open(fname, "rb") as f:
+            web_page = f.read()
+
+        dfs1, t1 = _time(_soup_tables, web_page, repeat)
+        dfs2, t2 = _time(_lxml_tables, web_page, repeat)
+
+        rows.append([os.path.basename(fname), len(dfs2),
+                     round(t1 * 1000, 2), round(t2 * 1000, 2),
+                     round(t1 / t2, 1) if t2 else None,
+                     _same_tables(dfs1, dfs2)])
+
+    return pd.DataFrame(rows, columns = ["Page", "Tables", "Soup ms", "Lxml ms", "Speedup", "Same"])
+
+# Scrapers not benchmarked: their results are cached per ticker, or stored
+_SKIPPED_FUNCTIONS = ("ticker_type", "ticker_name", "update_historical_returns")
+
+def scraper_functions():
+    """
+    Returns the list of (name, function) of the public morningstar.py
+    functions taking a ticker as first parameter.
+    """
+    functions = list()
+    for name, f in inspect.getmembers(morningstar, inspect.isfunction):
+        if name.startswith("_") or name in _SKIPPED_FUNCTIONS:
+            continue
+        if f.__module__ != morningstar.__name__ or inspect.iscoroutinefunction(f):
+            continue
+
+        params = list(inspect.signature(f).parameters)
+        if params and params[0] == "ticker":
+            functions.append((name, f))
+
+    return functions
+
+def archive_tickers(archive):
+    """
+    Returns the tickers whose Morningstar type probe is in an archive.
+    """
+    tickers = list()
+    for url, allow_redirects, status, size in cassette.Cassette(archive).urls():
+        parts = urlsplit(url)
+        if parts.path.lower() == "/quote/quote.aspx":
+            for ticker in parse_qs(parts.query).get("ticker", []):
+                if ticker not in tickers:
+                    tickers.append(ticker)
+
+    return tickers
+
+def _percentile(values, percent):
+    values = sorted(values)
+    idx = int(round((len(values) - 1) * percent / 100.0))
+    return values[idx]
+
+def _replay(archive):
+    """
+    Replays an archive without the persistent ticker store, so that ticker
+    types come from the archive, and archive results are not stored.
+
+    Return value:
+    The ticker store path, to pass to _eject()
+    """
+    web.use_cassette(archive, "replay", latency = 0)
+
+    store_path = tickerdb._store_path
+    tickerdb.set_store(None)
+
+    return store_path
+
+def _eject(store_path):
+    """
+    Ends a _replay(), restoring the ticker store.
+    """
+    web.eject_cassette()
+    tickerdb.set_store(store_path)
+
+def benchmark_scrapers(archive, tickers = None, repeat = 5, functions = None):
+    """
+    Description:
+    Runs the morningstar.py scrapers over the pages of an archive (see
+    cassette.py), without the network. Pages are replayed with no latency
+    and kept in memory, and the parse cache is disabled, so the times are
+    those of parsing the pages and building the DataFrames.
+
+    Parameters:
+    archive - the archive file, recorded with 'morningstar.py --record'
+    tickers - list of tickers. Default: all tickers in the archive
+    repeat - the number of timed runs per function and ticker
+    functions - list of function names. Default: see scraper_functions()
+
+    Returns:
+    DataFrame with one row per function and ticker type: the number of
+    runs, the parse latency percentiles in ms, and the peak and retained
+    memory allocated by one run, in KB. Failed runs are counted in
+    'Errors'.
+    """
+    if tickers is None:
+        tickers = archive_tickers(archive)
+
+    scrapers = scraper_functions()
+    if functions:
+        scrapers = [(name, f) for name, f in scrapers if name in functions]
+
+    store_path = _replay(archive)
+    cache_size = web._parse_cache_size
+    web.set_parse_cache_size(0)
+
+    # Maps (function, ticker type) to the list of times, peaks and retained
+    results = dict()
+
+    try:
+        for ticker in tickers:
+            try:
+                tt = morningstar.ticker_type(ticker)
+            except Exception:
+                continue
+
+            for name, f in scrapers:
+                result = results.setdefault((name, tt), { "times": list(),
+                                                          "peaks": list(),
+                                                          "retained": list(),
+                                                          "errors": 0 })
+
+                # Warm up, fetching the pages into memory
+                try:
+                    if f(ticker) is None:
+                        continue
+                except Exception:
+                    result["errors"] += 1
+                    continue
+
+                for i in range(repeat):
+                    start = time.perf_counter()
+                    f(ticker)
+                    result["times"].append(time.perf_counter() - start)
+
+                tracemalloc.start()
+                try:
+                    before = tracemalloc.get_traced_memory()[0]
+                    df = f(ticker)
+                    current, peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+                del df
+
+                result["peaks"].append(peak - before)
+                result["retained"].append(current - before)
+    finally:
+        web.set_parse_cache_size(cache_size)
+        _eject(store_path)
+
+    rows = list()
+    for (name, tt), result in sorted(results.items()):
+        times = result["times"]
+        if not times and not result["errors"]:
+            continue
+
+        row = [name, tt, len(times)]
+        if times:
+            row += [round(_percentile(times, p) * 1000, 3) for p in (50, 90, 99)]
+            row += [round(max(result["peaks"]) / 1024.0, 1),
+                    round(max(result["retained"]) / 1024.0, 1)]
+        else:
+            row += [None] * 5
+        row.append(result["errors"])
+        rows.append(row)
+
+    return pd.DataFrame(rows, columns = ["Function", "Type", "Runs", "p50 ms", "p90 ms", "p99 ms",
+                                         "Peak KB", "Retained KB", "Errors"])
+
+def _json_number(value):
+    return None if pd.isnull(value) else float(value)
+
+def save_baseline(df, fname):
+    """
+    Saves the p50 latency and peak memory of benchmark_scrapers() results.
+    """
+    baseline = dict()
+    for i in range(df.shape[0]):
+        key = "%s/%s" % (df.iloc[i]["Function"], df.iloc[i]["Type"])
+        baseline[key] = { "p50 ms": _json_number(df.iloc[i]["p50 ms"]),
+                          "Peak KB": _json_number(df.iloc[i]["Peak KB"]),
+                          "Errors": int(df.iloc[i]["Errors"]) }
+
+    with open(fname, "w") as f:
+        json.dump(baseline, f, indent = 1, sort_keys = True)
+
+def compare_baseline(df, fname, tolerance = 0.25):
+    """
+    Description:
+    Compares benchmark_scrapers() results to a baseline saved by
+    save_baseline().
+
+    Parameters:
+    df - the benchmark_scrapers() results
+    fname - the baseline file
+    tolerance - the relative increase over the baseline that is a regression
+
+    Returns:
+    The results, with the baseline p50 latency and peak memory, their
+    relative change, and a 'Regression' column. More errors than in the
+    baseline are a regression too.
+    """
+    with open(fname) as f:
+        baseline = json.load(f)
+
+    df = df.copy()
+    base_p50 = list()
+    base_peak = list()
+    base_errors = list()
+    for i in range(df.shape[0]):
+        entry = baseline.get("%s/%s" % (df.iloc[i]["Function"], df.iloc[i]["Type"]), dict())
+        base_p50.append(entry.get("p50 ms"))
+        base_peak.append(entry.get("Peak KB"))
+        base_errors.append(entry.get("Errors", 0))
+
+    df["Base p50 ms"] = pd.to_numeric(pd.Series(base_p50, index = df.index), errors = "coerce")
+    df["Base Peak KB"] = pd.to_numeric(pd.Series(base_peak, index = df.index), errors = "coerce")
+    df["p50 change"] = (df["p50 ms"] / df["Base p50 ms"] - 1).round(2)
+    df["Peak change"] = (df["Peak KB"] / df["Base Peak KB"] - 1).round(2)
+    df["Regression"] = ((df["p50 change"] > tolerance) | (df["Peak change"] > tolerance) |
+                        (df["Errors"] > pd.Series(base_errors, index = df.index)))
+
+    return df
+
+def validate_specs(archive, tickers = None):
+    """
+    Checks the morningstar.py table specs against the pages of an archive.
+
+    Arguments:
+    archive - archive recorded with 'morningstar.py --record'
+    tickers - the tickers to check. Default: all tickers in the archive
+
+    Return value:
+    DataFrame with one row per problem (see morningstar.validate_specs())
+    """
+    if tickers is None:
+        tickers = archive_tickers(archive)
+
+    store_path = _replay(archive)
+    try:
+        return morningstar.validate_specs(tickers)
+    finally:
+        _eject(store_path)
+
+def _parse_tables_f(args):
+    df = benchmark_tables(args.path, args.repeat)
+    print(tabulate(df, headers='keys', tablefmt='psql', showindex=False))
+
+    if not df["Same"].all():
+        sys.exit(1)
+
+def _parse_scrapers_f(args):
+    tickers = args.tickers if args.tickers else None
+    df = benchmark_scrapers(args.archive, tickers, args.repeat, args.function)
+
+    if args.save_baseline:
+        save_baseline(df, args.save_baseline)
+
+    if args.baseline:
+        df = compare_baseline(df, args.baseline, args.tolerance)
+
+    print(tabulate(df, headers='keys', tablefmt='psql', showindex=False))
+
+    if args.baseline and df["Regression"].any():
+        sys.exit(1)
+
+def _parse_specs_f(args):
+    tickers = args.tickers if args.tickers else None
+    df = validate_specs(args.archive, tickers)
+    print(tabulate(df, headers='keys', tablefmt='psql', showindex=False))
+
+    if len(df.index):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the scrapers over saved web pages.')
+
+    # Subparsers
+    subparsers = parser.add_subparsers(help='Sub-command help')
+
+    parser_tables = subparsers.add_parser('tables', help='Table extraction, BeautifulSoup vs lxml')
+    parser_tables.add_argument('path', help='Directory of saved pages, or a single page')
+    parser_tables.add_argument('-r', '--repeat', type=int, default=5, help='Timed runs per page (default 5)')
+    parser_tables.set_defaults(func=_parse_tables_f)
+
+    parser_scrapers = subparsers.add_parser('scrapers', help='morningstar.py scrapers over an archive')
+    parser_scrapers.add_argument('archive', help='Archive recorded with morningstar.py --record')
+    parser_scrapers.add_argument('tickers', nargs='*', help='Tickers (default: all tickers in the archive)')
+    parser_scrapers.add_argument('-r', '--repeat', type=int, default=5, help='Timed runs per function and ticker (default 5)')
+    parser_scrapers.add_argument('-f', '--function', action='append', help='Function to run (default: all)')
+    parser_scrapers.add_argument('-s', '--save-baseline', metavar='FILE', help='Save the results as baseline')
+    parser_scrapers.add_argument('-b', '--baseline', metavar='FILE', help='Compare to a baseline, exit 1 on regressions')
+    parser_scrapers.add_argument('-t', '--tolerance', type=float, default=0.25, help='Relative increase that is a regression (default 0.25)')
+    parser_scrapers.set_defaults(func=_parse_scrapers_f)
+
+    parser_specs = subparsers.add_parser('specs', help='Check the morningstar.py table specs over an archive, exit 1 on problems')
+    parser_specs.add_argument('archive', help='Archive recorded with morningstar.py --record')
+    parser_specs.add_argument('tickers', nargs='*', help='Tickers (default: all tickers in the archive)')
+    parser_specs.set_defaults(func=_parse_specs_f)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+
+import sys
+import json
+import time
+import hashlib
+import zipfile
+import argparse
+import threading
+import requests
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.parse import urlsplit
+from tabulate import tabulate
+
+"""
+Module for recording web responses into a portable archive, and replaying
+them without the network.
+
+The archive is a zip file with an 'index.json' list of responses, and the
+response bodies stored once per SHA-1 digest under 'pages/'.
+"""
+
+class CassetteMiss(requests.ConnectionError):
+    """
+    Raised on replay when a URL is not in the archive.
+    """
+    pass
+
+class Cassette(object):
+    """
+    A set of recorded responses, keyed by URL and by whether redirects were
+    followed.
+    """
+    def __init__(self, path, mode = "replay", latency = None):
+        """
+        Arguments:
+        path - the archive file
+        mode - "record" to add responses to the archive (created if it
+            does not exist), or "replay" to serve responses from it
+        latency - on replay, None to sleep the recorded response time, or
+            the number of seconds to sleep per response (0 for none)
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError("Unknown cassette mode '%s'" % mode)
+
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.hits = 0
+        self.misses = 0
+
+        # Maps (url, allow_redirects) to the response dict
+        self._responses = dict()
+        # Maps digest to body
+        self._bodies = dict()
+        self._lock = threading.Lock()
+
+        try:
+            self._load()
+        except IOError:
+            if mode == "replay":
+                raise
+
+    def _load(self):
+        with zipfile.ZipFile(self.path) as archive:
+            for response in json.loads(archive.read("index.json").decode("utf-8")):
+                digest = response["digest"]
+                if digest not in self._bodies:
+                    self._bodies[digest] = archive.read("pages/" + digest)
+                self._responses[(response["url"], response["allow_redirects"])] = response
+
+    def save(self):
+        """
+        Writes the archive.
+        """
+        with self._lock:
+            responses = sorted(self._responses.values(),
+                               key = lambda r: (r["url"], r["allow_redirects"]))
+
+            with zipfile.ZipFile(self.path, "w", zipfile.ZIP_DEFLATED) as archive:
+                archive.writestr("index.json", json.dumps(responses, indent = 1))
+                for digest, body in self._bodies.items():
+                    archive.writestr("pages/" + digest, body)
+
+    def add(self, url, allow_redirects, status, headers, body, elapsed):
+        """
+        Adds a response to the cassette, replacing any previous one.
+
+        Arguments:
+        url - the requested URL
+        allow_redirects - whether redirects were followed
+        status - the HTTP status
+        headers - dict of response headers worth keeping
+        body - the response body, in bytes
+        elapsed - the response time, in seconds
+        """
+        digest = hashlib.sha1(body).hexdigest()
+
+        with self._lock:
+            self._bodies[digest] = body
+            self._responses[(url, allow_redirects)] = {
+                "url": url,
+                "allow_redirects": allow_redirects,
+                "status": status,
+                "headers": headers,
+                "digest": digest,
+                "elapsed": elapsed }
+
+    def add_page(self, url, body):
+        """
+        Adds a page obtained from a cache, unless the URL was already added.
+        """
+        with self._lock:
+            if (url, True) in self._responses:
+                return
+
+        self.add(url, True, 200, dict(), body, 0.0)
+
+    def add_response(self, url, allow_redirects, r):
+        """
+        Adds a requests.Response to the cassette.
+        """
+        headers = dict()
+        for header in ("Location", "Content-Type"):
+            if header in r.headers:
+                headers[header] = r.headers[header]
+
+        self.add(url, allow_redirects, r.status_code, headers, r.content,
+                 r.elapsed.total_seconds())
+
+    def lookup(self, url, allow_redirects = True):
+        """
+        Gets a recorded response.
+
+        Return value:
+        (response dict, body) tuple, or None if the URL was not recorded.
+        Without an entry for allow_redirects, the other entry is used.
+        """
+        with self._lock:
+            response = self._responses.get((url, allow_redirects))
+            if response is None:
+                response = self._responses.get((url, not allow_redirects))
+
+            if response is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return response, self._bodies[response["digest"]]
+
+    def replay(self, url, allow_redirects = True):
+        """
+        Serves a recorded response, after the simulated latency.
+
+        Return value:
+        The requests.Response
+
+        Raises:
+        CassetteMiss - the URL was not recorded
+        """
+        entry = self.lookup(url, allow_redirects)
+        if entry is None:
+            raise CassetteMiss("URL not in cassette '%s': %s" % (self.path, url))
+
+        response, body = entry
+
+        latency = response["elapsed"] if self.latency is None else self.latency
+        if latency > 0:
+            time.sleep(latency)
+
+        r = requests.Response()
+        r.url = url
+        r.status_code = response["status"]
+        r.headers.update(response["headers"])
+        r._content = body
+        r.encoding = None
+
+        return r
+
+    def urls(self):
+        """
+        Returns the list of (url, allow_redirects, status, size) of the
+        recorded responses.
+        """
+        with self._lock:
+            return [(r["url"], r["allow_redirects"], r["status"], len(self._bodies[r["digest"]]))
+                    for r in sorted(self._responses.values(), key = lambda r: r["url"])]
+
+#---------------------------------------------------------------------------
+# The stand-in HTTP server
+
+# Request header sent when redirects are not followed
+NO_REDIRECTS_HEADER = "X-Cassette-No-Redirects"
+
+def standin_url(base_url, url):
+    """
+    Maps a URL to its URL on the stand-in server:
+    scheme://host/path?query becomes base_url/scheme/host/path?query
+    """
+    parts = urlsplit(url)
+    standin = "%s/%s/%s%s" % (base_url.rstrip("/"), parts.scheme, parts.netloc, parts.path or "/")
+    if parts.query:
+        standin += "?" + parts.query
+    return standin
+
+def _original_url(path):
+    """
+    Maps a stand-in server request path back to the original URL. Absolute
+    URLs, as sent to HTTP proxies, are returned as is.
+    """
+    if path.startswith("http://") or path.startswith("https://"):
+        return path
+
+    parts = path.lstrip("/").split("/", 2)
+    if len(parts) < 2:
+        return None
+
+    if len(parts) == 2:
+        parts.append("")
+
+    return "%s://%s/%s" % (parts[0], parts[1], parts[2])
+
+class _StandinHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = _original_url(self.path)
+        allow_redirects = self.headers.get(NO_REDIRECTS_HEADER) is None
+
+        entry = None
+        if url is not None:
+            entry = self.server.cassette.lookup(url, allow_redirects)
+
+        if entry is None:
+            self.send_error(404, "Not in cassette")
+            return
+
+        response, body = entry
+
+        latency = response["elapsed"] if self.server.cassette.latency is None else self.server.cassette.latency
+        if latency > 0:
+            time.sleep(latency)
+
+        self.send_response(response["status"])
+        for header, value in response["headers"].items():
+            self.send_header(header, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+class _StandinServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+def serve(path, host = "127.0.0.1", port = 8080, latency = 0, verbose = False, background = False):
+    """
+    Description:
+    Serves an archive over HTTP. Original URLs are requested as
+    http://host:port/scheme/host/path?query (see standin_url()), or as
+    absolute URLs when the server is used as an HTTP proxy.
+
+    Parameters:
+    path - the archive file
+    host, port - the address to listen on. Port 0 picks a free port.
+    latency - None to sleep the recorded response times, or the number of
+        seconds to sleep per response
+    verbose - if True, log the requests
+    background - if True, serve from a daemon thread and return the server
+
+    Returns:
+    The server, if background is True. Its base URL is
+    "http://%s:%d" % server.server_address
+    """
+    server = _StandinServer((host, port), _StandinHandler)
+    server.cassette = Cassette(path, "replay", latency)
+    server.verbose = verbose
+
+    if background:
+        thread = threading.Thread(target = server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+def _parse_list_f(args):
+    cassette = Cassette(args.archive)
+    print(tabulate(cassette.urls(), headers=["URL", "Redirects", "Status", "Bytes"], tablefmt='psql'))
+
+def _parse_serve_f(args):
+    print("Serving %s on http://%s:%d" % (args.archive, args.host, args.port))
+    sys.stdout.flush()
+    serve(args.archive, args.host, args.port, args.latency, verbose = True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Web response archives.')
+
+    # Subparsers
+    subparsers = parser.add_subparsers(help='Sub-command help')
+
+    parser_list = subparsers.add_parser('list', help='List the responses of an archive')
+    parser_list.add_argument('archive', help='Archive file')
+    parser_list.set_defaults(func=_parse_list_f)
+
+    parser_serve = subparsers.add_parser('serve', help='Serve an archive over HTTP')
+    parser_serve.add_argument('archive', help='Archive file')
+    parser_serve.add_argument('--host', default='127.0.0.1', help='Address to listen on (default 127.0.0.1)')
+    parser_serve.add_argument('-p', '--port', type=int, default=8080, help='Port (default 8080)')
+    parser_serve.add_argument('-l', '--latency', type=float, default=None, help='Seconds per response (default: recorded)')
+    parser_serve.set_defaults(func=_parse_serve_f)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -1,11 +1,11 @@
 #!/usr/bin/env python
 
 import sys
-import requests
 from bs4 import BeautifulSoup
 import pandas as pd
-from tabulate import tabulate
 import web
+import batchcli
+import tickerdb
 import argparse
 import unidecode
 import json
@@ -18,6 +18,15 @@ Module for parsing Morningstar web data.
 _ticker_cache = dict()
 _name_cache = dict()
 
+# The ticker store source name
+_SOURCE = "fidelity"
+
+# The Fidelity quote URL, followed by comma separated symbols
+_QUOTE_URL = "https://fastquote.fidelity.com/service/quote/json?productid=embeddedquotes&symbols="
+
+# Symbols per quote request
+_QUOTES_PER_REQUEST = 50
+
 def ticker_type(ticker):
     """
     Description:
@@ -35,49 +44,13 @@ def ticker_type(ticker):
     if ticker.lower() == "cash":
         return "Cash"
 
-    if ticker in _ticker_cache:
-        return(_ticker_cache[ticker])
-    
-    # The Fidelity URL 
-    url = "https://fastquote.fidelity.com/service/quote/json?productid=embeddedquotes&symbols="
-    
-    # Get the page
-    r = web.get_web_page(url + ticker, False)
-    #print(r[1:-1])
-    
-    # Strip the '(' at beginning and the ')' at end
-    data = json.loads(r[1:-1])
-    #print(data)
-    
-    if (data["STATUS"]["ERROR_CODE"] != "0"):
-        _ticker_cache[ticker] = ""
-        return ""
-        
-    try:
-        fstype = data["QUOTES"][ticker]["SECURITY_TYPE"]
-    except:
-        _ticker_cache[ticker] = ""
-        return ""
-        
-    if fstype == "Equity":
-        fitype = ""
-        try:
-            fitype = data["QUOTES"][ticker]["ISSUE_DESCRIPTION"]
-        except:
-            pass
-
-        if fitype == "ETF":
-            stype = "ETF"
-        else:
-            stype = "Stock"
-    elif fstype == "MutualFund":
-        stype = "Fund"
-    else:
-        stype = fstype
-        
-    _ticker_cache[ticker] = stype
-
-    return stype
+    if ticker not in _ticker_cache:
+        preload([ticker])
+
+    if ticker not in _ticker_cache:
+        quotes([ticker])
+
+    return _ticker_cache.get(ticker, "")
 
 def ticker_name(ticker):
     """
@@ -98,64 +71,233 @@ def ticker_name(ticker):
     if " " in ticker:
         return None
 
-    # The Fidelity URL 
-    url = "https://fastquote.fidelity.com/service/quote/json?productid=embeddedquotes&symbols="
-    
-    # Get the page
-    r = web.get_web_page(url + ticker, False)
-    #print(r[1:-1])
-    
+    preload([ticker])
+    if ticker not in _name_cache:
+        quotes([ticker])
+
+    return _name_cache.get(ticker, "")
+
+def quotes(tickers, chunk_size = _QUOTES_PER_REQUEST, force = False):
+    """
+    Description:
+    Get quotes for a list of securities, with several securities per
+    request. Each response is parsed once for all the fields. The types and
+    names found are also cached for ticker_type() and ticker_name().
+
+    Parameters:
+    tickers - List of security tickers.
+    chunk_size - The maximum number of securities per request.
+    force - If True, fetch fresh quotes instead of cached ones. Cached
+        quotes expire after 30 seconds (see webcache.DEFAULT_TTLS).
+
+    Returns:
+    DataFrame indexed by ticker, with the "Type", "Name", "Price" and
+    "Change" columns. Type and name are "", and price and change are NaN,
+    for tickers that can't be resolved.
+    """
+    symbols = sorted(set(ticker for ticker in tickers if " " not in ticker))
+    chunks = [symbols[i:i + chunk_size] for i in range(0, len(symbols), chunk_size)]
+
+    results = dict()
+    unreachable = set()
+    while chunks:
+        pages = web.get_web_pages([_QUOTE_URL + ",".join(chunk) for chunk in chunks], force)
+
+        # Fidelity fails the whole request on some unknown symbols. Split
+        # the failed requests in halves, until the unknown symbols are alone.
+        failed = list()
+        for chunk, page in zip(chunks, pages):
+            chunk_results = _parse_quotes(chunk, page)
+            if chunk_results is not None:
+                results.update(chunk_results)
+            elif page is None:
+                # Already retried by the web module
+                unreachable.update(chunk)
+            elif len(chunk) > 1:
+                half = len(chunk) // 2
+                failed.extend([chunk[:half], chunk[half:]])
+
+        chunks = failed
+
+    found = dict()
+    for ticker in symbols:
+        quote = results.get(ticker)
+        if quote is None:
+            quote = { "Type": "", "Name": "", "Price": None, "Change": None }
+            results[ticker] = quote
+
+            # Don't remember tickers we could not ask about
+            if ticker in unreachable:
+                continue
+
+        _ticker_cache[ticker] = quote["Type"]
+        _name_cache[ticker] = quote["Name"]
+        if quote["Type"]:
+            found[ticker] = { "type": quote["Type"], "name": quote["Name"] or None }
+
+    tickerdb.upsert(found, _SOURCE)
+
+    df = pd.DataFrame([results.get(ticker, { "Type": "", "Name": "" }) for ticker in tickers],
+                      index = list(tickers),
+                      columns = ["Type", "Name", "Price", "Change"])
+    df["Price"] = pd.to_numeric(df["Price"], errors = "coerce")
+    df["Change"] = pd.to_numeric(df["Change"], errors = "coerce")
+
+    return df
+
+def _parse_quotes(tickers, page):
+    """
+    Parses a quote response.
+
+    Arguments:
+    tickers - the tickers requested
+    page - the JSONP response, or None if the request failed
+
+    Return value:
+    Dict of ticker to a dict with the "Type", "Name", "Price" and "Change"
+    keys, for the tickers found. None if the whole request failed.
+    """
+    if page is None:
+        return None
+
     # Strip the '(' at beginning and the ')' at end
-    data = json.loads(r[1:-1])
-    #print(data)
-    
-    if (data["STATUS"]["ERROR_CODE"] != "0"):
-        _name_cache[ticker] = ""
-        return ""
-        
     try:
-        fname = data["QUOTES"][ticker]["NAME"]
-        fstype = data["QUOTES"][ticker]["SECURITY_TYPE"]
-    except:
-        _name_cache[ticker] = ""
+        data = json.loads(page[1:-1])
+    except ValueError:
+        return None
+
+    status = data.get("STATUS") if isinstance(data, dict) else None
+    if not isinstance(status, dict) or status.get("ERROR_CODE") != "0":
+        return None
+
+    results = dict()
+    for ticker in tickers:
+        quote = data.get("QUOTES", dict()).get(ticker)
+        if not quote or "SECURITY_TYPE" not in quote:
+            continue
+
+        results[ticker] = { "Type": _security_type(quote),
+                            "Name": _security_name(quote),
+                            "Price": quote.get("LAST_PRICE"),
+                            "Change": quote.get("NETCHG_TODAY") }
+
+    return results
+
+def _security_type(quote):
+    """
+    Maps the Fidelity security type of a quote to the ticker type.
+    """
+    fstype = quote["SECURITY_TYPE"]
+
+    if fstype == "Equity":
+        if quote.get("ISSUE_DESCRIPTION", "") == "ETF":
+            return "ETF"
+        return "Stock"
+
+    if fstype == "MutualFund":
+        return "Fund"
+
+    return fstype
+
+def _security_name(quote):
+    """
+    Gets the security name of a quote, title cased except for indexes.
+    """
+    fname = quote.get("NAME")
+    if fname is None:
         return ""
-      
-    if fstype != "Index":
-        name = titlecase.titlecase(fname)
-    else:
-        name = fname
-        
-    if name is not None:
-        _name_cache[ticker] = name
 
-    return name
+    if quote["SECURITY_TYPE"] != "Index":
+        return titlecase.titlecase(fname)
 
+    return fname
 
-def _parse_ticker_type_f(args):
-    type = ticker_type(args.ticker)
+def preload(tickers):
+    """
+    Description:
+    Loads the types and names of known tickers from the ticker store, in a
+    single lookup, so that ticker_type() and ticker_name() don't need the
+    network for them. Stale entries are revalidated in the background.
 
-    if type != "":
-        print(type)
+    Parameters:
+    tickers - List of tickers.
+    """
+    tickers = [ticker for ticker in tickers
+               if ticker not in _ticker_cache or ticker not in _name_cache]
+    if not tickers:
+        return
+
+    for ticker, entry in tickerdb.lookup(tickers, _SOURCE).items():
+        if entry["type"]:
+            _ticker_cache.setdefault(ticker, entry["type"])
+        if entry["name"]:
+            _name_cache.setdefault(ticker, entry["name"])
+
+def _revalidate(ticker):
+    """
+    Resolves the type and name of a stored ticker again, for the ticker store.
+    """
+    quote = quotes([ticker]).iloc[0]
+    if not quote["Type"]:
+        return None
+
+    return { "type": quote["Type"], "name": quote["Name"] or None }
+
+tickerdb.set_resolver(_SOURCE, _revalidate)
+
+
+def _parse_ticker_type_f(args):
+    return batchcli.run(ticker_type, args)
 
 def _parse_ticker_name_f(args):
-    type = ticker_name(args.ticker)
+    return batchcli.run(ticker_name, args)
+
+def _parse_quotes_f(args):
+    def chunk_quotes(tickers):
+        df = quotes(tickers)
+        return dict((ticker, df.loc[[ticker]]) for ticker in tickers
+                    if df.at[ticker, "Type"])
 
-    if type != "":
-        print(type)
+    return batchcli.run(chunk_quotes, args, _QUOTES_PER_REQUEST)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Download Fidelity data.')
+    parser.add_argument('--record', metavar='ARCHIVE', help='Record the web responses into an archive')
+    parser.add_argument('--replay', metavar='ARCHIVE', help='Replay the web responses from an archive, without the network')
+    parser.add_argument('--standin', metavar='URL', help='Send the requests to a stand-in server (see cassette.py serve)')
 
     # Subparsers
     subparsers = parser.add_subparsers(help='Sub-command help')
 
     parser_ticker_type = subparsers.add_parser('ticker-type', help='Get ticker type (cef, etf, index, fund, stock, cash)')
-    parser_ticker_type.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_ticker_type)
     parser_ticker_type.set_defaults(func=_parse_ticker_type_f)
 
     parser_ticker_name = subparsers.add_parser('ticker-name', help='Get name (all)')
-    parser_ticker_name.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_ticker_name)
     parser_ticker_name.set_defaults(func=_parse_ticker_name_f)
 
+    parser_quotes = subparsers.add_parser('quotes', help='Get quotes (type, name, price, change)')
+    batchcli.add_arguments(parser_quotes)
+    parser_quotes.set_defaults(func=_parse_quotes_f)
+
     args = parser.parse_args()
-    args.func(args)
+
+    if args.record:
+        web.use_cassette(args.record, "record")
+    elif args.replay:
+        web.use_cassette(args.replay, "replay", latency=0)
+
+    if args.standin:
+        web.set_standin(args.standin)
+
+    # Archived runs go to the network (or archive) for every ticker
+    if args.record or args.replay or args.standin:
+        tickerdb.set_store(None)
+
+    try:
+        status = args.func(args)
+    finally:
+        web.eject_cassette()
+
+    sys.exit(status)
@@ -1,11 +1,20 @@
 #!/usr/bin/env python
 
 import sys
-import requests
+import asyncio
+import math
+import concurrent.futures
+from collections import OrderedDict
 from bs4 import BeautifulSoup
+import lxml.etree
 import pandas as pd
 from tabulate import tabulate
 import web
+import batchcli
+import aioweb
+import tickerdb
+import tablespec
+import timeseries
 import argparse
 import unidecode
 
@@ -16,6 +25,24 @@ Module for parsing Morningstar web data.
 _ticker_cache = dict()
 _name_cache = dict()
 
+# The ticker store source name
+_SOURCE = "morningstar"
+
+# Years of historical returns downloaded for tickers not in the store
+_HISTORY_YEARS = 10
+
+# The Morningstar performance history URLs, followed by the ticker
+_ETF_PERFORMANCE_HISTORY_URL = "http://performance.morningstar.com/perform/Performance/cef/performance-history.action?&ops=clear&y=10&ndec=2&align=d&t="
+_INDEX_PERFORMANCE_HISTORY_URL = "http://performance.morningstar.com/perform/Performance/index-c/performance-history-1.action?&ops=clear&y=10&ndec=2&align=d&t="
+_STOCK_PERFORMANCE_HISTORY_URL = "http://performance.morningstar.com/perform/Performance/stock/performance-history-1.action?&ops=clear&y=10&ndec=2&align=d&t="
+_ETF_TRAILING_TOTAL_RETURNS_URL = "http://performance.morningstar.com/Performance/cef/trailing-total-returns.action?ops=clear&ndec=2&align=d&t="
+_INDEX_TRAILING_TOTAL_RETURNS_URL = "http://performance.morningstar.com/perform/Performance/index-c/trailing-total-returns.action?ops=clear&ndec=2&align=d&t="
+_CEF_HISTORICAL_RETURNS_URL = "http://performance.morningstar.com/perform/Performance/cef/historical-returns.action?&ops=clear&y=%s&ndec=2&freq=%s&t="
+
+# The security name is the first 'h1' within or after the 'r_title' div
+_TITLE_DIV_XPATH = lxml.etree.XPath('(//div[contains(concat(" ", normalize-space(@class), " "), " r_title ")])[1]')
+_TITLE_H1_XPATH = lxml.etree.XPath('(descendant::h1 | following::h1)[1]')
+
 def ticker_type(ticker):
     """
     Description:
@@ -37,34 +64,48 @@ def ticker_type(ticker):
         return "Other"
 
     if ticker not in _ticker_cache:
-        # The Morningstar URL for funds
-        url = "http://quote.morningstar.com/Quote/Quote.aspx?ticker="
-    
-        # Get the page
-        r = requests.get(url + ticker, allow_redirects = False)
-   
-        # Enable to inspect headers
-        #print(r)
-        #print(r.headers)
-
-        if r.status_code == 302:
-            if "/stock/" in r.headers['Location']:
-                _ticker_cache[ticker] = "Stock"
-            elif "/fund/" in r.headers['Location']:
-                _ticker_cache[ticker] = "Mutual Fund"
-            elif "//etfs." in r.headers['Location']:
-                _ticker_cache[ticker] = "ETF"
-                return("ETF")
-            elif "//cef." in r.headers['Location']:
-                _ticker_cache[ticker] = "CEF"
-            elif "/indexquote/" in r.headers['Location']:
-                _ticker_cache[ticker] = "Index"
+        preload([ticker])
+
+    if ticker not in _ticker_cache:
+        stype = _query_ticker_type(ticker)
+        if stype:
+            _ticker_cache[ticker] = stype
+            tickerdb.upsert({ ticker: { "type": stype } }, _SOURCE)
             
     if ticker in _ticker_cache:
         return(_ticker_cache[ticker])
     
     return ""
 
+def _query_ticker_type(ticker):
+    """
+    Finds the security type from the Morningstar quote page redirect.
+    Returns "" in case the ticker can't be resolved.
+    """
+    # The Morningstar URL for funds
+    url = "http://quote.morningstar.com/Quote/Quote.aspx?ticker="
+    
+    # Get the page
+    r = web.http_get(url + ticker, allow_redirects = False)
+   
+    # Enable to inspect headers
+    #print(r)
+    #print(r.headers)
+
+    if r.status_code == 302:
+        if "/stock/" in r.headers['Location']:
+            return "Stock"
+        elif "/fund/" in r.headers['Location']:
+            return "Mutual Fund"
+        elif "//etfs." in r.headers['Location']:
+            return "ETF"
+        elif "//cef." in r.headers['Location']:
+            return "CEF"
+        elif "/indexquote/" in r.headers['Location']:
+            return "Index"
+
+    return ""
+
 def ticker_name(ticker):
     """
     Description:
@@ -84,21 +125,81 @@ def ticker_name(ticker):
     if " " in ticker:
         return None
 
+    preload([ticker])
+    if ticker in _name_cache:
+        return(_name_cache[ticker])
+
     # Ticker check    
     tt = ticker_type(ticker)
 
     name = None
-    if tt == "CEF" or tt == "ETF" or tt == "Index" or tt == "Mutual Fund":
-        name = fund_name(ticker)
-    
-    if tt == "Stock":
-        name = stock_name(ticker)
+    url = _name_url(ticker, tt)
+    if url is not None:
+        name = _page_title(url)
     
     if name is not None:
         _name_cache[ticker] = name
+        if name:
+            tickerdb.upsert({ ticker: { "type": tt, "name": name } }, _SOURCE)
 
     return name
 
+def preload(tickers):
+    """
+    Description:
+    Loads the types and names of known tickers from the ticker store, in a
+    single lookup, so that ticker_type() and ticker_name() don't need the
+    network for them. Stale entries are revalidated in the background.
+
+    Parameters:
+    tickers - List of tickers.
+    """
+    tickers = [ticker for ticker in tickers
+               if ticker not in _ticker_cache or ticker not in _name_cache]
+    if not tickers:
+        return
+
+    for ticker, entry in tickerdb.lookup(tickers, _SOURCE).items():
+        if entry["type"]:
+            _ticker_cache.setdefault(ticker, entry["type"])
+        if entry["name"]:
+            _name_cache.setdefault(ticker, entry["name"])
+
+def _revalidate(ticker):
+    """
+    Resolves the type and name of a stored ticker again, for the ticker store.
+    """
+    stype = _query_ticker_type(ticker)
+    if not stype:
+        return None
+
+    entry = { "type": stype }
+    _ticker_cache[ticker] = stype
+
+    url = _name_url(ticker, stype)
+    if url is not None:
+        name = _page_title(url)
+        if name:
+            entry["name"] = name
+            _name_cache[ticker] = name
+
+    return entry
+
+tickerdb.set_resolver(_SOURCE, _revalidate)
+
+def _name_url(ticker, tt):
+    """
+    Returns the URL of the page titled with the security name, or None for
+    security types without one.
+    """
+    if tt == "CEF" or tt == "ETF" or tt == "Index" or tt == "Mutual Fund":
+        return "http://portfolios.morningstar.com/fund/summary?t=" + ticker
+    
+    if tt == "Stock":
+        return "http://performance.morningstar.com/stock/performance-return.action?t=" + ticker
+
+    return None
+
 
 def fund_name(ticker):
     """
@@ -117,18 +218,7 @@ def fund_name(ticker):
     if tt != "CEF" and tt != "ETF" and tt != "Index" and tt != "Mutual Fund":
         return None    
 
-    # The Morningstar URL
-    url = "http://portfolios.morningstar.com/fund/summary?t=" + ticker
-    
-    # Get the page
-    web_page = web.get_web_page(url, False)
-
-    # Parse the contents
-    soup = BeautifulSoup(web_page, 'lxml')
-
-    ticker_name = soup.find("div", class_="r_title").find_next("h1").getText()
-
-    return ticker_name.encode("ascii", "ignore").decode("utf-8")
+    return _page_title(_name_url(ticker, tt))
 
 
 def stock_name(ticker):
@@ -148,21 +238,44 @@ def stock_name(ticker):
     if tt != "Stock":
         return None    
 
-    # The Morningstar URL
-    url = "http://performance.morningstar.com/stock/performance-return.action?t=" + ticker
-    
-    # Get the page
-    web_page = web.get_web_page(url, False)
+    return _page_title(_name_url(ticker, tt))
 
-    # Parse the contents
-    soup = BeautifulSoup(web_page, 'lxml')
 
-    ticker_name = soup.find("div", class_="r_title").find_next("h1").getText()
+def _page_title(url):
+    """
+    Gets the security name from the title of a Morningstar page.
+    """
+    tree = web.get_web_page_tree(url, False)
+
+    ticker_name = ""
+    for div in _TITLE_DIV_XPATH(tree):
+        for h1 in _TITLE_H1_XPATH(div):
+            ticker_name = "".join(h1.itertext())
 
     return ticker_name.encode("ascii", "ignore").decode("utf-8")
 
+def _quote_frame(ticker, labels, values):
+    """
+    Builds a quote DataFrame with one row per label, and the ticker as
+    column label.
+    """
+    df = pd.DataFrame({ ticker.upper(): values }, index = labels, dtype = object)
+
+    # Clear the index name
+    df.index.name = ""
+
+    return df
 
-def performance_history(ticker):
+def _typed(df, typed):
+    """
+    Converts a table to numbers and dates, if typed.
+    """
+    if typed and df is not None:
+        return web.dataframe_to_numeric(df)
+
+    return df
+
+def performance_history(ticker, typed = False):
     """
     Description:
     Get ETF, fund or stock performance history. For ETFs and stocks, this is 
@@ -170,6 +283,8 @@ def performance_history(ticker):
     
     Parameters:
     ticker - The etf, fund or stock ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returs: 
     DataFrame with the performance history. 
@@ -180,30 +295,56 @@ def performance_history(ticker):
     if tt == "CEF":
         df = etf_performance_history(ticker)
         df.drop(df.index[[1, 2, 3, 4, 5, 6, 7]], inplace=True)
-        return df
+        return _typed(df, typed)
 
     if tt == "ETF":
         df = etf_performance_history(ticker)
         df.drop(df.index[[1, 2, 3, 4, 5, 6]], inplace=True)
-        return df
+        return _typed(df, typed)
 
     if tt == "Index":
         df = index_performance_history(ticker)
-        return df
+        return _typed(df, typed)
 
     if tt == "Mutual Fund":
         df = etf_performance_history(ticker)
         df.drop(df.index[[0, 2, 3, 4, 5, 6, 7]], inplace=True)
-        return df
+        return _typed(df, typed)
 
     if tt == "Stock":
         df = stock_performance_history(ticker)
         df.drop(df.index[[1, 2, 3, 4]], inplace=True)
-        return df
+        return _typed(df, typed)
 
     return None
 
-def nav_performance_history(ticker):
+async def performance_history_async(ticker, typed = False):
+    """
+    Description:
+    asyncio variant of performance_history(). The page is fetched with
+    aioweb, then parsed by performance_history() in the event loop's
+    default executor.
+
+    Parameters:
+    ticker - The etf, fund or stock ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
+
+    Returns:
+    DataFrame with the performance history, or None.
+    """
+    loop = asyncio.get_running_loop()
+
+    # Usually resolved from the ticker store, without the network
+    url = await loop.run_in_executor(None, _performance_history_url, ticker)
+    if url is None:
+        return None
+
+    await aioweb.get_web_page(url)
+
+    return await loop.run_in_executor(None, performance_history, ticker, typed)
+
+def nav_performance_history(ticker, typed = False):
     """
     Description:
     Get ETF, fund or stock NAV (net asset value) performance history. For ETFs
@@ -211,6 +352,8 @@ def nav_performance_history(ticker):
     
     Parameters:
     ticker - The etf, fund or stock ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returs: 
     DataFrame with the performance history. 
@@ -221,31 +364,33 @@ def nav_performance_history(ticker):
     if tt == "ETF":
         df = etf_performance_history(ticker)
         df.drop(df.index[[0, 2, 3, 4, 5, 6]], inplace=True)
-        return df
+        return _typed(df, typed)
 
     if tt == "Mutual Fund":
         df = etf_performance_history(ticker)
         df.drop(df.index[[0, 2, 3, 4, 5, 6, 7]], inplace=True)
-        return df
+        return _typed(df, typed)
 
     if tt == "Index":
         df = index_performance_history(ticker)
-        return df
+        return _typed(df, typed)
 
     if tt == "Stock":
         df = stock_performance_history(ticker)
         df.drop(df.index[[1, 2, 3, 4]], inplace=True)
-        return df
+        return _typed(df, typed)
 
     return None
 
-def etf_performance_history(ticker):
+def etf_performance_history(ticker, typed = False):
     """
     Description:
     Get etf or fund performance history. Does not work for stocks.
     
     Parameters:
     ticker - The etf or fund ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returs: 
     DataFrame with the performance history. 
@@ -257,7 +402,7 @@ def etf_performance_history(ticker):
         return None    
 
     # The Morningstar URL for funds
-    url = "http://performance.morningstar.com/perform/Performance/cef/performance-history.action?&ops=clear&y=10&ndec=2&align=d&t="
+    url = _ETF_PERFORMANCE_HISTORY_URL
     
     df = web.get_web_page_table(url + ticker, False, 0)
 
@@ -266,15 +411,17 @@ def etf_performance_history(ticker):
 
     df.fillna(value="", inplace=True)
 
-    return df
+    return _typed(df, typed)
 
-def fund_performance_history(ticker):
+def fund_performance_history(ticker, typed = False):
     """
     Description:
     Get etf or fund performance history. Does not work for stocks.
     
     Parameters:
     ticker - The etf or fund ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returs: 
     DataFrame with the performance history. 
@@ -297,19 +444,21 @@ def fund_performance_history(ticker):
     if (sys.version_info[0] >= 3):
         # Fix the unprintable unicode characters
         df.index.name = unidecode.unidecode(df.index.name)
-        df1 = df.applymap(lambda x: unidecode.unidecode(str(x)))
+        df1 = df.apply(lambda column: column.map(lambda x: unidecode.unidecode(str(x))))
         df = df1
 
-    return df
+    return _typed(df, typed)
 
 
-def index_performance_history(ticker):
+def index_performance_history(ticker, typed = False):
     """
     Description:
     Get index performance history. 
     
     Parameters:
     ticker - The index ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returs: 
     DataFrame with the performance history. 
@@ -321,7 +470,7 @@ def index_performance_history(ticker):
         return None    
 
     # The Morningstar URL for indexes
-    url = "http://performance.morningstar.com/perform/Performance/index-c/performance-history-1.action?&ops=clear&y=10&ndec=2&align=d&t="
+    url = _INDEX_PERFORMANCE_HISTORY_URL
     
     df = web.get_web_page_table(url + ticker, False, 0)
 
@@ -330,15 +479,17 @@ def index_performance_history(ticker):
 
     df.fillna(value="", inplace=True)
 
-    return df
+    return _typed(df, typed)
 
-def stock_performance_history(ticker):
+def stock_performance_history(ticker, typed = False):
     """
     Description:
     Get stock performance history. Does not work for stocks.
     
     Parameters:
     ticker - The stock ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returs: 
     DataFrame with the performance history. 
@@ -351,7 +502,7 @@ def stock_performance_history(ticker):
         return None    
 
     # The Morningstar URL
-    url = "http://performance.morningstar.com/perform/Performance/stock/performance-history-1.action?&ops=clear&y=10&ndec=2&align=d&t="
+    url = _STOCK_PERFORMANCE_HISTORY_URL
 
     df = web.get_web_page_table(url + ticker, False, 0)
 
@@ -360,15 +511,17 @@ def stock_performance_history(ticker):
 
     df.fillna(value="", inplace=True)
 
-    return df
+    return _typed(df, typed)
 
-def fund_performance_history2(ticker):
+def fund_performance_history2(ticker, typed = False):
     """
     Description:
     Get fund performance history.
     
     Parameters:
     ticker - The fund ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returs: 
     DataFrame with the performance history. 
@@ -390,15 +543,17 @@ def fund_performance_history2(ticker):
     # Promote 1st row and column as labels
     df = web.dataframe_promote_1st_row_and_column_as_labels(df)
 
-    return df
+    return _typed(df, typed)
 
-def trailing_total_returns(ticker):
+def trailing_total_returns(ticker, typed = False):
     """
     Description:
     Get trailing total returns (price for etfs, stocks, NAV for funds)
     
     Parameters:
     ticker - The ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returs: 
     DataFrame with the trailing total returns.
@@ -409,36 +564,38 @@ def trailing_total_returns(ticker):
     if tt == "CEF":
         df = etf_trailing_total_returns(ticker)
         df.drop(df.index[[1, 2, 3, 4, 5]], inplace=True)
-        return df
+        return _typed(df, typed)
 
     if tt == "ETF":
         df = etf_trailing_total_returns(ticker)
         df.drop(df.index[[1, 2, 3, 4]], inplace=True)
-        return df
+        return _typed(df, typed)
 
     if tt == "Index":
         df = index_trailing_total_returns(ticker)
-        return df
+        return _typed(df, typed)
 
     if tt == "Mutual Fund":
         df = etf_trailing_total_returns(ticker)
         df.drop(df.index[[0, 2, 3, 4, 5]], inplace=True)
-        return df
+        return _typed(df, typed)
 
     if tt == "Stock":
         df = etf_trailing_total_returns(ticker)
         df.drop(df.index[[1, 2, 3]], inplace=True)
-        return df
+        return _typed(df, typed)
 
     return None
 
-def nav_trailing_total_returns(ticker):
+def nav_trailing_total_returns(ticker, typed = False):
     """
     Description:
     Get trailing total returns (NAV for etfs, funds, and price for stocks)
     
     Parameters:
     ticker - The ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returs: 
     DataFrame with the trailing total returns.
@@ -449,36 +606,38 @@ def nav_trailing_total_returns(ticker):
     if tt == "CEF":
         df = etf_trailing_total_returns(ticker)
         df.drop(df.index[[0, 2, 3, 4, 5]], inplace=True)
-        return df
+        return _typed(df, typed)
 
     if tt == "ETF":
         df = etf_trailing_total_returns(ticker)
         df.drop(df.index[[0, 2, 3, 4]], inplace=True)
-        return df
+        return _typed(df, typed)
 
     if tt == "Index":
         df = index_trailing_total_returns(ticker)
-        return df
+        return _typed(df, typed)
 
     if tt == "Mutual Fund":
         df = etf_trailing_total_returns(ticker)
         df.drop(df.index[[0, 2, 3, 4, 5]], inplace=True)
-        return df
+        return _typed(df, typed)
 
     if tt == "Stock":
         df = etf_trailing_total_returns(ticker)
         df.drop(df.index[[1, 2, 3]], inplace=True)
-        return df
+        return _typed(df, typed)
 
     return None
 
-def etf_trailing_total_returns(ticker):
+def etf_trailing_total_returns(ticker, typed = False):
     """
     Description:
     Get trailing total returns. 
     
     Parameters:
     ticker - The ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returs: 
     DataFrame with the trailing total returns.
@@ -490,7 +649,7 @@ def etf_trailing_total_returns(ticker):
         return None    
 
     # The Morningstar URL for funds
-    url = "http://performance.morningstar.com/Performance/cef/trailing-total-returns.action?ops=clear&ndec=2&align=d&t="    
+    url = _ETF_TRAILING_TOTAL_RETURNS_URL
 
     df = web.get_web_page_table(url + ticker, False, 0)
 
@@ -499,15 +658,17 @@ def etf_trailing_total_returns(ticker):
 
     df.fillna(value="", inplace=True)
 
-    return df
+    return _typed(df, typed)
 
-def fund_trailing_total_returns(ticker):
+def fund_trailing_total_returns(ticker, typed = False):
     """
     Description:
     Get trailing total returns. 
     
     Parameters:
     ticker - The ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returs: 
     DataFrame with the trailing total returns.
@@ -530,18 +691,20 @@ def fund_trailing_total_returns(ticker):
     if (sys.version_info[0] >= 3):
         # Fix the unprintable unicode characters
         df.index.name = unidecode.unidecode(df.index.name)
-        df1 = df.applymap(lambda x: unidecode.unidecode(x))
+        df1 = df.apply(lambda column: column.map(lambda x: unidecode.unidecode(x)))
         df = df1
 
-    return df
+    return _typed(df, typed)
 
-def fund_trailing_total_returns2(ticker):
+def fund_trailing_total_returns2(ticker, typed = False):
     """
     Description:
     Get trailing total returns. Only works for funds.
 
     Parameters:
     ticker - The fund ticker
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returns:
 
@@ -563,15 +726,17 @@ def fund_trailing_total_returns2(ticker):
     # Promote 1st row and column as labels
     df = web.dataframe_promote_1st_row_and_column_as_labels(df)
 
-    return df 
+    return _typed(df, typed)
 
-def index_trailing_total_returns(ticker):
+def index_trailing_total_returns(ticker, typed = False):
     """
     Description:
     Get trailing total returns. 
     
     Parameters:
     ticker - The ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returs: 
     DataFrame with the trailing total returns.
@@ -583,7 +748,7 @@ def index_trailing_total_returns(ticker):
         return None    
 
     # The Morningstar URL
-    url = "http://performance.morningstar.com/perform/Performance/index-c/trailing-total-returns.action?ops=clear&ndec=2&align=d&t="    
+    url = _INDEX_TRAILING_TOTAL_RETURNS_URL
 
     df = web.get_web_page_table(url + ticker, False, 0)
 
@@ -592,9 +757,9 @@ def index_trailing_total_returns(ticker):
 
     df.fillna(value="", inplace=True)
 
-    return df
+    return _typed(df, typed)
 
-def historical_quarterly_returns(ticker, years = 5, frequency = "q"):
+def historical_quarterly_returns(ticker, years = 5, frequency = "q", typed = False):
     """
     Description:
     Get historical quarterly returns.
@@ -603,37 +768,39 @@ def historical_quarterly_returns(ticker, years = 5, frequency = "q"):
     ticker - The etf, fund or stock ticker.
     years - The number of years. Default: 5.
     frequency - "q" for quarterly, "m" for monthly. Default: "q"
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
     """
     # Ticker check    
     tt = ticker_type(ticker)
     if tt == "CEF":
         df = cef_historical_quarterly_returns(ticker, years, frequency)
         df.drop(df.columns[[1]], axis=1, inplace=True)
-        return df
+        return _typed(df, typed)
 
     if tt == "ETF":
         df = cef_historical_quarterly_returns(ticker, years, frequency)
         df.drop(df.columns[[1]], axis=1, inplace=True)
-        return df
+        return _typed(df, typed)
 
     if tt == "Index":
         df = cef_historical_quarterly_returns(ticker, years, frequency)
         df.drop(df.columns[[1]], axis=1, inplace=True)
-        return df
+        return _typed(df, typed)
         
     if tt == "Mutual Fund":
         df = cef_historical_quarterly_returns(ticker, years, frequency)
         df.drop(df.columns[[0]], axis=1, inplace=True)
-        return df
+        return _typed(df, typed)
 
     if tt == "Stock":
         df = cef_historical_quarterly_returns(ticker, years, frequency)
         df.drop(df.columns[[1]], axis=1, inplace=True)
-        return df
+        return _typed(df, typed)
 
     return None
 
-def nav_historical_quarterly_returns(ticker, years = 5, frequency = "q"):
+def nav_historical_quarterly_returns(ticker, years = 5, frequency = "q", typed = False):
     """
     Description:
     Get historical NAV quarterly returns.
@@ -642,43 +809,47 @@ def nav_historical_quarterly_returns(ticker, years = 5, frequency = "q"):
     ticker - The etf, fund or stock ticker.
     years - The number of years. Default: 5.
     frequency - "q" for quarterly, "m" for monthly. Default: "q"
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
     """
     # Ticker check    
     tt = ticker_type(ticker)
     if tt == "CEF":
         df = cef_historical_quarterly_returns(ticker, years, frequency)
         df.drop(df.columns[[0]], axis=1, inplace=True)
-        return df
+        return _typed(df, typed)
 
     if tt == "ETF":
         df = cef_historical_quarterly_returns(ticker, years, frequency)
         df.drop(df.columns[[0]], axis=1, inplace=True)
-        return df
+        return _typed(df, typed)
 
     if tt == "Index":
         df = cef_historical_quarterly_returns(ticker, years, frequency)
         df.drop(df.columns[[1]], axis=1, inplace=True)
-        return df
+        return _typed(df, typed)
         
     if tt == "Mutual Fund":
         df = cef_historical_quarterly_returns(ticker, years, frequency)
         df.drop(df.columns[[0]], axis=1, inplace=True)
-        return df
+        return _typed(df, typed)
 
     if tt == "Stock":
         df = cef_historical_quarterly_returns(ticker, years, frequency)
         df.drop(df.columns[[1]], axis=1, inplace=True)
-        return df
+        return _typed(df, typed)
 
     return None
 
-def cef_historical_quarterly_returns(ticker, years = 5, frequency = "q"):
+def cef_historical_quarterly_returns(ticker, years = 5, frequency = "q", typed = False):
     """
     Description:
     Get historical quarterly returns for cefs. 
 
     Parameters:
     ticker - the ticker
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returns:
 
@@ -689,7 +860,7 @@ def cef_historical_quarterly_returns(ticker, years = 5, frequency = "q"):
         return None
 
     # The Morningstar URL for funds
-    url = "http://performance.morningstar.com/perform/Performance/cef/historical-returns.action?&ops=clear&y=%s&ndec=2&freq=%s&t=" % (years, frequency)
+    url = _CEF_HISTORICAL_RETURNS_URL % (years, frequency)
     
     df = web.get_web_page_table(url + ticker, False, 0)
     df.fillna(value="", inplace=True)
@@ -698,9 +869,9 @@ def cef_historical_quarterly_returns(ticker, years = 5, frequency = "q"):
     df1 = df.drop(df.columns[[3, 4, 5, 6, 7]], axis=1)
     df = web.dataframe_promote_1st_row_and_column_as_labels(df1)
 
-    return df 
+    return _typed(df, typed)
 
-def fund_historical_quarterly_returns(ticker, years = 5, frequency = "q"):
+def fund_historical_quarterly_returns(ticker, years = 5, frequency = "q", typed = False):
     """
     Description:
     Get historical quarterly returns.
@@ -709,6 +880,8 @@ def fund_historical_quarterly_returns(ticker, years = 5, frequency = "q"):
     ticker - The etf, fund or stock ticker.
     years - The number of years. Default: 5.
     frequency - "q" for quarterly, "m" for monthly. Default: "q"
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
     """
     # Ticker check    
     tt = ticker_type(ticker)
@@ -730,9 +903,9 @@ def fund_historical_quarterly_returns(ticker, years = 5, frequency = "q"):
     # Promote 1st row and column as labels
     df = web.dataframe_promote_1st_row_and_column_as_labels(df)
 
-    return df 
+    return _typed(df, typed)
 
-def fund2_historical_quarterly_returns(ticker):
+def fund2_historical_quarterly_returns(ticker, typed = False):
     """
     Description:
     Get historical quarterly returns for etfs and funds. 
@@ -740,6 +913,8 @@ def fund2_historical_quarterly_returns(ticker):
 
     Parameters:
     ticker - the etf or fund ticker
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returns:
 
@@ -757,186 +932,404 @@ def fund2_historical_quarterly_returns(ticker):
     # Promote 1st row and column as labels
     df = web.dataframe_promote_1st_row_and_column_as_labels(df)
 
-    return df 
+    return _typed(df, typed)
 
-def cef_quote(ticker):
+def update_historical_returns(ticker, frequency = "q"):
     """
     Description:
-    Get the cef net asset value, and other related data.
+    Updates the local store of historical returns (see timeseries.py) for
+    a ticker. Only the years since the last stored period are downloaded,
+    and nothing is downloaded while the last completed period is stored.
 
     Parameters:
-    ticker - The fund ticker.
+    ticker - The etf, fund or stock ticker.
+    frequency - "q" for quarterly, "m" for monthly. Default: "q"
 
     Returns:
+    The number of periods added, or None if the ticker can't be resolved.
+    """
+    store = timeseries.get_store()
+    last = store.last_date(ticker, frequency)
+
+    if last is None:
+        years = _HISTORY_YEARS
+    elif last >= timeseries.last_period_end(frequency):
+        return 0
+    else:
+        years = max(1, int(math.ceil((pd.Timestamp.today() - last).days / 365.25)))
+
+    df = historical_quarterly_returns(ticker, years, frequency, typed = True)
+    if df is None:
+        return None
+
+    df.index = timeseries.period_end_dates(df.index, frequency)
+    df = df[~df.index.isnull()].select_dtypes(include = ["float64"])
+
+    return store.update(ticker, frequency, df)
 
+def stored_historical_returns(tickers, frequency = "q", start = None, end = None):
     """
-    # Ticker check    
-    tt = ticker_type(ticker)
-    if tt != "CEF":
-        return None    
+    Description:
+    Get historical returns from the local store, without the network (see
+    update_historical_returns()).
 
-    # The Morningstar URL for etfs
-    url = "http://cef.morningstar.com/cefq/cef-header?&t=" + ticker
-    
-    # Get the page
-    web_page = web.get_web_page(url, False)
+    Parameters:
+    tickers - List of etf, fund or stock tickers.
+    frequency - "q" for quarterly, "m" for monthly. Default: "q"
+    start, end - The first and last dates, inclusive. Default: unbounded.
 
-    # Parse the contents
-    soup = BeautifulSoup(web_page, 'lxml')
+    Returns:
+    DataFrame indexed by (ticker, period end date), with float64 columns.
+    """
+    return timeseries.get_store().query_many(tickers, frequency, start, end)
 
-    df = pd.DataFrame(columns = range(1), 
-                      index = range(16))
-    
-    # Set the index
-    df['new_index'] = None
-    df['new_index'][0] = "Last Price"
-    df['new_index'][1] = "Day Change"
-    df['new_index'][2] = "Day Change %"
-    df['new_index'][3] = "As Of"
-    df['new_index'][4] = "Last Closing Price"
-    df['new_index'][5] = "Day Range"
-    df['new_index'][6] = "52-WK Range"
-    df['new_index'][7] = "1-Year Z-Statistic"
-    df['new_index'][8] = "Market Value"
-    df['new_index'][9] = "Total Leverage Ratio"
-    df['new_index'][10] = "Last Actual NAV"
-    df['new_index'][11] = "Last Actual NAV Date"
-    df['new_index'][12] = "Last Actual Disc/Premium"
-    df['new_index'][13] = "6-Month Avg Disc/Prem"
-    df['new_index'][14] = "3-Year Avg Disc/Prem"
-    df['new_index'][15] = "Total Dist. Rate (Share Price)"
+def performance_history_many(tickers, max_workers = None, typed = False):
+    """
+    Description:
+    Get the performance history of several ETFs, funds or stocks at once
+    (see performance_history()).
 
-    # Promote the 'new_index' column as the new index
-    df2 = df.set_index('new_index')
-    df = df2
+    Parameters:
+    tickers - List of etf, fund or stock tickers.
+    max_workers - The number of tickers processed concurrently.
+        Default: the web batch fetch setting.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
-    # Clear the index name
-    df.index.name = ""
+    Returns:
+    (DataFrame, failed) tuple. The DataFrame rows are indexed by (ticker,
+    row label). failed is a dict of ticker to error message, for the
+    tickers that could not be resolved.
+    """
+    return _panel(performance_history, tickers, (), max_workers, typed,
+                  _performance_history_url)
 
-    # Set the ticker name as column label
-    df.columns = [ticker.upper()]
+def trailing_total_returns_many(tickers, max_workers = None, typed = False):
+    """
+    Description:
+    Get the trailing total returns of several securities at once (see
+    trailing_total_returns()).
 
-    df.iloc[0, 0] = soup.find("div", {"id": "lastPrice"}).getText().strip()
-    df.iloc[1, 0] = soup.find("span", {"id": "price-daychange-value"}).getText().strip()
-    df.iloc[2, 0] = soup.find("span", {"id": "price-daychange-per"}).getText().strip()
-    df.iloc[3, 0] = soup.find("span", {"id" : "last-date"}).getText().strip()
-    df.iloc[4, 0] = soup.find("span", {"id" : "last-closing-price"}).getText().strip()
-    df.iloc[5, 0] = soup.find("td", {"id" : "day-range"}).getText().strip()
-    df.iloc[6, 0] = soup.find("td", {"id" : "fiftytwo-range"}).getText().strip()
-    df.iloc[7, 0] = soup.findAll("td")[3].getText().strip()
-    df.iloc[8, 0] = soup.findAll("td")[4].getText().strip()
-    df.iloc[9, 0] = soup.findAll("td")[5].getText().strip()
-    df.iloc[10, 0] = soup.find("td", {"id" : "last-act-nav"}).getText().strip()
-    df.iloc[11, 0] = soup.findAll("td")[8].getText().strip()
-    df.iloc[12, 0] = soup.find("td", {"id" : "last-discount"}).getText().strip()
-    df.iloc[13, 0] = soup.findAll("td")[10].getText().strip()
-    df.iloc[14, 0] = soup.findAll("td")[11].getText().strip()
-    df.iloc[15, 0] = soup.findAll("td")[12].getText().strip()
+    Parameters:
+    tickers - List of tickers.
+    max_workers - The number of tickers processed concurrently.
+        Default: the web batch fetch setting.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
-    return df
+    Returns:
+    (DataFrame, failed) tuple, as for performance_history_many().
+    """
+    return _panel(trailing_total_returns, tickers, (), max_workers, typed,
+                  _trailing_total_returns_url)
 
-def etf_quote(ticker):
+def historical_quarterly_returns_many(tickers, years = 5, frequency = "q", max_workers = None, typed = False):
     """
     Description:
-    Get the fund net asset value, and other related data.
+    Get the historical quarterly returns of several securities at once (see
+    historical_quarterly_returns()).
+
+    Parameters:
+    tickers - List of etf, fund or stock tickers.
+    years - The number of years. Default: 5.
+    frequency - "q" for quarterly, "m" for monthly. Default: "q"
+    max_workers - The number of tickers processed concurrently.
+        Default: the web batch fetch setting.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
+
+    Returns:
+    (DataFrame, failed) tuple, as for performance_history_many().
+    """
+    return _panel(historical_quarterly_returns, tickers, (years, frequency), max_workers, typed,
+                  _historical_quarterly_returns_url)
+
+def _performance_history_url(ticker):
+    """
+    Returns the performance_history() page URL of a ticker, or None.
+    """
+    tt = ticker_type(ticker)
+    if tt == "CEF" or tt == "ETF" or tt == "Mutual Fund":
+        return _ETF_PERFORMANCE_HISTORY_URL + ticker
+    if tt == "Index":
+        return _INDEX_PERFORMANCE_HISTORY_URL + ticker
+    if tt == "Stock":
+        return _STOCK_PERFORMANCE_HISTORY_URL + ticker
+
+    return None
+
+def _trailing_total_returns_url(ticker):
+    """
+    Returns the trailing_total_returns() page URL of a ticker, or None.
+    """
+    tt = ticker_type(ticker)
+    if tt == "CEF" or tt == "ETF" or tt == "Mutual Fund" or tt == "Stock":
+        return _ETF_TRAILING_TOTAL_RETURNS_URL + ticker
+    if tt == "Index":
+        return _INDEX_TRAILING_TOTAL_RETURNS_URL + ticker
+
+    return None
+
+def _historical_quarterly_returns_url(ticker, years, frequency):
+    """
+    Returns the historical_quarterly_returns() page URL of a ticker, or None.
+    """
+    if ticker_type(ticker) not in ("CEF", "ETF", "Index", "Mutual Fund", "Stock"):
+        return None
+
+    return _CEF_HISTORICAL_RETURNS_URL % (years, frequency) + ticker
+
+def _page_url(page_url, ticker, args):
+    try:
+        return page_url(ticker, *args)
+    except Exception:
+        # Reported by the ticker function
+        return None
+
+def _panel(function, tickers, args, max_workers, typed = False, page_url = None):
+    """
+    Runs a single ticker function for several tickers in a thread pool, and
+    concatenates the results into one DataFrame indexed by (ticker, row),
+    converted to numbers and dates if typed.
+
+    With page_url, a function returning the page URL of function(ticker,
+    *args), and parse worker processes configured (see
+    web.configure_parse_pool()) for a batch this large, the pages are first
+    fetched concurrently and parsed by the workers through
+    web.parse_web_pages(). The parse cache is sized for the batch, so the
+    ticker function reads them from it. Otherwise each ticker's pages are
+    fetched and parsed by its own thread. Either way the fetches overlap,
+    within the per-host throttling of the web module.
+    """
+    # Unique tickers, in order
+    tickers = list(OrderedDict.fromkeys(tickers))
+
+    # Resolve the known ticker types in one lookup
+    preload(tickers)
+
+    if max_workers is None:
+        max_workers = web._max_workers
+
+    # Parsing ahead only pays off in worker processes, and if the parsed
+    # pages stay in the parse cache until the ticker functions read them
+    cache_size = web._parse_cache_size
+    if cache_size <= 0 or web._parse_workers <= 0 or len(tickers) < web._parse_min_batch:
+        page_url = None
+
+    frames = dict()
+    failed = dict()
+    if tickers:
+        with concurrent.futures.ThreadPoolExecutor(max_workers = min(max_workers, len(tickers))) as executor:
+            try:
+                if page_url is not None:
+                    if cache_size < len(tickers):
+                        web.set_parse_cache_size(len(tickers))
+
+                    urls = executor.map(lambda ticker: _page_url(page_url, ticker, args), tickers)
+                    web.parse_web_pages([url for url in urls if url is not None])
+
+                futures = dict((executor.submit(function, ticker, *args), ticker) for ticker in tickers)
+
+                for future in concurrent.futures.as_completed(futures):
+                    ticker = futures[future]
+                    try:
+                        df = future.result()
+                    except Exception as e:
+                        failed[ticker] = str(e) or e.__class__.__name__
+                        continue
+
+                    if df is None:
+                        failed[ticker] = "Unknown ticker type"
+                    else:
+                        frames[ticker] = df
+            finally:
+                if web._parse_cache_size != cache_size:
+                    web.set_parse_cache_size(cache_size)
+
+    keys = [ticker for ticker in tickers if ticker in frames]
+    if not keys:
+        return pd.DataFrame(), failed
+
+    panel = pd.concat([frames[ticker] for ticker in keys], keys = keys)
+    panel.index.names = ["Ticker", ""]
+
+    return _typed(panel, typed), failed
+
+def cef_quote(ticker, typed = False):
+    """
+    Description:
+    Get the cef net asset value, and other related data.
 
     Parameters:
     ticker - The fund ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returns:
 
     """
     # Ticker check    
     tt = ticker_type(ticker)
-    if tt != "ETF":
+    if tt != "CEF":
         return None    
 
     # The Morningstar URL for etfs
-    url = "http://etfs.morningstar.com/quote-banner?&t=" + ticker
-    
-    # Get the page
-    web_page = web.get_web_page(url, False)
-
-    # Parse the contents
-    soup = BeautifulSoup(web_page, 'lxml')
-
-    df = pd.DataFrame(columns = range(1), 
-                      index = range(21))
+    url = "http://cef.morningstar.com/cefq/cef-header?&t=" + ticker
     
-    # Set the index
-    df['new_index'] = None
-    df['new_index'][0] = "Last Price"
-    df['new_index'][1] = "Day Change"
-    df['new_index'][2] = "Day Change %"
-    df['new_index'][3] = "As Of"
-    df['new_index'][4] = "Intraday Indicative Value"
-    df['new_index'][5] = "IIV Change"
-    df['new_index'][6] = "IIV Change %"
-    df['new_index'][7] = "IIV As Of"
-    df['new_index'][8] = "NAV"
-    df['new_index'][9] = "Open Price"
-    df['new_index'][10] = "Day Range"
-    df['new_index'][11] = "52-Week Range"
-    df['new_index'][12] = "12-Mo. Yield"
-    df['new_index'][13] = "Total Assets"
-    df['new_index'][14] = "Expenses"
-    df['new_index'][15] = "Prem/Discount"
-    df['new_index'][16] = "Volume"
-    df['new_index'][17] = "Avg Vol."
-    df['new_index'][18] = "Sec. Yield %"
-    df['new_index'][19] = "Bid/Ask/Spread"
-    df['new_index'][20] = "Category"
+    # Get the page elements
+    fields = web.get_web_page_fields(url, False)
+    tds = fields.td_texts()
+
+    def td(idx):
+        return tds[idx] if idx < len(tds) else ""
+
+    labels = ["Last Price",
+              "Day Change",
+              "Day Change %",
+              "As Of",
+              "Last Closing Price",
+              "Day Range",
+              "52-WK Range",
+              "1-Year Z-Statistic",
+              "Market Value",
+              "Total Leverage Ratio",
+              "Last Actual NAV",
+              "Last Actual NAV Date",
+              "Last Actual Disc/Premium",
+              "6-Month Avg Disc/Prem",
+              "3-Year Avg Disc/Prem",
+              "Total Dist. Rate (Share Price)"]
+
+    values = [fields.text("div", "id", "lastPrice"),
+              fields.text("span", "id", "price-daychange-value"),
+              fields.text("span", "id", "price-daychange-per"),
+              fields.text("span", "id", "last-date"),
+              fields.text("span", "id", "last-closing-price"),
+              fields.text("td", "id", "day-range"),
+              fields.text("td", "id", "fiftytwo-range"),
+              td(3),
+              td(4),
+              td(5),
+              fields.text("td", "id", "last-act-nav"),
+              td(8),
+              fields.text("td", "id", "last-discount"),
+              td(10),
+              td(11),
+              td(12)]
+
+    return _typed(_quote_frame(ticker, labels, values), typed)
+
+def etf_quote(ticker, typed = False):
+    """
+    Description:
+    Get the fund net asset value, and other related data.
 
-    # Promote the 'new_index' column as the new index
-    df2 = df.set_index('new_index')
-    df = df2
+    Parameters:
+    ticker - The fund ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
-    # Clear the index name
-    df.index.name = ""
+    Returns:
 
-    # Set the ticker name as column label
-    df.columns = [ticker.upper()]
+    """
+    # Ticker check    
+    tt = ticker_type(ticker)
+    if tt != "ETF":
+        return None    
 
-    df.iloc[0, 0] = soup.find("div", {"id": "lastPrice"}).getText().strip()
-    df.iloc[1, 0] = soup.find("span", {"id": "day_change"}).getText().strip()
-    df.iloc[2, 0] = soup.find("span", {"id": "day_changeP"}).getText().strip()
-    df.iloc[3, 0] = soup.find("span", {"id" : "isDate"}).getText().strip() + " " + soup.find("span", {"id" : "Timezone"}).getText().strip()
-    df.iloc[4, 0] = soup.find("div", {"id" : "IIV_lastPrice"}).getText().strip()
-    df.iloc[5, 0] = soup.find("span", {"id" : "IIV_day_change"}).getText().strip()
-    df.iloc[6, 0] = soup.find("span", {"id" : "IIV_day_changeP"}).getText().strip()
-    df.iloc[7, 0] = soup.find("span", {"id" : "isDateIV"}).getText().strip() + " " + soup.find("span", {"id" : "Timezone"}).getText().strip()
-    df.iloc[8, 0] = soup.find("span", {"id": "NAV"}).getText().strip()
-    df.iloc[9, 0] = soup.find("span", {"id": "OpenPrice"}).getText().strip()
-    df.iloc[10, 0] = soup.find("span", {"id": "dayRange"}).getText().strip()
-    df.iloc[11, 0] = soup.find("span", {"id": "week52Range"}).getText().strip()
-    df.iloc[12, 0] = soup.find("span", {"id": "Yield"}).getText().strip()
-    df.iloc[13, 0] = soup.find("span", {"id": "totalAssets"}).getText().strip()
-    df.iloc[14, 0] = soup.find("span", {"id": "Expenses"}).getText().strip()
-    df.iloc[15, 0] = soup.find("span", {"id": "premDiscount"}).getText().strip()
-    df.iloc[16, 0] = soup.find("span", {"id": "volume"}).getText().strip()
-
-    volume = soup.find("span", {"id": "volume"})
-    df.iloc[17, 0] = volume.parent.find_next_sibling("td", class_="gr_table_colm2b").find("span").getText().strip()
-
-    df.iloc[18, 0] = soup.find("span", {"id": "Leverage"}).getText().strip()
-    df.iloc[19, 0] = soup.find("span", {"id": "bid"}).getText().strip() + "/" + soup.find("span", {"id": "ask"}).getText().strip() + "/" + soup.find("span", {"id": "BidAskSpread"}).getText().strip() + "%"
-    df.iloc[20, 0] = soup.find("span", {"id": "MorningstarCategory"}).getText().strip()
+    # The Morningstar URL for etfs
+    url = "http://etfs.morningstar.com/quote-banner?&t=" + ticker
+    
+    # Get the page elements
+    fields = web.get_web_page_fields(url, False)
+
+    labels = ["Last Price",
+              "Day Change",
+              "Day Change %",
+              "As Of",
+              "Intraday Indicative Value",
+              "IIV Change",
+              "IIV Change %",
+              "IIV As Of",
+              "NAV",
+              "Open Price",
+              "Day Range",
+              "52-Week Range",
+              "12-Mo. Yield",
+              "Total Assets",
+              "Expenses",
+              "Prem/Discount",
+              "Volume",
+              "Avg Vol.",
+              "Sec. Yield %",
+              "Bid/Ask/Spread",
+              "Category"]
+
+    timezone = fields.text("span", "id", "Timezone")
+
+    # The average volume is in the 'gr_table_colm2b' cell after the volume
+    avg_volume = ""
+    volume = fields.find("span", "id", "volume")
+    if volume is not None and volume.getparent() is not None:
+        for td in volume.getparent().itersiblings("td"):
+            if "gr_table_colm2b" in td.get("class", "").split():
+                span = td.find(".//span")
+                if span is not None:
+                    avg_volume = web.element_text(span)
+                break
+
+    values = [fields.text("div", "id", "lastPrice"),
+              fields.text("span", "id", "day_change"),
+              fields.text("span", "id", "day_changeP"),
+              fields.text("span", "id", "isDate") + " " + timezone,
+              fields.text("div", "id", "IIV_lastPrice"),
+              fields.text("span", "id", "IIV_day_change"),
+              fields.text("span", "id", "IIV_day_changeP"),
+              fields.text("span", "id", "isDateIV") + " " + timezone,
+              fields.text("span", "id", "NAV"),
+              fields.text("span", "id", "OpenPrice"),
+              fields.text("span", "id", "dayRange"),
+              fields.text("span", "id", "week52Range"),
+              fields.text("span", "id", "Yield"),
+              fields.text("span", "id", "totalAssets"),
+              fields.text("span", "id", "Expenses"),
+              fields.text("span", "id", "premDiscount"),
+              fields.text("span", "id", "volume"),
+              avg_volume,
+              fields.text("span", "id", "Leverage"),
+              fields.text("span", "id", "bid") + "/" + fields.text("span", "id", "ask") + "/" + fields.text("span", "id", "BidAskSpread") + "%",
+              fields.text("span", "id", "MorningstarCategory")]
+
+    df = _quote_frame(ticker, labels, values)
 
     # For python 3 and later...
     if (sys.version_info[0] >= 3):
         # Fix the unprintable unicode characters
-        df1 = df.applymap(lambda x: unidecode.unidecode(x))
+        df1 = df.apply(lambda column: column.map(lambda x: unidecode.unidecode(x)))
         df = df1
 
-    return df
+    return _typed(df, typed)
+
+def _last_date_text(fields, span_id):
+    """
+    Returns the text of the fund quote 'LastDate' span with the id. Raises
+    ValueError if there is none.
+    """
+    for element in fields.find_all("span", "vkey", "LastDate"):
+        if element.get("id") == span_id:
+            return web.element_text(element)
+
+    raise ValueError("No 'span' element with vkey='LastDate' and id='%s' in the page" % span_id)
 
-def fund_quote(ticker):
+def fund_quote(ticker, typed = False):
     """
     Description:
     Get the fund net asset value, and other related data.
 
     Parameters:
     ticker - The fund ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returns:
 
@@ -949,74 +1342,63 @@ def fund_quote(ticker):
     # The Morningstar URL for funds
     url = "http://quotes.morningstar.com/fund/c-header?&t=" + ticker
     
-    # Get the page
-    web_page = web.get_web_page(url, False)
-
-    # Parse the contents
-    soup = BeautifulSoup(web_page, 'lxml')
-
-    df = pd.DataFrame(columns = range(1), 
-                      index = range(15))
-    
-    # Set the index
-    df['new_index'] = None
-    df['new_index'][0] = soup.find("h3", {"gkey": "NAV"}).getText().strip()
-    df['new_index'][1] = soup.find("h3", {"gkey": "NavChange"}).getText().strip() + " %"
-    df['new_index'][2] = soup.find("span", {"gkey": "AsOf"}).getText().strip()
-    df['new_index'][3] = soup.find("span", {"gkey": "OneDayReturnAsOf"}).getText().strip()
-    df['new_index'][4] = soup.find("h3", {"gkey": "ttmYield"}).getText().strip()
-    df['new_index'][5] = soup.find("h3", {"gkey": "Load"}).getText().strip()
-    df['new_index'][6] = soup.find("h3", {"gkey": "TotalAssets"}).getText().strip()
-    df['new_index'][7] = soup.find("a", {"gkey": "ExpenseRatio"}).getText().strip()
-    df['new_index'][8] = soup.find("a", {"gkey": "FeeLevel"}).getText().strip()
-    df['new_index'][9] = soup.find("h3", {"gkey": "Turnover"}).getText().strip()
-    df['new_index'][10] = soup.find("h3", {"gkey": "Status"}).getText().strip()
-    df['new_index'][11] = soup.find("h3", {"gkey": "MinInvestment"}).getText().strip()
-    df['new_index'][12] = soup.find("h3", {"gkey": "Yield"}).getText().strip()
-    df['new_index'][13] = soup.find("h3", {"gkey": "MorningstarCategory"}).getText().strip()
-    df['new_index'][14] = soup.find("h3", {"gkey": "InvestmentStyle"}).getText().strip()
-
-    # Promote the 'new_index' column as the new index
-    df2 = df.set_index('new_index')
-    df = df2
-
-    # Clear the index name
-    df.index.name = ""
-
-    # Set the ticker name as column label
-    df.columns = [ticker.upper()]
-
-    df.iloc[0, 0] = soup.find("span", {"vkey": "NAV"}).getText().strip()
-    df.iloc[1, 0] = soup.find("div", {"vkey": "DayChange"}).getText().strip()
-    df.iloc[2, 0] = soup.find("span", {"id" : "asOfDate", "vkey": "LastDate"}).getText().strip()
-    df.iloc[3, 0] = soup.find("span", {"id" : "oneDayReturnAsOfDate", "vkey": "LastDate"}).getText().strip()
-    df.iloc[4, 0] = soup.find("span", {"vkey": "ttmYield"}).getText().strip()
-    df.iloc[5, 0] = soup.find("span", {"vkey": "Load"}).getText().strip()
-    df.iloc[6, 0] = soup.find("span", {"vkey": "TotalAssets"}).getText().strip()
-    df.iloc[7, 0] = soup.find("span", {"vkey": "ExpenseRatio"}).getText().strip()
-    df.iloc[8, 0] = soup.find("span", {"vkey": "FeeLevel"}).getText().strip()
-    df.iloc[9, 0] = soup.find("span", {"vkey": "Turnover"}).getText().strip()
-    df.iloc[10, 0] = soup.find("span", {"vkey": "Status"}).getText().strip()
-    df.iloc[11, 0] = soup.find("span", {"vkey": "MinInvestment"}).getText().strip()
-    df.iloc[12, 0] = soup.find("span", {"vkey": "Yield"}).getText().strip()
-    df.iloc[13, 0] = soup.find("span", {"vkey": "MorningstarCategory"}).getText().strip()
-    df.iloc[14, 0] = soup.find("span", {"vkey": "InvestmentStyle"}).getText().strip()
+    # Get the page elements, in a single pass
+    fields = web.get_web_page_fields(url, False)
+
+    # Labels, as gkey lookups. The fields are required, so that a change of
+    # the page layout raises rather than returning a blank quote
+    labels = [fields.text("h3", "gkey", "NAV", True),
+              fields.text("h3", "gkey", "NavChange", True) + " %",
+              fields.text("span", "gkey", "AsOf", True),
+              fields.text("span", "gkey", "OneDayReturnAsOf", True),
+              fields.text("h3", "gkey", "ttmYield", True),
+              fields.text("h3", "gkey", "Load", True),
+              fields.text("h3", "gkey", "TotalAssets", True),
+              fields.text("a", "gkey", "ExpenseRatio", True),
+              fields.text("a", "gkey", "FeeLevel", True),
+              fields.text("h3", "gkey", "Turnover", True),
+              fields.text("h3", "gkey", "Status", True),
+              fields.text("h3", "gkey", "MinInvestment", True),
+              fields.text("h3", "gkey", "Yield", True),
+              fields.text("h3", "gkey", "MorningstarCategory", True),
+              fields.text("h3", "gkey", "InvestmentStyle", True)]
+
+    # Values, as vkey lookups
+    values = [fields.text("span", "vkey", "NAV", True),
+              fields.text("div", "vkey", "DayChange", True),
+              _last_date_text(fields, "asOfDate"),
+              _last_date_text(fields, "oneDayReturnAsOfDate"),
+              fields.text("span", "vkey", "ttmYield", True),
+              fields.text("span", "vkey", "Load", True),
+              fields.text("span", "vkey", "TotalAssets", True),
+              fields.text("span", "vkey", "ExpenseRatio", True),
+              fields.text("span", "vkey", "FeeLevel", True),
+              fields.text("span", "vkey", "Turnover", True),
+              fields.text("span", "vkey", "Status", True),
+              fields.text("span", "vkey", "MinInvestment", True),
+              fields.text("span", "vkey", "Yield", True),
+              fields.text("span", "vkey", "MorningstarCategory", True),
+              fields.text("span", "vkey", "InvestmentStyle", True)]
+
+    df = _quote_frame(ticker, labels, values)
 
     # For python 3 and later...
     if (sys.version_info[0] >= 3):
         # Fix the unprintable unicode characters
-        df1 = df.applymap(lambda x: unidecode.unidecode(x))
+        df1 = df.apply(lambda column: column.map(lambda x: unidecode.unidecode(x)))
         df = df1
 
-    return df
+    return _typed(df, typed)
 
-def stock_quote(ticker):
+def stock_quote(ticker, typed = False):
     """
     Description:
     Get the etf or stock quote, and other related data.
 
     Parameters:
     ticker - The etf or stock ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returns:
 
@@ -1029,100 +1411,115 @@ def stock_quote(ticker):
     # The Morningstar URL for funds
     url = "http://quotes.morningstar.com/stock/c-header?&t=" + ticker
     
-    # Get the page
-    web_page = web.get_web_page(url, False)
-
-    # Parse the contents
-    soup = BeautifulSoup(web_page, 'lxml')
-
-    df = pd.DataFrame(columns = range(1), 
-                      index = range(18))
-    
-    # Set the index
-    df['new_index'] = None
-    df['new_index'][0] = soup.find("h3", {"gkey": "LastPrice"}).getText().strip()
-    df['new_index'][1] = soup.find("h3", {"gkey": "DayChange"}).getText().strip()
-    df['new_index'][2] = "Day Change %"
-    df['new_index'][3] = "After Hours"
-    df['new_index'][4] = "After Hours Change"
-    df['new_index'][5] = "After Hours Change %"
-    df['new_index'][6] = soup.find("span", {"gkey": "AsOf"}).getText().strip()
-    df['new_index'][7] = soup.find("h3", {"gkey": "OpenPrice"}).getText().strip()
-    df['new_index'][8] = soup.find("h3", {"gkey": "DayRange"}).getText().strip()
-    df['new_index'][9] = soup.find("h3", {"gkey": "_52Week"}).getText().strip()
-    df['new_index'][10] = soup.find("h3", {"gkey": "ProjectedYield"}).getText().strip()
-    df['new_index'][11] = soup.find("h3", {"gkey": "MarketCap"}).getText().strip()
-    df['new_index'][12] = soup.find("h3", {"gkey": "Volume"}).getText().strip()
-    df['new_index'][13] = soup.find("h3", {"gkey": "AverageVolume"}).getText().strip()
-    df['new_index'][14] = soup.find("span", {"gkey": "PE"}).getText().strip()
-    df['new_index'][15] = soup.find("h3", {"gkey": "PB"}).getText().strip()
-    df['new_index'][16] = soup.find("h3", {"gkey": "PS"}).getText().strip()
-    df['new_index'][17] = soup.find("h3", {"gkey": "PC"}).getText().strip()
-
-    # Promote the 'new_index' column as the new index
-    df2 = df.set_index('new_index')
-    df = df2
-
-    # Clear the index name
-    df.index.name = ""
-
-    # Set the ticker name as column label
-    df.columns = [ticker.upper()]
-
-    df.iloc[0, 0] = soup.find("div", {"vkey": "LastPrice"}).getText().strip()
-    df.iloc[1, 0] = soup.find("div", {"vkey": "DayChange"}).getText().split("|")[0].strip()
-    df.iloc[2, 0] = soup.find("div", {"vkey": "DayChange"}).getText().split("|")[1].strip()
-
-    afth = soup.find("span", {"id": "after-hours"})
-    if afth:
-        df.iloc[3, 0] = afth.getText().strip()
-    else:
-        df.iloc[3, 0] = ""    
-
-    afth = soup.find("span", {"id": "after-daychange-value"})
-    if afth:
-        df.iloc[4, 0] = afth.getText().strip()
-    else:
-        df.iloc[4, 0] = ""    
-
-    afth = soup.find("span", {"id": "after-daychange-per"})
-    if afth:
-        df.iloc[5, 0] = afth.getText().strip()
-    else:
-        df.iloc[5, 0] = ""    
-
-    df.iloc[6, 0] = soup.find("span", {"id": "asOfDate"}).getText().strip() + " " + soup.find("span", {"id": "timezone"}).getText().strip()
-    df.iloc[7, 0] = soup.find("span", {"vkey": "OpenPrice"}).getText().strip()
-    df.iloc[8, 0] = soup.find("span", {"vkey": "DayRange"}).getText().strip()
-    df.iloc[9, 0] = soup.find("span", {"vkey": "_52Week"}).getText().strip()
-    df.iloc[10, 0] = soup.find("span", {"vkey": "ProjectedYield"}).getText().strip()
-    df.iloc[11, 0] = soup.find("span", {"id": "MarketCap"}).getText().strip()
-    df.iloc[12, 0] = soup.find("span", {"vkey": "Volume"}).getText().strip()
-    df.iloc[13, 0] = soup.find("span", {"vkey": "AverageVolume"}).getText().strip()
-    df.iloc[14, 0] = soup.find("span", {"vkey": "PE"}).getText().strip()
-    df.iloc[15, 0] = soup.find("span", {"vkey": "PB"}).getText().strip()
-    df.iloc[16, 0] = soup.find("span", {"vkey": "PS"}).getText().strip()
-    df.iloc[17, 0] = soup.find("span", {"vkey": "PC"}).getText().strip()
+    # Get the page elements, in a single pass
+    fields = web.get_web_page_fields(url, False)
+
+    # Labels, as gkey lookups
+    labels = [fields.text("h3", "gkey", "LastPrice"),
+              fields.text("h3", "gkey", "DayChange"),
+              "Day Change %",
+              "After Hours",
+              "After Hours Change",
+              "After Hours Change %",
+              fields.text("span", "gkey", "AsOf"),
+              fields.text("h3", "gkey", "OpenPrice"),
+              fields.text("h3", "gkey", "DayRange"),
+              fields.text("h3", "gkey", "_52Week"),
+              fields.text("h3", "gkey", "ProjectedYield"),
+              fields.text("h3", "gkey", "MarketCap"),
+              fields.text("h3", "gkey", "Volume"),
+              fields.text("h3", "gkey", "AverageVolume"),
+              fields.text("span", "gkey", "PE"),
+              fields.text("h3", "gkey", "PB"),
+              fields.text("h3", "gkey", "PS"),
+              fields.text("h3", "gkey", "PC")]
+
+    # The day change is formatted as "change | change %"
+    day_change = fields.text("div", "vkey", "DayChange").split("|")
+    day_change.append("")
+
+    # Values, as vkey lookups. The after hours values may be missing.
+    values = [fields.text("div", "vkey", "LastPrice"),
+              day_change[0].strip(),
+              day_change[1].strip(),
+              fields.text("span", "id", "after-hours"),
+              fields.text("span", "id", "after-daychange-value"),
+              fields.text("span", "id", "after-daychange-per"),
+              fields.text("span", "id", "asOfDate") + " " + fields.text("span", "id", "timezone"),
+              fields.text("span", "vkey", "OpenPrice"),
+              fields.text("span", "vkey", "DayRange"),
+              fields.text("span", "vkey", "_52Week"),
+              fields.text("span", "vkey", "ProjectedYield"),
+              fields.text("span", "id", "MarketCap"),
+              fields.text("span", "vkey", "Volume"),
+              fields.text("span", "vkey", "AverageVolume"),
+              fields.text("span", "vkey", "PE"),
+              fields.text("span", "vkey", "PB"),
+              fields.text("span", "vkey", "PS"),
+              fields.text("span", "vkey", "PC")]
+
+    df = _quote_frame(ticker, labels, values)
 
     # For python 3 and later...
     if (sys.version_info[0] >= 3):
         # Fix the unprintable unicode characters
-        df1 = df.applymap(lambda x: unidecode.unidecode(x))
+        df1 = df.apply(lambda column: column.map(lambda x: unidecode.unidecode(x)))
         df = df1
 
-    return df
-
-def fund_asset_allocation(ticker):
-    """
-    Description:
-    Get etf or fund asset allocation. Does not work for stocks.
-    
-    Parameters:
-    ticker - The etf or fund ticker.
-
-    Returs: 
-    DataFrame with the performance history. 
-    Run 'morningstar.py aas ticker' to see the result format.
+    return _typed(df, typed)
+
+# The fund summary page tables (see tablespec.py)
+_FUND_SUMMARY_SPECS = {
+    "asset_allocation": {
+        "table": 1,
+        "rows": [0, 3, 5, 7, 9, 11],
+        "columns": 7,
+        "copy_cells": { (0, 0): (1, 0) },
+        "labels": { (0, 5): "Benchmark" },
+        "ascii": True,
+        "expect": ["cash", "usstock", "nonusstock", "bond", "other"] },
+    "market_capitalization": {
+        "table": 2,
+        "rows": [0, 2, 4, 6, 8, 10],
+        "columns": 4,
+        "expect": ["giant", "large", "medium", "small", "micro"] },
+    "sector_weightings": {
+        "table": 5,
+        "rows": [0, 4, 6, 8, 10, 15, 17, 19, 21, 26, 28, 30],
+        "columns": 8,
+        "fillna": "",
+        "labels": { (0, 0): "Type",
+                    (0, 1): "Category",
+                    (1, 1): "Cyclical",
+                    (2, 1): "Cyclical",
+                    (3, 1): "Cyclical",
+                    (4, 1): "Cyclical",
+                    (5, 1): "Sensitive",
+                    (6, 1): "Sensitive",
+                    (7, 1): "Sensitive",
+                    (8, 1): "Sensitive",
+                    (9, 1): "Defensive",
+                    (10, 1): "Defensive",
+                    (11, 1): "Defensive" },
+        "drop_columns": [5],
+        "expect": ["basicmaterials", "consumercyclical", "financialservices", "realestate",
+                   "communicationservices", "energy", "industrials", "technology",
+                   "consumerdefensive", "healthcare", "utilities"] },
+    "market_regions": {
+        "table": 6,
+        "rows": [0, 3, 5, 7, 9, 11, 13, 15, 17, 19, 21, 23, 25, 27, 32, 34],
+        "columns": 4,
+        "fillna": "",
+        "ascii": True,
+        "expect": ["americas", "northamerica", "latinamerica",
+                   "greatereurope", "unitedkingdom", "europedeveloped", "europeemerging", "africamiddleeast",
+                   "greaterasia", "japan", "australasia", "asiadeveloped", "asiaemerging",
+                   "developed", "emerging"] },
+}
+
+def _fund_summary_table(ticker, name, typed):
+    """
+    Extracts a fund summary page table, according to its spec.
     """
     # Ticker check    
     tt = ticker_type(ticker)
@@ -1131,215 +1528,119 @@ def fund_asset_allocation(ticker):
 
     # The Morningstar URL
     url = "http://portfolios.morningstar.com/fund/summary?t="
-    
-    # Get the table
-    df = web.get_web_page_table(url + ticker, False, 1)
 
-    # Create new dataframe from rows 0, 3, 5, 7, 9, 11
-    df1 = pd.DataFrame(columns = range(7), 
-                       index = range(6))
+    spec = _FUND_SUMMARY_SPECS[name]
+    df = tablespec.extract(spec, web.get_web_page_table(url + ticker, False, spec["table"]))
 
-    df1.iloc[0] = df.iloc[0]
-    df1.iloc[1] = df.iloc[3]
-    df1.iloc[2] = df.iloc[5]
-    df1.iloc[3] = df.iloc[7]
-    df1.iloc[4] = df.iloc[9]
-    df1.iloc[5] = df.iloc[11]
+    return _typed(df, typed)
 
-    # Special handling of two cells
-    df1.iloc[0, 0] = df.iloc[1, 0]
-    df1.iloc[0, 5] = "Benchmark" 
+def validate_specs(tickers):
+    """
+    Description:
+    Checks the fund summary table specs against the pages of several
+    tickers, to detect page layout changes.
 
-    df = df1
+    Parameters:
+    tickers - List of etf or fund tickers.
 
-    # For python 3 and later...
-    if (sys.version_info[0] >= 3):
-        # Fix the unprintable unicode characters
-        df1 = df.applymap(lambda x: unidecode.unidecode(str(x)))
-        df = df1
+    Returns:
+    DataFrame with the "Ticker", "Table" and "Problem" columns, one row
+    per problem found.
+    """
+    # The Morningstar URL
+    url = "http://portfolios.morningstar.com/fund/summary?t="
 
-    # Promote 1st row and column as labels
-    df1 = web.dataframe_promote_1st_row_and_column_as_labels(df)
-    df = df1
+    problems = list()
+    for ticker in tickers:
+        tt = ticker_type(ticker)
+        if tt != "Mutual Fund" and tt != "ETF":
+            continue
 
-    return df
+        for name, spec in sorted(_FUND_SUMMARY_SPECS.items()):
+            try:
+                df = web.get_web_page_table(url + ticker, False, spec["table"])
+                df = tablespec.extract(spec, df, validate = False)
+                found = tablespec.check(spec, df)
+            except Exception as e:
+                found = [str(e) or e.__class__.__name__]
+
+            problems.extend([ticker, name, problem] for problem in found)
 
-def fund_market_capitalization(ticker):
+    return pd.DataFrame(problems, columns = ["Ticker", "Table", "Problem"])
+
+def fund_asset_allocation(ticker, typed = False):
     """
     Description:
-    Get etf or fund market capitalization. Does not work for stocks.
+    Get etf or fund asset allocation. Does not work for stocks.
     
     Parameters:
     ticker - The etf or fund ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returs: 
     DataFrame with the performance history. 
     Run 'morningstar.py aas ticker' to see the result format.
     """
-    # Ticker check    
-    tt = ticker_type(ticker)
-    if tt != "Mutual Fund" and tt != "ETF":
-        return None    
+    return _fund_summary_table(ticker, "asset_allocation", typed)
 
-    # The Morningstar URL
-    url = "http://portfolios.morningstar.com/fund/summary?t="
+def fund_market_capitalization(ticker, typed = False):
+    """
+    Description:
+    Get etf or fund market capitalization. Does not work for stocks.
     
-    # Get the table
-    df = web.get_web_page_table(url + ticker, False, 2)
-
-    # Create new dataframe from rows 0, 2, 4, 6, 8, 10
-    df1 = pd.DataFrame(columns = range(4), 
-                       index = range(6))
-
-    df1.iloc[0] = df.iloc[0]
-    df1.iloc[1] = df.iloc[2]
-    df1.iloc[2] = df.iloc[4]
-    df1.iloc[3] = df.iloc[6]
-    df1.iloc[4] = df.iloc[8]
-    df1.iloc[5] = df.iloc[10]
-
-    df = df1
-
-    # Promote 1st row and column as labels
-    df1 = web.dataframe_promote_1st_row_and_column_as_labels(df)
-    df = df1
+    Parameters:
+    ticker - The etf or fund ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
-    return df
+    Returs: 
+    DataFrame with the performance history. 
+    Run 'morningstar.py aas ticker' to see the result format.
+    """
+    return _fund_summary_table(ticker, "market_capitalization", typed)
 
-def fund_sector_weightings(ticker):
+def fund_sector_weightings(ticker, typed = False):
     """
     Description:
     Get etf or fund sector weightings. Does not work for stocks.
     
     Parameters:
     ticker - The etf or fund ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returs: 
     DataFrame with the performance history. 
     Run 'morningstar.py aas ticker' to see the result format.
     """
-    # Ticker check    
-    tt = ticker_type(ticker)
-    if tt != "Mutual Fund" and tt != "ETF":
-        return None    
-
-    # The Morningstar URL
-    url = "http://portfolios.morningstar.com/fund/summary?t="
-    
-    # Get the table
-    df = web.get_web_page_table(url + ticker, False, 5)
-
-    df.fillna(value="", inplace=True)
-
-    # Create new dataframe from rows 0, 2, 4, 6, 8, 10
-    df1 = pd.DataFrame(columns = range(8), 
-                       index = range(12))
-
-    df1.iloc[0] = df.iloc[0]
-    df1.iloc[1] = df.iloc[4]
-    df1.iloc[2] = df.iloc[6]
-    df1.iloc[3] = df.iloc[8]
-    df1.iloc[4] = df.iloc[10]
-    df1.iloc[5] = df.iloc[15]
-    df1.iloc[6] = df.iloc[17]
-    df1.iloc[7] = df.iloc[19]
-    df1.iloc[8] = df.iloc[21]
-    df1.iloc[9] = df.iloc[26]
-    df1.iloc[10] = df.iloc[28]
-    df1.iloc[11] = df.iloc[30]
-
-    df1.iloc[0, 0] = "Type"
-    df1.iloc[0, 1] = "Category"
-    df1.iloc[1, 1] = "Cyclical"
-    df1.iloc[2, 1] = "Cyclical"
-    df1.iloc[3, 1] = "Cyclical"
-    df1.iloc[4, 1] = "Cyclical"
-    df1.iloc[5, 1] = "Sensitive"
-    df1.iloc[6, 1] = "Sensitive"
-    df1.iloc[7, 1] = "Sensitive"
-    df1.iloc[8, 1] = "Sensitive"
-    df1.iloc[9, 1] = "Defensive"
-    df1.iloc[10, 1] = "Defensive"
-    df1.iloc[11, 1] = "Defensive"
-
-    # Remove column 5
-    del df1[5]
+    return _fund_summary_table(ticker, "sector_weightings", typed)
 
-    df = df1
-
-    # Promote 1st row and column as labels
-    df1 = web.dataframe_promote_1st_row_and_column_as_labels(df)
-    df = df1
-
-    return df
-
-def fund_market_regions(ticker):
+def fund_market_regions(ticker, typed = False):
     """
     Description:
     Get etf or fund market regions. Does not work for stocks.
     
     Parameters:
     ticker - The etf or fund ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returs: 
     DataFrame with the performance history. 
     Run 'morningstar.py aas ticker' to see the result format.
     """
-    # Ticker check    
-    tt = ticker_type(ticker)
-    if tt != "Mutual Fund" and tt != "ETF":
-        return None    
-
-    # The Morningstar URL
-    url = "http://portfolios.morningstar.com/fund/summary?t="
-    
-    # Get the table
-    df = web.get_web_page_table(url + ticker, False, 6)
-
-    df.fillna(value="", inplace=True)
+    return _fund_summary_table(ticker, "market_regions", typed)
 
-    # Create new dataframe from rows 0, 2, 4, 6, 8, 10
-    df1 = pd.DataFrame(columns = range(4), 
-                       index = range(16))
-
-    df1.iloc[0] = df.iloc[0]
-    df1.iloc[1] = df.iloc[3]
-    df1.iloc[2] = df.iloc[5]
-    df1.iloc[3] = df.iloc[7]
-    df1.iloc[4] = df.iloc[9]
-    df1.iloc[5] = df.iloc[11]
-    df1.iloc[6] = df.iloc[13]
-    df1.iloc[7] = df.iloc[15]
-    df1.iloc[8] = df.iloc[17]
-    df1.iloc[9] = df.iloc[19]
-    df1.iloc[10] = df.iloc[21]
-    df1.iloc[11] = df.iloc[23]
-    df1.iloc[12] = df.iloc[25]
-    df1.iloc[13] = df.iloc[27]
-    df1.iloc[14] = df.iloc[32]
-    df1.iloc[15] = df.iloc[34]
-
-    df = df1
-
-    # For python 3 and later...
-    if (sys.version_info[0] >= 3):
-        # Fix the unprintable unicode characters
-        df1 = df.applymap(lambda x: unidecode.unidecode(str(x)))
-        df = df1
-
-    # Promote 1st row and column as labels
-    df1 = web.dataframe_promote_1st_row_and_column_as_labels(df)
-    df = df1
-
-    return df
-
-def stock_profile(ticker):
+def stock_profile(ticker, typed = False):
     """
     Description:
     Get stock profile.
     
     Parameters:
     ticker - The stock ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returs: 
     DataFrame with the stock profile history. 
@@ -1388,15 +1689,17 @@ def stock_profile(ticker):
     df.iloc[4, 0] = soup.find_all("div", {"class": "gr_colm1a"})[2].find("span", {"class": "gr_text7"}).getText().strip()
     df.iloc[5, 0] = soup.find_all("div", {"class": "gr_colm1a"})[3].find("span", {"class": "gr_text7"}).getText().strip()
 
-    return df
+    return _typed(df, typed)
 
-def stock_competitors(ticker):
+def stock_competitors(ticker, typed = False):
     """
     Description:
     Get stock competitors.
     
     Parameters:
     ticker - The stock ticker.
+    typed - If True, return numbers and dates instead of strings (see
+        web.dataframe_to_numeric()). Default: False.
 
     Returs: 
     DataFrame with the stock competitors. 
@@ -1419,285 +1722,293 @@ def stock_competitors(ticker):
     df.drop(df.index[0], inplace=True)
     df.drop(df.columns[2], axis=1, inplace=True)
 
-    return df
+    return _typed(df, typed)
 
 def _parse_ticker_type_f(args):
-    type = ticker_type(args.ticker)
-
-    if type != "":
-        print(type)
+    return batchcli.run(ticker_type, args)
 
 def _parse_ticker_name_f(args):
-    type = ticker_name(args.ticker)
-
-    if type != "":
-        print(type)
+    return batchcli.run(ticker_name, args)
 
 def _parse_fund_name_f(args):
-    type = fund_name(args.ticker)
-
-    if type != "":
-        print(type)
+    return batchcli.run(fund_name, args)
 
 def _parse_stock_name_f(args):
-    type = stock_name(args.ticker)
-
-    if type != "":
-        print(type)
+    return batchcli.run(stock_name, args)
 
 def _parse_pfh_f(args):
-    df = performance_history(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: performance_history(ticker, typed=args.typed), args)
 
 def _parse_nav_pfh_f(args):
-    df = nav_performance_history(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: nav_performance_history(ticker, typed=args.typed), args)
 
 def _parse_etf_pfh_f(args):
-    df = etf_performance_history(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: etf_performance_history(ticker, typed=args.typed), args)
 
 def _parse_index_pfh_f(args):
-    df = index_performance_history(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: index_performance_history(ticker, typed=args.typed), args)
 
 def _parse_fund_pfh_f(args):
-    df = fund_performance_history(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: fund_performance_history(ticker, typed=args.typed), args)
 
 def _parse_stock_pfh_f(args):
-    df = stock_performance_history(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: stock_performance_history(ticker, typed=args.typed), args)
 
 def _parse_pfh2_f(args):
-    df = fund_performance_history2(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: fund_performance_history2(ticker, typed=args.typed), args)
 
 def _parse_ttl_f(args):
-    df = trailing_total_returns(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: trailing_total_returns(ticker, typed=args.typed), args)
 
 def _parse_nav_ttl_f(args):
-    df = nav_trailing_total_returns(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: nav_trailing_total_returns(ticker, typed=args.typed), args)
 
 def _parse_etf_ttl_f(args):
-    df = etf_trailing_total_returns(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: etf_trailing_total_returns(ticker, typed=args.typed), args)
 
 def _parse_fund_ttl_f(args):
-    df = fund_trailing_total_returns(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: fund_trailing_total_returns(ticker, typed=args.typed), args)
 
 def _parse_ttl2_f(args):
-    df = fund_trailing_total_returns2(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: fund_trailing_total_returns2(ticker, typed=args.typed), args)
 
 def _parse_index_ttl_f(args):
-    df = index_trailing_total_returns(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: index_trailing_total_returns(ticker, typed=args.typed), args)
 
 def _parse_qtr_f(args):
-    df = historical_quarterly_returns(args.ticker, args.years, args.frequency)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: historical_quarterly_returns(ticker, args.years, args.frequency, typed=args.typed), args)
 
 def _parse_nav_qtr_f(args):
-    df = nav_historical_quarterly_returns(args.ticker, args.years, args.frequency)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: nav_historical_quarterly_returns(ticker, args.years, args.frequency, typed=args.typed), args)
 
 def _parse_cef_qtr_f(args):
-    df = cef_historical_quarterly_returns(args.ticker, args.years, args.frequency)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: cef_historical_quarterly_returns(ticker, args.years, args.frequency, typed=args.typed), args)
 
 def _parse_fund_qtr_f(args):
-    df = fund_historical_quarterly_returns(args.ticker, args.years, args.frequency)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: fund_historical_quarterly_returns(ticker, args.years, args.frequency, typed=args.typed), args)
+
+def _parse_qtr_store_f(args):
+    def stored_returns(ticker):
+        if not args.offline:
+            update_historical_returns(ticker, args.frequency)
+        return timeseries.get_store().query(ticker, args.frequency, args.start, args.end)
+
+    return batchcli.run(stored_returns, args)
 
 def _parse_qtr2_f(args):
-    df = fund2_historical_quarterly_returns(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: fund2_historical_quarterly_returns(ticker, typed=args.typed), args)
 
 def _parse_cef_quote(args):
-    df = cef_quote(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: cef_quote(ticker, typed=args.typed), args)
 
 def _parse_etf_quote(args):
-    df = etf_quote(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: etf_quote(ticker, typed=args.typed), args)
 
 def _parse_fund_quote(args):
-    df = fund_quote(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: fund_quote(ticker, typed=args.typed), args)
 
 def _parse_stock_quote(args):
-    df = stock_quote(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: stock_quote(ticker, typed=args.typed), args)
 
 def _parse_aal(args):
-    df = fund_asset_allocation(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: fund_asset_allocation(ticker, typed=args.typed), args)
 
 def _parse_mkc(args):
-    df = fund_market_capitalization(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: fund_market_capitalization(ticker, typed=args.typed), args)
 
 def _parse_sect(args):
-    df = fund_sector_weightings(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: fund_sector_weightings(ticker, typed=args.typed), args)
 
 def _parse_reg(args):
-    df = fund_market_regions(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: fund_market_regions(ticker, typed=args.typed), args)
+
+def _parse_validate_specs_f(args):
+    df = validate_specs(args.tickers)
+    print(tabulate(df, headers='keys', tablefmt='psql', showindex=False))
+    if len(df.index):
+        return 1
 
 def _parse_stock_profile(args):
-    df = stock_profile(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: stock_profile(ticker, typed=args.typed), args)
 
 def _parse_stock_competitors(args):
-    df = stock_competitors(args.ticker)
-    print(tabulate(df, headers='keys', tablefmt='psql'))
+    return batchcli.run(lambda ticker: stock_competitors(ticker, typed=args.typed), args)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Download Morningstar data.')
+    parser.add_argument('--record', metavar='ARCHIVE', help='Record the web responses into an archive')
+    parser.add_argument('--replay', metavar='ARCHIVE', help='Replay the web responses from an archive, without the network')
+    parser.add_argument('--standin', metavar='URL', help='Send the requests to a stand-in server (see cassette.py serve)')
+    parser.add_argument('--typed', action='store_true', help='Convert the tables to numbers and dates')
 
     # Subparsers
     subparsers = parser.add_subparsers(help='Sub-command help')
 
     parser_ticker_type = subparsers.add_parser('ticker-type', help='Get ticker type (cef, etf, index, fund, stock, cash)')
-    parser_ticker_type.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_ticker_type)
     parser_ticker_type.set_defaults(func=_parse_ticker_type_f)
 
     parser_ticker_name = subparsers.add_parser('ticker-name', help='Get name (all)')
-    parser_ticker_name.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_ticker_name)
     parser_ticker_name.set_defaults(func=_parse_ticker_name_f)
 
     parser_fund_name = subparsers.add_parser('fund-name', help='Get name (cef, etf, index, fund)')
-    parser_fund_name.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_fund_name)
     parser_fund_name.set_defaults(func=_parse_fund_name_f)
 
     parser_stock_name = subparsers.add_parser('stock-name', help='Get name (stock)')
-    parser_stock_name.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_stock_name)
     parser_stock_name.set_defaults(func=_parse_stock_name_f)
 
     parser_pfh = subparsers.add_parser('pfh', help='Performace history (all)')
-    parser_pfh.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_pfh)
     parser_pfh.set_defaults(func=_parse_pfh_f)
 
     parser_nav_pfh = subparsers.add_parser('nav-pfh', help='NAV performace history (etfs, funds, stocks)')
-    parser_nav_pfh.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_nav_pfh)
     parser_nav_pfh.set_defaults(func=_parse_nav_pfh_f)
 
     parser_etf_pfh = subparsers.add_parser('etf-pfh', help='Performace history (etfs, funds)')
-    parser_etf_pfh.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_etf_pfh)
     parser_etf_pfh.set_defaults(func=_parse_etf_pfh_f)
 
     parser_fund_pfh = subparsers.add_parser('fund-pfh', help='Performace history (funds)')
-    parser_fund_pfh.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_fund_pfh)
     parser_fund_pfh.set_defaults(func=_parse_fund_pfh_f)
 
     parser_index_pfh = subparsers.add_parser('index-pfh', help='Performace history (all)')
-    parser_index_pfh.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_index_pfh)
     parser_index_pfh.set_defaults(func=_parse_index_pfh_f)
 
     parser_stock_pfh = subparsers.add_parser('stock-pfh', help='Performace history (stocks)')
-    parser_stock_pfh.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_stock_pfh)
     parser_stock_pfh.set_defaults(func=_parse_stock_pfh_f)
 
     parser_pfh2 = subparsers.add_parser('pfh2', help='Performace history 2 (funds)')
-    parser_pfh2.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_pfh2)
     parser_pfh2.set_defaults(func=_parse_pfh2_f)
 
     parser_ttl = subparsers.add_parser('ttl', help='Trailing total returns (all)')
-    parser_ttl.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_ttl)
     parser_ttl.set_defaults(func=_parse_ttl_f)
 
     parser_etf_ttl = subparsers.add_parser('etf-ttl', help='Trailing total returns (all)')
-    parser_etf_ttl.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_etf_ttl)
     parser_etf_ttl.set_defaults(func=_parse_etf_ttl_f)
 
     parser_nav_ttl = subparsers.add_parser('nav-ttl', help='NAV trailing total returns (all)')
-    parser_nav_ttl.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_nav_ttl)
     parser_nav_ttl.set_defaults(func=_parse_nav_ttl_f)
 
     parser_fund_ttl = subparsers.add_parser('fund-ttl', help='Trailing total returns (etfs, funds, stocks)')
-    parser_fund_ttl.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_fund_ttl)
     parser_fund_ttl.set_defaults(func=_parse_fund_ttl_f)
 
     parser_index = subparsers.add_parser('index-ttl', help='Trailing total returns (indexes)')
-    parser_index.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_index)
     parser_index.set_defaults(func=_parse_index_ttl_f)
 
     parser_ttl2 = subparsers.add_parser('ttl2', help='Trailing total returns 2 (funds)')
-    parser_ttl2.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_ttl2)
     parser_ttl2.set_defaults(func=_parse_ttl2_f)
 
     parser_qtr = subparsers.add_parser('qtr', help='Historical quarterly returns (all)')
-    parser_qtr.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_qtr)
     parser_qtr.add_argument('-y', '--years', type=int, default=5, help='Number of years (default 5)')
     parser_qtr.add_argument('-f', '--frequency', default='q', help='Frequency (m=monthly, q=quarterly, default=q)')
     parser_qtr.set_defaults(func=_parse_qtr_f)
 
     parser_nav_qtr = subparsers.add_parser('nav-qtr', help='NAV historical quarterly returns (all)')
-    parser_nav_qtr.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_nav_qtr)
     parser_nav_qtr.add_argument('-y', '--years', type=int, default=5, help='Number of years (default 5)')
     parser_nav_qtr.add_argument('-f', '--frequency', default='q', help='Frequency (m=monthly, q=quarterly, default=q)')
     parser_nav_qtr.set_defaults(func=_parse_nav_qtr_f)
 
     parser_cef_qtr = subparsers.add_parser('cef-qtr', help='Historical quarterly returns (all)')
-    parser_cef_qtr.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_cef_qtr)
     parser_cef_qtr.add_argument('-y', '--years', type=int, default=5, help='Number of years (default 5)')
     parser_cef_qtr.add_argument('-f', '--frequency', default='q', help='Frequency (m=monthly, q=quarterly, default=q)')
     parser_cef_qtr.set_defaults(func=_parse_cef_qtr_f)
 
     parser_fund_qtr = subparsers.add_parser('fund-qtr', help='Historical quarterly returns (all)')
-    parser_fund_qtr.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_fund_qtr)
     parser_fund_qtr.add_argument('-y', '--years', type=int, default=5, help='Number of years (default 5)')
     parser_fund_qtr.add_argument('-f', '--frequency', default='q', help='Frequency (m=monthly, q=quarterly, default=q)')
     parser_fund_qtr.set_defaults(func=_parse_fund_qtr_f)
 
+    parser_qtr_store = subparsers.add_parser('qtr-store', help='Historical returns from the local store, updated first (all)')
+    batchcli.add_arguments(parser_qtr_store)
+    parser_qtr_store.add_argument('-f', '--frequency', default='q', help='Frequency (m=monthly, q=quarterly, default=q)')
+    parser_qtr_store.add_argument('--start', help='First date (default: all)')
+    parser_qtr_store.add_argument('--end', help='Last date (default: all)')
+    parser_qtr_store.add_argument('--offline', action='store_true', help='Do not update the store')
+    parser_qtr_store.set_defaults(func=_parse_qtr_store_f)
+
     parser_qtr2 = subparsers.add_parser('qtr2', help='Historical quarterly returns (etfs, funds)')
-    parser_qtr2.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_qtr2)
     parser_qtr2.set_defaults(func=_parse_qtr2_f)
 
     parser_cef_quote = subparsers.add_parser('cef-quote', help='CEF quote')
-    parser_cef_quote.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_cef_quote)
     parser_cef_quote.set_defaults(func=_parse_cef_quote)
 
     parser_etf_quote = subparsers.add_parser('etf-quote', help='ETF quote')
-    parser_etf_quote.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_etf_quote)
     parser_etf_quote.set_defaults(func=_parse_etf_quote)
 
     parser_fund_quote = subparsers.add_parser('fund-quote', help='Fund quote')
-    parser_fund_quote.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_fund_quote)
     parser_fund_quote.set_defaults(func=_parse_fund_quote)
 
     parser_stock_quote = subparsers.add_parser('stock-quote', help='Stock quote')
-    parser_stock_quote.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_stock_quote)
     parser_stock_quote.set_defaults(func=_parse_stock_quote)
 
     parser_aal = subparsers.add_parser('aal', help='Asset allocation (etfs, funds)')
-    parser_aal.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_aal)
     parser_aal.set_defaults(func=_parse_aal)
 
     parser_mkc = subparsers.add_parser('mkc', help='Market capitalization (etfs, funds)')
-    parser_mkc.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_mkc)
     parser_mkc.set_defaults(func=_parse_mkc)
 
     parser_sect = subparsers.add_parser('sect', help='Sector weightings (etfs, funds)')
-    parser_sect.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_sect)
     parser_sect.set_defaults(func=_parse_sect)
 
     parser_reg = subparsers.add_parser('reg', help='World regions (etfs, funds)')
-    parser_reg.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_reg)
     parser_reg.set_defaults(func=_parse_reg)
 
+    parser_validate_specs = subparsers.add_parser('validate-specs', help='Check the fund summary table specs (etfs, funds)')
+    parser_validate_specs.add_argument('tickers', nargs='+', help='Tickers')
+    parser_validate_specs.set_defaults(func=_parse_validate_specs_f)
+
     parser_stock_profile = subparsers.add_parser('stock-profile', help='Stock profile')
-    parser_stock_profile.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_stock_profile)
     parser_stock_profile.set_defaults(func=_parse_stock_profile)
 
     parser_stock_competitors = subparsers.add_parser('stock-competitors', help='Stock competitors')
-    parser_stock_competitors.add_argument('ticker', help='Ticker')
+    batchcli.add_arguments(parser_stock_competitors)
     parser_stock_competitors.set_defaults(func=_parse_stock_competitors)
 
     args = parser.parse_args()
-    args.func(args)
+
+    if args.record:
+        web.use_cassette(args.record, "record")
+    elif args.replay:
+        web.use_cassette(args.replay, "replay", latency=0)
+
+    if args.standin:
+        web.set_standin(args.standin)
+
+    # Archived runs go to the network (or archive) for every ticker
+    if args.record or args.replay or args.standin:
+        tickerdb.set_store(None)
+
+    try:
+        status = args.func(args)
+    finally:
+        web.eject_cassette()
+
+    sys.exit(status)
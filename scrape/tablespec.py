@@ -0,0 +1,106 @@
+"""
+Declarative extraction of web page tables
+"""
+import re
+import unidecode
+import web
+
+# A table spec is a dict with the keys:
+#
+# table - the table index in the page
+# rows - the table rows kept, in order
+# columns - the number of columns kept
+# fillna - if present, the value replacing missing cells before extraction
+# copy_cells - dict of (row, column) in the result to the (row, column) in
+#     the table it is copied from
+# labels - dict of (row, column) in the result to the value it is set to
+# drop_columns - the result columns removed
+# ascii - if True, transliterate the cells to ASCII
+# expect - the row labels expected after extraction (see check()), as
+#     lower case letters and digits, each contained in its label
+
+class LayoutError(ValueError):
+    """
+    Raised when a table does not match its spec, usually because the page
+    layout changed.
+    """
+    pass
+
+def _normalize(label):
+    return re.sub(r"[^a-z0-9]", "", str(label).lower())
+
+def check(spec, df):
+    """
+    Checks the row labels of an extracted table against the spec.
+
+    Arguments:
+    spec - the table spec
+    df - the DataFrame returned by extract()
+
+    Return value:
+    List of problems, empty if the table matches
+    """
+    expect = spec.get("expect")
+    if expect is None:
+        return list()
+
+    labels = [_normalize(label) for label in df.index]
+    if len(labels) != len(expect):
+        return ["%d rows instead of %d" % (len(labels), len(expect))]
+
+    return ["row %d is '%s', expected '%s'" % (i, df.index[i], expected)
+            for i, (label, expected) in enumerate(zip(labels, expect))
+            if expected not in label]
+
+def extract(spec, df, validate = True):
+    """
+    Extracts a table according to its spec. Rows and columns are selected
+    in one take() and reindex(), then the cell overrides are applied, and
+    the first row and column are promoted as labels.
+
+    Arguments:
+    spec - the table spec
+    df - the DataFrame of the page table (see web.get_web_page_table())
+    validate - if True, check the row labels against the spec
+
+    Return value:
+    The extracted DataFrame
+
+    Raises:
+    LayoutError - the table does not have the spec rows, or its row labels
+        don't match the spec
+    """
+    if len(df.index) <= max(spec["rows"]):
+        raise LayoutError("Table %d has %d rows, the spec needs %d" %
+                          (spec["table"], len(df.index), max(spec["rows"]) + 1))
+
+    if "fillna" in spec:
+        df = df.fillna(value = spec["fillna"])
+
+    result = df.take(spec["rows"]).reindex(columns = range(spec["columns"]))
+    result.index = range(len(result.index))
+    result = result.astype(object)
+
+    for (row, column), (table_row, table_column) in spec.get("copy_cells", dict()).items():
+        result.iat[row, column] = df.iat[table_row, table_column]
+
+    for (row, column), value in spec.get("labels", dict()).items():
+        result.iat[row, column] = value
+
+    if spec.get("drop_columns"):
+        result = result.drop(columns = spec["drop_columns"])
+
+    if spec.get("ascii"):
+        # Fix the unprintable unicode characters
+        result = result.apply(lambda column: column.map(lambda x: unidecode.unidecode(str(x))))
+
+    # Promote 1st row and column as labels
+    result = web.dataframe_promote_1st_row_and_column_as_labels(result)
+
+    if validate:
+        problems = check(spec, result)
+        if problems:
+            raise LayoutError("Table %d does not match its spec: %s" %
+                              (spec["table"], "; ".join(problems)))
+
+    return result
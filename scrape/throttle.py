@@ -0,0 +1,225 @@
+"""
+Per-host rate limiting, retries and circuit breaking for web queries
+"""
+import time
+import random
+import threading
+
+# HTTP statuses worth retrying
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+# Host policies. The "default" policy applies to hosts not listed, and
+# hosts listed only override the default settings they name.
+#
+# rate - sustained requests per second
+# burst - requests allowed at once, above the sustained rate
+# retries - retries after the first attempt, on retryable errors
+# backoff - the first retry delay in seconds, doubled on every retry
+# backoff_max - the maximum retry delay in seconds
+# failure_threshold - consecutive failures that open the circuit breaker
+# reset_timeout - seconds the breaker stays open before a trial request
+HOST_POLICIES = {
+    "default": { "rate": 10.0,
+                 "burst": 10,
+                 "retries": 3,
+                 "backoff": 0.5,
+                 "backoff_max": 8.0,
+                 "failure_threshold": 5,
+                 "reset_timeout": 60.0 },
+    "quote.morningstar.com": { "rate": 5.0, "burst": 5 },
+    "quotes.morningstar.com": { "rate": 5.0, "burst": 5 },
+    "performance.morningstar.com": { "rate": 5.0, "burst": 5 },
+    "portfolios.morningstar.com": { "rate": 5.0, "burst": 5 },
+    "fastquote.fidelity.com": { "rate": 5.0, "burst": 5 },
+}
+
+class CircuitOpenError(Exception):
+    """
+    Raised when a request is refused because the host's circuit breaker is open.
+    """
+    def __init__(self, host):
+        Exception.__init__(self, "Circuit breaker open for host '%s'" % host)
+        self.host = host
+
+class TokenBucket(object):
+    """
+    Token bucket rate limiter. Tokens refill at 'rate' per second, up to
+    'burst' tokens.
+    """
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Takes a token, which may only be available in the future.
+
+        Return value:
+        The time to wait for the token, in seconds
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+
+            self._tokens -= 1
+            return -self._tokens / self.rate if self._tokens < 0 else 0
+
+    def acquire(self):
+        """
+        Takes a token, sleeping until one is available.
+
+        Return value:
+        The time slept, in seconds
+        """
+        # Reserve the token now, and wait for it outside the lock
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+        return delay
+
+class CircuitBreaker(object):
+    """
+    Circuit breaker. Opens after failure_threshold consecutive failures, and
+    lets a single trial request through after reset_timeout seconds. The
+    trial's success closes the breaker, its failure reopens it.
+    """
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def state(self):
+        """
+        Returns "closed", "open" or "half-open".
+        """
+        with self._lock:
+            if self._opened is None:
+                return "closed"
+            if time.monotonic() - self._opened >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        """
+        Returns True if a request may go through.
+        """
+        with self._lock:
+            if self._opened is None:
+                return True
+
+            if self._trial or time.monotonic() - self._opened < self.reset_timeout:
+                return False
+
+            self._trial = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.failure_threshold:
+                self._opened = time.monotonic()
+            self._trial = False
+
+    def cancel(self):
+        """
+        Ends an allowed request that neither succeeded nor failed, e.g. an
+        interrupted one, so that a half-open breaker lets the next trial
+        through.
+        """
+        with self._lock:
+            self._trial = False
+
+class HostThrottle(object):
+    """
+    The rate limiter, retry policy, circuit breaker and counters of a host.
+    """
+    def __init__(self, host, policy):
+        self.host = host
+        self.policy = policy
+        self.bucket = TokenBucket(policy["rate"], policy["burst"])
+        self.breaker = CircuitBreaker(policy["failure_threshold"], policy["reset_timeout"])
+        self.counters = { "requests": 0,
+                          "retries": 0,
+                          "failures": 0,
+                          "rejected": 0,
+                          "throttled_seconds": 0.0 }
+        self._lock = threading.Lock()
+
+    def count(self, counter, value = 1):
+        with self._lock:
+            self.counters[counter] += value
+
+    def backoff(self, attempt):
+        """
+        Returns the jittered delay before retry number attempt (from 0).
+        """
+        delay = min(self.policy["backoff_max"], self.policy["backoff"] * (2 ** attempt))
+
+        # Full jitter
+        return random.uniform(0, delay)
+
+# The host throttles, created on first use
+_throttles = dict()
+_throttles_lock = threading.Lock()
+
+def policy(host):
+    """
+    Returns the policy of a host: the default policy, updated with the host
+    specific settings.
+    """
+    settings = dict(HOST_POLICIES["default"])
+    settings.update(HOST_POLICIES.get(host, dict()))
+    return settings
+
+def configure(host, **settings):
+    """
+    Updates the policy of a host ("default" for all hosts). Throttles
+    created earlier are reset.
+
+    Example: throttle.configure("quote.morningstar.com", rate=2, retries=5)
+    """
+    HOST_POLICIES.setdefault(host, dict()).update(settings)
+
+    with _throttles_lock:
+        _throttles.clear()
+
+def get_throttle(host):
+    """
+    Gets the HostThrottle of a host.
+    """
+    with _throttles_lock:
+        throttle = _throttles.get(host)
+        if throttle is None:
+            throttle = HostThrottle(host, policy(host))
+            _throttles[host] = throttle
+
+    return throttle
+
+def stats():
+    """
+    Returns a dict of host to its counters and circuit breaker state.
+    """
+    with _throttles_lock:
+        throttles = list(_throttles.values())
+
+    result = dict()
+    for throttle in throttles:
+        counters = dict(throttle.counters)
+        counters["state"] = throttle.breaker.state()
+        result[throttle.host] = counters
+
+    return result
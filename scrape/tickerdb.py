@@ -0,0 +1,280 @@
+"""
+Persistent ticker metadata store
+"""
+import os
+import time
+import sqlite3
+import threading
+from six.moves import queue
+
+# Entries verified longer ago than this, in seconds, are revalidated
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+
+class TickerStore(object):
+    """
+    Ticker types and names, per data source, stored in a SQLite database.
+
+    Each entry holds the ticker, its source ("morningstar", "fidelity"),
+    type, name, and the time it was last verified against the source.
+    """
+    def __init__(self, path, max_age = DEFAULT_MAX_AGE):
+        """
+        Arguments:
+        path - the SQLite database file, created if it does not exist
+        max_age - the age, in seconds, past which entries are stale
+        """
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+
+        dir_name = os.path.dirname(path)
+        if dir_name and not os.path.isdir(dir_name):
+            os.makedirs(dir_name)
+
+        self._db = sqlite3.connect(path, check_same_thread = False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS tickers (
+                ticker TEXT NOT NULL,
+                source TEXT NOT NULL,
+                type TEXT,
+                name TEXT,
+                verified REAL NOT NULL,
+                PRIMARY KEY (ticker, source));
+            """)
+        self._db.commit()
+
+        # Background revalidation
+        self._resolvers = dict()
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._worker = None
+
+    def lookup(self, tickers, source):
+        """
+        Bulk lookup.
+
+        Arguments:
+        tickers - list of tickers
+        source - the data source
+
+        Return value:
+        Dict of ticker to a dict with "type", "name" and "verified" keys,
+        for the tickers in the store
+        """
+        entries = dict()
+        tickers = list(tickers)
+
+        with self._lock:
+            # Stay below the SQLite limit on query parameters
+            for i in range(0, len(tickers), 500):
+                chunk = tickers[i:i + 500]
+                rows = self._db.execute(
+                    "SELECT ticker, type, name, verified FROM tickers "
+                    "WHERE source = ? AND ticker IN (%s)" % ",".join("?" * len(chunk)),
+                    [source] + chunk).fetchall()
+
+                for ticker, stype, name, verified in rows:
+                    entries[ticker] = { "type": stype,
+                                        "name": name,
+                                        "verified": verified }
+
+        return entries
+
+    def get(self, ticker, source):
+        """
+        Returns the entry of a ticker (see lookup()), or None.
+        """
+        return self.lookup([ticker], source).get(ticker)
+
+    def upsert(self, entries, source, verified = None):
+        """
+        Bulk insert or update, in a single transaction.
+
+        Arguments:
+        entries - dict of ticker to a dict with "type" and/or "name" keys.
+            Missing keys, or None values, leave the stored values as is.
+        source - the data source
+        verified - the verification time. Default: now
+        """
+        if verified is None:
+            verified = time.time()
+
+        with self._lock:
+            with self._db:
+                for ticker, entry in entries.items():
+                    stype = entry.get("type")
+                    name = entry.get("name")
+
+                    cursor = self._db.execute(
+                        "UPDATE tickers SET type = COALESCE(?, type), "
+                        "name = COALESCE(?, name), verified = ? "
+                        "WHERE ticker = ? AND source = ?",
+                        (stype, name, verified, ticker, source))
+
+                    if cursor.rowcount == 0:
+                        self._db.execute(
+                            "INSERT INTO tickers (ticker, source, type, name, verified) "
+                            "VALUES (?, ?, ?, ?, ?)",
+                            (ticker, source, stype, name, verified))
+
+    def is_stale(self, entry):
+        """
+        Returns True if an entry was verified longer than max_age ago.
+        """
+        return time.time() - entry["verified"] > self.max_age
+
+    def stale(self, source):
+        """
+        Returns the list of stale tickers of a source.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT ticker FROM tickers WHERE source = ? AND verified < ?",
+                (source, time.time() - self.max_age)).fetchall()
+
+        return [row[0] for row in rows]
+
+    def set_resolver(self, source, resolver):
+        """
+        Sets the function revalidating the entries of a source.
+
+        Arguments:
+        source - the data source
+        resolver - called as resolver(ticker) from the revalidation thread.
+            Returns a dict with "type" and/or "name" keys, or None if the
+            ticker could not be resolved.
+        """
+        self._resolvers[source] = resolver
+
+    def revalidate(self, tickers, source):
+        """
+        Queues tickers for revalidation by the background thread, which
+        updates their entries with the results of the source's resolver.
+        """
+        with self._lock:
+            for ticker in tickers:
+                if (ticker, source) in self._queued:
+                    continue
+                self._queued.add((ticker, source))
+                self._queue.put((ticker, source))
+
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target = self._revalidate_loop)
+                self._worker.daemon = True
+                self._worker.start()
+
+    def _revalidate_loop(self):
+        while True:
+            try:
+                ticker, source = self._queue.get(timeout = 5)
+            except queue.Empty:
+                return
+
+            resolver = self._resolvers.get(source)
+            try:
+                entry = resolver(ticker) if resolver else None
+            except Exception:
+                # Keep the stale entry, and try again next time
+                entry = None
+
+            with self._lock:
+                self._queued.discard((ticker, source))
+
+            if entry:
+                try:
+                    self.upsert({ ticker: entry }, source)
+                except sqlite3.Error:
+                    pass
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+# The ticker store. Created on first use, at _store_path.
+_store = None
+_store_path = os.path.join(os.path.expanduser("~"), ".tickerscrape", "tickers.sqlite")
+_store_lock = threading.Lock()
+
+# Maps source to its revalidation resolver (see TickerStore.set_resolver())
+_resolvers = dict()
+
+def set_store(path):
+    """
+    Selects the ticker store file.
+
+    Arguments:
+    path - the SQLite file, or None to disable the store
+    """
+    global _store
+    global _store_path
+
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+
+        _store = None
+        _store_path = path
+
+def get_store():
+    """
+    Returns the ticker store, or None if it is disabled or can't be opened.
+    """
+    global _store
+    global _store_path
+
+    with _store_lock:
+        if _store is None and _store_path:
+            try:
+                _store = TickerStore(_store_path)
+            except (OSError, sqlite3.Error):
+                # Run without the store
+                _store_path = None
+            else:
+                for source, resolver in _resolvers.items():
+                    _store.set_resolver(source, resolver)
+
+        return _store
+
+def set_resolver(source, resolver):
+    """
+    Sets the function revalidating the stale entries of a source
+    (see TickerStore.set_resolver()).
+    """
+    _resolvers[source] = resolver
+
+    with _store_lock:
+        if _store is not None:
+            _store.set_resolver(source, resolver)
+
+def lookup(tickers, source):
+    """
+    Bulk lookup in the ticker store (see TickerStore.lookup()). Stale
+    entries are returned, and queued for background revalidation.
+    """
+    store = get_store()
+    if store is None:
+        return dict()
+
+    try:
+        entries = store.lookup(tickers, source)
+    except sqlite3.Error:
+        return dict()
+
+    stale = [ticker for ticker, entry in entries.items() if store.is_stale(entry)]
+    if stale:
+        store.revalidate(stale, source)
+
+    return entries
+
+def upsert(entries, source):
+    """
+    Bulk insert or update in the ticker store (see TickerStore.upsert()).
+    """
+    store = get_store()
+    if store is None:
+        return
+
+    try:
+        store.upsert(entries, source)
+    except sqlite3.Error:
+        pass
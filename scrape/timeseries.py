@@ -0,0 +1,268 @@
+"""
+Local store for historical return series
+"""
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+# Frequencies, as Morningstar frequency to pandas period frequency
+FREQUENCIES = { "q": "Q", "m": "M" }
+
+class SeriesStore(object):
+    """
+    Return series stored as NumPy arrays, one file per frequency and ticker:
+
+    <root>/<frequency>/<TICKER>/series.npy - structured array, one record
+        per period sorted by date: the period end date in the "date" field
+        (datetime64[D]), and one float64 field per series, named after it
+
+    Updates replace the file at once, so readers see either the old or the
+    new series. Range queries memory-map the file, and read only the rows
+    in range.
+    """
+    def __init__(self, root):
+        """
+        Arguments:
+        root - the store directory, created if it does not exist
+        """
+        self.root = root
+        self._lock = threading.Lock()
+
+        if not os.path.isdir(root):
+            os.makedirs(root)
+
+    def _dir(self, ticker, frequency):
+        if frequency not in FREQUENCIES:
+            raise ValueError("Unknown frequency '%s'" % frequency)
+
+        return os.path.join(self.root, frequency, ticker.upper())
+
+    def _load(self, ticker, frequency, mmap_mode = "r"):
+        """
+        Returns the (dates, records, columns) of a series, or None. The
+        series values are the fields of records named in columns.
+        """
+        path = self._dir(ticker, frequency)
+        try:
+            records = np.load(os.path.join(path, "series.npy"), mmap_mode = mmap_mode)
+        except (IOError, OSError, ValueError):
+            return None
+
+        names = records.dtype.names
+        if not names or names[0] != "date" or records.ndim != 1:
+            return None
+
+        return records["date"], records, list(names[1:])
+
+    def tickers(self, frequency):
+        """
+        Returns the list of stored tickers for a frequency.
+        """
+        path = os.path.join(self.root, frequency)
+        if not os.path.isdir(path):
+            return list()
+
+        return sorted(os.listdir(path))
+
+    def last_date(self, ticker, frequency):
+        """
+        Returns the last stored period end date, as a Timestamp, or None.
+        """
+        series = self._load(ticker, frequency)
+        if series is None or len(series[0]) == 0:
+            return None
+
+        return pd.Timestamp(series[0][-1])
+
+    def update(self, ticker, frequency, df):
+        """
+        Merges periods into the stored series. Periods already stored are
+        replaced by the new values.
+
+        Arguments:
+        ticker - the ticker
+        frequency - "q" for quarterly, "m" for monthly
+        df - DataFrame indexed by period end date, with float columns
+
+        Return value:
+        The number of periods added
+        """
+        df = df.copy()
+        df.index = pd.DatetimeIndex(df.index).normalize()
+        df = df[~df.index.isnull()]
+        df = df.astype("float64")
+
+        path = self._dir(ticker, frequency)
+
+        with self._lock:
+            stored = self._load(ticker, frequency, mmap_mode = None)
+            if stored is not None:
+                dates, records, columns = stored
+                old = pd.DataFrame(_values(records, columns), index = pd.DatetimeIndex(dates),
+                                   columns = columns)
+                added = len(df.index.difference(old.index))
+
+                # New values win, and series missing on either side are kept
+                merged = df.combine_first(old)
+                merged.update(df)
+            else:
+                added = len(df.index.unique())
+                merged = df
+
+            merged = merged[~merged.index.duplicated(keep = "last")].sort_index()
+
+            columns = [str(column) for column in merged.columns]
+            records = _records(merged.index.values.astype("datetime64[D]"),
+                               merged.to_numpy(dtype = "float64"), columns)
+            if records is None:
+                raise ValueError("Series names must be unique, and not 'date': %s" % columns)
+
+            if not os.path.isdir(path):
+                os.makedirs(path)
+
+            # Write the file aside, then move it in place
+            tmp = os.path.join(path, "series.tmp.npy")
+            np.save(tmp, records)
+            os.replace(tmp, os.path.join(path, "series.npy"))
+
+        return added
+
+    def query(self, ticker, frequency, start = None, end = None):
+        """
+        Reads the stored periods in a date range.
+
+        Arguments:
+        ticker - the ticker
+        frequency - "q" for quarterly, "m" for monthly
+        start, end - the first and last dates, inclusive. Default: unbounded
+
+        Return value:
+        DataFrame indexed by period end date, or None if the ticker is not
+        stored
+        """
+        series = self._load(ticker, frequency)
+        if series is None:
+            return None
+
+        dates, records, columns = series
+
+        first = 0 if start is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(start).date()), "left")
+        last = len(dates) if end is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(end).date()), "right")
+
+        df = pd.DataFrame(_values(records[first:last], columns),
+                          index = pd.DatetimeIndex(np.array(dates[first:last]).astype("datetime64[ns]")),
+                          columns = columns)
+        df.index.name = "Date"
+
+        return df
+
+    def query_many(self, tickers, frequency, start = None, end = None):
+        """
+        Reads the stored periods of several tickers in a date range.
+
+        Return value:
+        DataFrame indexed by (ticker, date), for the stored tickers
+        """
+        frames = list()
+        keys = list()
+        for ticker in tickers:
+            df = self.query(ticker, frequency, start, end)
+            if df is not None:
+                frames.append(df)
+                keys.append(ticker)
+
+        if not frames:
+            return pd.DataFrame()
+
+        df = pd.concat(frames, keys = keys)
+        df.index.names = ["Ticker", "Date"]
+
+        return df
+
+def _records(dates, values, columns):
+    """
+    Returns the structured array of a series (see SeriesStore), or None if
+    the series names can't be field names.
+    """
+    if "date" in columns or len(set(columns)) != len(columns) or "" in columns:
+        return None
+
+    records = np.empty(len(dates), dtype = [("date", "datetime64[D]")] +
+                                           [(column, "float64") for column in columns])
+    records["date"] = dates
+    for i, column in enumerate(columns):
+        records[column] = values[:, i]
+
+    return records
+
+def _values(records, columns):
+    """
+    Returns the float64 values of series records, one column per series.
+    """
+    values = np.empty((len(records), len(columns)), dtype = "float64")
+    for i, column in enumerate(columns):
+        values[:, i] = records[column]
+
+    return values
+
+def period_end_dates(labels, frequency):
+    """
+    Parses period labels ("03/31/2019", "2019-03", "2019Q1") into period end
+    dates.
+
+    Return value:
+    DatetimeIndex, with NaT for labels that are not periods
+    """
+    dates = list()
+    for label in labels:
+        label = str(label).strip()
+        try:
+            date = pd.to_datetime(label, format = "%m/%d/%Y")
+        except ValueError:
+            try:
+                date = pd.Period(label, freq = FREQUENCIES[frequency]).end_time.normalize()
+            except ValueError:
+                date = pd.NaT
+        dates.append(date)
+
+    return pd.DatetimeIndex(dates)
+
+def last_period_end(frequency, today = None):
+    """
+    Returns the end date of the last completed period, as a Timestamp.
+    """
+    if today is None:
+        today = pd.Timestamp.today()
+
+    period = pd.Period(today, freq = FREQUENCIES[frequency]) - 1
+
+    return period.end_time.normalize()
+
+# The series store. Created on first use, at _store_path.
+_store = None
+_store_path = os.path.join(os.path.expanduser("~"), ".tickerscrape", "series")
+_store_lock = threading.Lock()
+
+def set_store(path):
+    """
+    Selects the series store directory.
+    """
+    global _store
+    global _store_path
+
+    with _store_lock:
+        _store = None
+        _store_path = path
+
+def get_store():
+    """
+    Returns the series store.
+    """
+    global _store
+
+    with _store_lock:
+        if _store is None:
+            _store = SeriesStore(_store_path)
+
+        return _store
@@ -1,39 +1,841 @@
 """
 Routines for caching web queries
 """
+import os
+import re
+import time
+import hashlib
+import sqlite3
+import threading
+import concurrent.futures
+import concurrent.futures.process
 import requests
-from bs4 import BeautifulSoup
+import requests.adapters
+from six.moves.urllib.parse import urlsplit
+from collections import OrderedDict
+from bs4 import UnicodeDammit
+from bs4.dammit import EncodingDetector
+import lxml.etree
+import lxml.html
+import numpy as np
 import pandas as pd
 import six
+import webcache
+import throttle
+import cassette
 
-_web_cache = dict()
+def _page_ttl(url):
+    """
+    Returns the time to live of a page in the memory cache: that of the disk
+    cache, also when the disk cache is disabled.
+    """
+    disk_cache = _disk_cache
+    if disk_cache is not None:
+        return disk_cache.ttl(url)
+
+    return webcache.page_ttl(url, _disk_cache_ttls)
+
+# The in-memory page cache, shared by all scrape modules
+_web_cache = webcache.MemoryCache(ttl = _page_ttl)
+
+# The persistent page cache. Created on first use, at _disk_cache_path.
+_disk_cache = None
+_disk_cache_path = os.path.join(os.path.expanduser("~"), ".tickerscrape", "webcache.sqlite")
+_disk_cache_ttls = None
+
+def set_disk_cache(path, ttls = None):
+    """
+    Selects the persistent page cache file.
+
+    Arguments:
+    path - the SQLite cache file, or None to disable the persistent cache
+    ttls - list of (regex, seconds) time to live patterns. Default:
+        webcache.DEFAULT_TTLS
+    """
+    global _disk_cache
+    global _disk_cache_path
+    global _disk_cache_ttls
+
+    if _disk_cache is not None:
+        _disk_cache.close()
+
+    _disk_cache = None
+    _disk_cache_path = path
+    _disk_cache_ttls = ttls
+
+def set_memory_cache(max_bytes, compression = None):
+    """
+    Replaces the in-memory page cache.
+
+    Arguments:
+    max_bytes - the byte budget of the cache
+    compression - None, "zlib" or "lzma"
+    """
+    global _web_cache
+
+    _web_cache = webcache.MemoryCache(max_bytes, compression, _page_ttl)
+
+def get_disk_cache():
+    """
+    Returns the persistent page cache, or None if it is disabled or can't
+    be opened.
+    """
+    global _disk_cache
+    global _disk_cache_path
+
+    if _disk_cache is None and _disk_cache_path:
+        try:
+            _disk_cache = webcache.DiskCache(_disk_cache_path, _disk_cache_ttls)
+        except (OSError, sqlite3.Error):
+            # Run without the persistent cache
+            _disk_cache_path = None
+
+    return _disk_cache
+
+def cache_stats():
+    """
+    Returns a dict with the single-flight, parse, memory and disk cache
+    counters.
+    """
+    stats = dict()
+    with _inflight_lock:
+        stats["singleflight_fetches"] = _fetch_stats["fetches"]
+        stats["singleflight_suppressed"] = _fetch_stats["suppressed"]
+        stats["stale_served"] = _fetch_stats["stale"]
+
+    with _parse_cache_lock:
+        stats["parse_hits"] = _parse_stats["hits"]
+        stats["parse_misses"] = _parse_stats["misses"]
+        stats["parse_pages"] = len(_parse_cache)
+
+    for key, value in _web_cache.stats().items():
+        stats["memory_" + key] = value
+
+    disk_cache = get_disk_cache()
+    if disk_cache is not None:
+        for key, value in disk_cache.stats().items():
+            stats["disk_" + key] = value
+
+    return stats
+
+# Pooled keep-alive sessions, one per scheme and host
+_sessions = dict()
+_sessions_lock = threading.Lock()
+
+# Session settings
+_pool_size = 8
+_timeout = (5, 30)
+_headers = dict()
+
+def configure_sessions(pool_size = None, timeout = None, headers = None):
+    """
+    Configures the pooled HTTP sessions. Sessions created earlier are closed,
+    and recreated with the new settings on next use.
+
+    Arguments:
+    pool_size - the maximum number of keep-alive connections per host
+    timeout - the request timeout in seconds, or a (connect, read) tuple
+    headers - dict of headers sent with every request
+    """
+    global _pool_size
+    global _timeout
+    global _headers
+
+    if pool_size is not None:
+        _pool_size = pool_size
+    if timeout is not None:
+        _timeout = timeout
+    if headers is not None:
+        _headers = headers
+
+    close_sessions()
+
+def close_sessions():
+    """
+    Closes all pooled HTTP sessions, and their connections.
+    """
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+def get_session(url):
+    """
+    Gets the pooled keep-alive session for the URL's scheme and host.
+    """
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.netloc.lower())
+
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            adapter = requests.adapters.HTTPAdapter(pool_connections = 1,
+                                                    pool_maxsize = _pool_size)
+            session = requests.Session()
+            session.headers.update(_headers)
+            session.mount(parts.scheme + "://", adapter)
+            _sessions[key] = session
+
+    return session
+
+# The cassette recording, or replaying, the responses
+_cassette = None
+
+# The stand-in server base URL, if requests go to a stand-in server
+_standin = None
+
+def use_cassette(path, mode = "replay", latency = None):
+    """
+    Records the web responses into an archive, or replays them from it.
+
+    In record mode, every response fetched by http_get(), and every page
+    returned by get_web_page(), including cached pages, is added to the
+    archive. In replay mode, http_get() serves the archived responses
+    without the network, and the disk cache is not used.
+
+    Arguments:
+    path - the archive file
+    mode - "record" or "replay"
+    latency - on replay, None to sleep the recorded response times, or the
+        number of seconds to sleep per response
+
+    Return value:
+    The cassette.Cassette
+    """
+    global _cassette
+
+    eject_cassette()
+
+    _cassette = cassette.Cassette(path, mode, latency)
+
+    # Pages cached in memory would not be recorded or replayed
+    _web_cache.clear()
+
+    return _cassette
+
+def eject_cassette():
+    """
+    Stops recording or replaying. A recording is saved to its archive.
+    """
+    global _cassette
+
+    if _cassette is not None and _cassette.mode == "record":
+        _cassette.save()
+
+    _cassette = None
+
+def set_standin(base_url):
+    """
+    Sends all requests to a stand-in server, such as 'cassette.py serve'.
+    The URL scheme://host/path?query is requested as
+    base_url/scheme/host/path?query. The caches still use the original URLs.
+
+    Arguments:
+    base_url - the stand-in server URL, e.g. "http://127.0.0.1:8080", or
+        None to send requests to the original hosts
+    """
+    global _standin
+
+    _standin = base_url
+
+def http_get(url, **kwargs):
+    """
+    Does an HTTP GET, or replays it from the cassette in use. See _http_get().
+    """
+    allow_redirects = kwargs.get("allow_redirects", True)
+
+    replaying = _cassette
+    if replaying is not None and replaying.mode == "replay":
+        return replaying.replay(url, allow_redirects)
+
+    r = _http_get(url, **kwargs)
+
+    recording = _cassette
+    if recording is not None and recording.mode == "record":
+        recording.add_response(url, allow_redirects, r)
+
+    return r
+
+def _http_get(url, **kwargs):
+    """
+    Does an HTTP GET through the pooled session of the URL's host. Bypasses
+    the page caches.
+
+    The request is subject to the host's policy in throttle.HOST_POLICIES:
+    it waits for the host's rate limiter, retries connection errors,
+    timeouts and retryable HTTP statuses with jittered exponential backoff,
+    and fails fast while the host's circuit breaker is open.
+
+    Arguments:
+    url - the URL to retrieve
+    kwargs - passed on to requests.Session.get(), e.g. allow_redirects
+
+    Return value:
+    The requests.Response. After the last retry, the response may have a
+    retryable error status.
+
+    Raises:
+    throttle.CircuitOpenError - the host's circuit breaker is open
+    requests.RequestException - the last retry failed
+    """
+    kwargs.setdefault("timeout", _timeout)
+
+    # The policy of the real host, also when a stand-in serves it
+    host = urlsplit(url).netloc.lower()
+
+    if _standin:
+        if not kwargs.get("allow_redirects", True):
+            headers = dict(kwargs.get("headers") or dict())
+            headers[cassette.NO_REDIRECTS_HEADER] = "1"
+            kwargs["headers"] = headers
+        url = cassette.standin_url(_standin, url)
+
+    host_throttle = throttle.get_throttle(host)
+    retries = host_throttle.policy["retries"]
+    session = get_session(url)
+
+    attempt = 0
+    while True:
+        if not host_throttle.breaker.allow():
+            host_throttle.count("rejected")
+            raise throttle.CircuitOpenError(host)
+
+        host_throttle.count("throttled_seconds", host_throttle.bucket.acquire())
+        host_throttle.count("requests")
+
+        try:
+            r = session.get(url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            host_throttle.count("failures")
+            host_throttle.breaker.failure()
+            if attempt >= retries:
+                raise
+        except Exception:
+            # Not retried, e.g. requests.TooManyRedirects, but still a failure
+            host_throttle.count("failures")
+            host_throttle.breaker.failure()
+            raise
+        except BaseException:
+            host_throttle.breaker.cancel()
+            raise
+        else:
+            if r.status_code not in throttle.RETRYABLE_STATUSES:
+                host_throttle.breaker.success()
+                return r
+
+            host_throttle.count("failures")
+            host_throttle.breaker.failure()
+            if attempt >= retries:
+                return r
+
+        time.sleep(host_throttle.backoff(attempt))
+        host_throttle.count("retries")
+        attempt += 1
+
+# In-flight page fetches, as url to concurrent.futures.Future
+_inflight = dict()
+_inflight_lock = threading.Lock()
+
+# Fetch counters: fetches done, duplicate fetches suppressed, and expired
+# pages served from the disk cache because their host failed
+_fetch_stats = { "fetches": 0, "suppressed": 0, "stale": 0 }
 
 def get_web_page(url, force):
     """
     Gets a web page from the web, or from the local cache, in case it is cached.
+    Concurrent callers for the same URL share a single fetch.
 
     Arguments:
     url - the URL to retrieve
     force - if True, overwrite the cache
     
     Return value:
-    The contents of the web page
+    The contents of the web page. Only pages with status 200 are cached.
+
+    Raises:
+    requests.HTTPError - the host answered a retryable status (see
+        throttle.RETRYABLE_STATUSES) after the last retry, and there is no
+        expired copy of the page in the disk cache
+    """
+    content = _get_shared_web_page(url, force)
+
+    recording = _cassette
+    if recording is not None and recording.mode == "record":
+        recording.add_page(url, content)
+
+    return content
+
+def _get_shared_web_page(url, force):
+    """
+    Gets a web page from the memory cache, or from the single fetch shared
+    by concurrent callers.
+    """
+    if not force:
+        content = _web_cache.get(url)
+        if content is not None:
+            return content
+
+    with _inflight_lock:
+        flight = _inflight.get(url)
+        leader = flight is None
+        if leader:
+            flight = concurrent.futures.Future()
+            _inflight[url] = flight
+            _fetch_stats["fetches"] += 1
+        else:
+            _fetch_stats["suppressed"] += 1
+
+    # Wait for the caller already fetching this page
+    if not leader:
+        return flight.result()
+
+    try:
+        content = _get_web_page(url, force)
+    except BaseException as e:
+        # Also for KeyboardInterrupt, or the followers would wait forever
+        flight.set_exception(e)
+        raise
+    else:
+        flight.set_result(content)
+    finally:
+        with _inflight_lock:
+            del _inflight[url]
+
+    return content
+
+def _get_web_page(url, force):
+    """
+    Gets a web page from the disk cache, or from the web.
+    """
+    disk_cache = get_disk_cache()
+
+    # Replays don't depend on the disk cache contents
+    replaying = _cassette
+    if replaying is not None and replaying.mode == "replay":
+        disk_cache = None
+
+    if not force and disk_cache is not None:
+        try:
+            entry = disk_cache.get_entry(url)
+        except sqlite3.Error:
+            entry = None
+
+        if entry is not None:
+            content, fetched = entry
+            _web_cache.put(url, content, fetched)
+            return content
+
+    try:
+        r = http_get(url)
+    except (requests.RequestException, throttle.CircuitOpenError):
+        content = _get_stale_web_page(disk_cache, url)
+        if content is None:
+            raise
+        return content
+
+    if r.status_code in throttle.RETRYABLE_STATUSES:
+        content = _get_stale_web_page(disk_cache, url)
+        if content is not None:
+            return content
+
+        # Not an error page to parse as data, nor to keep
+        r.raise_for_status()
+
+    # Only keep good pages
+    if r.status_code == 200:
+        _web_cache.put(url, r.content)
+
+        if disk_cache is not None:
+            try:
+                disk_cache.put(url, r.content)
+            except sqlite3.Error:
+                pass
+
+    return r.content
+
+def _get_stale_web_page(disk_cache, url):
+    """
+    Gets a page from the disk cache, even if expired, when its host fails.
+    The page is not kept in memory, so the host is tried again next time.
+    """
+    if disk_cache is None:
+        return None
+
+    try:
+        content = disk_cache.get(url, stale_ok = True)
+    except sqlite3.Error:
+        return None
+
+    if content is not None:
+        with _inflight_lock:
+            _fetch_stats["stale"] += 1
+
+    return content
+
+# Batch fetch settings
+_max_workers = 16
+_per_host = 4
+
+def configure_batch(max_workers = None, per_host = None):
+    """
+    Configures the get_web_pages() concurrency limits.
+
+    Arguments:
+    max_workers - the number of fetch threads
+    per_host - the maximum number of concurrent fetches per host
+    """
+    global _max_workers
+    global _per_host
+
+    if max_workers is not None:
+        _max_workers = max_workers
+    if per_host is not None:
+        _per_host = per_host
+
+def iter_web_pages(urls, force = False, max_workers = None, per_host = None):
+    """
+    Fetches web pages concurrently, through the page caches.
+
+    Arguments:
+    urls - the list of URLs to retrieve
+    force - if True, overwrite the cache
+    max_workers - the number of fetch threads. Default: see configure_batch()
+    per_host - the maximum number of concurrent fetches per host.
+        Default: see configure_batch()
+
+    Return value:
+    Generator of (url, contents, exception) tuples, in completion order.
+    Exactly one of contents and exception is None. Duplicate URLs are
+    fetched and reported once.
+    """
+    if max_workers is None:
+        max_workers = _max_workers
+    if per_host is None:
+        per_host = _per_host
+
+    # Unique URLs, in input order
+    unique_urls = list()
+    for url in urls:
+        if url not in unique_urls:
+            unique_urls.append(url)
+
+    if not unique_urls:
+        return
+
+    host_limits = dict()
+    for url in unique_urls:
+        host = urlsplit(url).netloc.lower()
+        if host not in host_limits:
+            host_limits[host] = threading.BoundedSemaphore(per_host)
+
+    def fetch(url):
+        with host_limits[urlsplit(url).netloc.lower()]:
+            return get_web_page(url, force)
+
+    workers = min(max_workers, len(unique_urls))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers = workers) as executor:
+        futures = dict()
+        for url in unique_urls:
+            futures[executor.submit(fetch, url)] = url
+
+        for future in concurrent.futures.as_completed(futures):
+            url = futures[future]
+            try:
+                yield url, future.result(), None
+            except Exception as e:
+                yield url, None, e
+
+def get_web_pages(urls, force = False, callback = None, max_workers = None, per_host = None):
+    """
+    Fetches web pages concurrently, through the page caches.
+
+    Arguments:
+    urls - the list of URLs to retrieve
+    force - if True, overwrite the cache
+    callback - if not None, called as callback(url, contents, exception) as
+        each page completes. Exactly one of contents and exception is None.
+    max_workers - the number of fetch threads. Default: see configure_batch()
+    per_host - the maximum number of concurrent fetches per host.
+        Default: see configure_batch()
+
+    Return value:
+    List with the contents of each web page, in the order of urls. Pages
+    that failed to download are None.
+    """
+    pages = dict()
+
+    for url, content, e in iter_web_pages(urls, force, max_workers, per_host):
+        pages[url] = content
+        if callback:
+            callback(url, content, e)
+
+    return [pages[url] for url in urls]
+
+
+# Parsed pages, as (url, content digest) to a dict with the parsed "tree",
+# its "tables", and the table DataFrames extracted so far in "frames".
+# Least recently used first.
+_parse_cache = OrderedDict()
+_parse_cache_size = 16
+_parse_cache_lock = threading.Lock()
+_parse_stats = { "hits": 0, "misses": 0 }
+
+def set_parse_cache_size(size):
+    """
+    Sets the number of parsed pages kept by the parse cache. 0 disables it.
+    """
+    global _parse_cache_size
+
+    with _parse_cache_lock:
+        _parse_cache_size = size
+        while len(_parse_cache) > size:
+            _parse_cache.popitem(last = False)
+
+def parse_html(web_page):
+    """
+    Parses a web page with lxml. Script and style elements are dropped.
+
+    Arguments:
+    web_page - the page contents, in bytes
+
+    Return value:
+    The lxml root element of the page
+    """
+    # Same encoding choice as BeautifulSoup: declared, utf-8, then guessed
+    encoding = EncodingDetector.find_declared_encoding(web_page, is_html = True)
+    if not encoding:
+        try:
+            web_page.decode("utf-8")
+            encoding = "utf-8"
+        except UnicodeDecodeError:
+            encoding = UnicodeDammit(web_page, is_html = True).original_encoding
+
+    parser = lxml.html.HTMLParser(encoding = encoding)
+    try:
+        tree = lxml.html.document_fromstring(web_page, parser = parser)
+    except (lxml.etree.ParserError, ValueError):
+        # Empty document
+        tree = lxml.html.document_fromstring("<html></html>")
+
+    lxml.etree.strip_elements(tree, "script", "style", with_tail = False)
+
+    return tree
+
+def _get_parsed_page(url, web_page):
+    """
+    Gets the parse cache entry for a page, parsing the page on a miss.
+    """
+    key = (url, hashlib.sha1(web_page).digest())
+
+    with _parse_cache_lock:
+        entry = _parse_cache.get(key)
+        if entry is not None:
+            _parse_cache.move_to_end(key)
+            _parse_stats["hits"] += 1
+            return entry
+        _parse_stats["misses"] += 1
+
+    tree = parse_html(web_page)
+
+    entry = { "tree": tree,
+              "tables": list(tree.iter("table")),
+              "frames": dict() }
+
+    _put_parsed_page(key, entry)
+
+    return entry
+
+def _put_parsed_page(key, entry):
+    with _parse_cache_lock:
+        if _parse_cache_size > 0:
+            _parse_cache[key] = entry
+            _parse_cache.move_to_end(key)
+            while len(_parse_cache) > _parse_cache_size:
+                _parse_cache.popitem(last = False)
+
+def _entry_tree(entry, web_page):
+    """
+    Returns the parsed tree of a parse cache entry. Entries parsed by the
+    worker processes only hold the page data, and are parsed on demand.
+    """
+    if "tree" not in entry:
+        tree = parse_html(web_page)
+        entry["tables"] = list(tree.iter("table"))
+        entry["tree"] = tree
+
+    return entry["tree"]
+
+def get_web_page_tree(url, force):
+    """
+    Gets a parsed web page. The page is parsed once, and the parsed page is
+    shared by all callers; don't modify it.
+
+    Arguments:
+    url - the URL to retrieve
+    force - if True, overwrite the cache
+
+    Return value:
+    The lxml root element of the page
+    """
+    web_page = get_web_page(url, force)
+
+    return _entry_tree(_get_parsed_page(url, web_page), web_page)
+
+class PageFields(object):
+    """
+    The elements of a page with an id, gkey or vkey attribute, and the page
+    'td' cells, collected in a single pass over the parsed page.
+    """
+    ATTRS = ("id", "gkey", "vkey")
+
+    def __init__(self, tree):
+        # Maps (attr, value, tag) and (attr, value, None) to the elements
+        # with that attribute value, in document order
+        self._elements = dict()
+
+        # All 'td' cells, in document order
+        self.tds = list()
+
+        for element in tree.iter():
+            tag = element.tag
+            if not isinstance(tag, six.string_types):
+                # Comments and processing instructions
+                continue
+
+            if tag == "td":
+                self.tds.append(element)
+
+            for attr in self.ATTRS:
+                value = element.get(attr)
+                if value is not None:
+                    self._elements.setdefault((attr, value, tag), list()).append(element)
+                    self._elements.setdefault((attr, value, None), list()).append(element)
+
+    def find(self, tag, attr, value):
+        """
+        Returns the first element with the tag (any tag if None), having the
+        attribute value, or None.
+        """
+        elements = self._elements.get((attr, value, tag))
+
+        return elements[0] if elements else None
+
+    def find_all(self, tag, attr, value):
+        """
+        Returns the elements with the tag (any tag if None), having the
+        attribute value, in document order.
+        """
+        return list(self._elements.get((attr, value, tag), ()))
+
+    def text(self, tag, attr, value, required = False):
+        """
+        Returns the stripped text of the first element with the tag (any tag
+        if None), having the attribute value, or "" if there is none.
+
+        Raises ValueError if there is none and required is True, e.g. after
+        a change of the page layout.
+        """
+        element = self.find(tag, attr, value)
+        if element is None:
+            if required:
+                raise ValueError(_missing_field(tag, attr, value))
+            return ""
+
+        return element_text(element)
+
+    def td_texts(self):
+        """
+        Returns the stripped texts of the page 'td' cells, in document order.
+        """
+        return [element_text(td) for td in self.tds]
+
+class PageFieldTexts(object):
+    """
+    The PageFields texts of a page parsed by a worker process (see
+    page_data()). Elements are looked up in the page, parsed on demand.
+    """
+    def __init__(self, data, load):
+        """
+        Arguments:
+        data - the page data returned by page_data()
+        load - function returning the PageFields of the page
+        """
+        self._texts = data["fields"]
+        self._tds = data["tds"]
+        self._load = load
+        self._fields = None
+
+    def _page_fields(self):
+        if self._fields is None:
+            self._fields = self._load()
+        return self._fields
+
+    def find(self, tag, attr, value):
+        return self._page_fields().find(tag, attr, value)
+
+    def find_all(self, tag, attr, value):
+        return self._page_fields().find_all(tag, attr, value)
+
+    def text(self, tag, attr, value, required = False):
+        text = self._texts.get((attr, value, tag))
+        if text is None:
+            if required:
+                raise ValueError(_missing_field(tag, attr, value))
+            return ""
+
+        return text
+
+    def td_texts(self):
+        return list(self._tds)
+
+def _missing_field(tag, attr, value):
+    return "No '%s' element with %s='%s' in the page" % (tag or "*", attr, value)
+
+def element_text(element):
+    """
+    Returns the stripped text of an lxml element and of its descendants.
+    """
+    return "".join(element.itertext()).strip()
+
+def get_web_page_fields(url, force):
+    """
+    Gets the elements of a page with an id, gkey or vkey attribute. The
+    page is parsed, and the elements collected, once.
+
+    Arguments:
+    url - the URL to retrieve
+    force - if True, overwrite the cache
+
+    Return value:
+    The PageFields of the page
     """
-    if force or (url not in _web_cache):
-        r = requests.get(url)
-        _web_cache[url] = r.content                
+    web_page = get_web_page(url, force)
+
+    entry = _get_parsed_page(url, web_page)
 
-    return _web_cache[url]
+    fields = entry.get("fields")
+    if fields is None:
+        if "data" in entry:
+            fields = PageFieldTexts(entry["data"],
+                                    lambda: PageFields(_entry_tree(entry, web_page)))
+        else:
+            fields = PageFields(entry["tree"])
+        entry["fields"] = fields
 
+    return fields
 
-def get_web_page_table(url, force, table_idx):
+def get_web_page_table(url, force, table_idx, spans = False):
     """
-    Gets a web page table in DataFrame format
+    Gets a web page table in DataFrame format. The page is parsed once, no
+    matter how many of its tables are retrieved.
 
     Arguments:
     url - the URL to retrieve
     force - if True, overwrite the cache
     table_idx - the index of the table
+    spans - if True, cells with colspan and rowspan attributes are repeated
+        over all the columns and rows they span
     
     Return value:
     The DataFrame associated to the table
@@ -41,42 +843,242 @@ def get_web_page_table(url, force, table_idx):
     # Get the page
     web_page = get_web_page(url, force)
 
-    # Parse the contents
-    soup = BeautifulSoup(web_page, 'lxml')
+    entry = _get_parsed_page(url, web_page)
 
-    # List of all tables
-    tables = soup.find_all('table')
+    df = entry["frames"].get((table_idx, spans))
+    if df is None:
+        if "data" in entry and not spans:
+            # Rows extracted by a worker process
+            df = rows_to_dataframe(entry["data"]["tables"][table_idx])
+        else:
+            _entry_tree(entry, web_page)
+            df = table_to_dataframe(entry["tables"][table_idx], spans)
+        entry["frames"][(table_idx, spans)] = df
 
-    # Specific tables
-    table = tables[table_idx]
+    # Callers are free to modify the table
+    return df.copy()
 
-    # Get the number of rows and columns
-    row_count = len(table.find_all('tr'))
-    column_count = 0
+# Worker processes parsing pages for parse_web_pages(), created on first
+# use. With 0 workers, pages are parsed in-process.
+_parse_pool = None
+_parse_workers = 0
+_parse_min_batch = 8
+_parse_pool_lock = threading.Lock()
 
-    for row in table.find_all('tr'):
-        column_idx = len(row.find_all('th')) + len(row.find_all('td'))
-        if column_count < column_idx:
-            column_count = column_idx
-    
-    #print("row_count = %s, column_count = %s"%(row_count, column_count))
+def configure_parse_pool(workers = None, min_batch = None):
+    """
+    Configures the worker processes of parse_web_pages().
 
-    df = pd.DataFrame(columns = range(column_count), 
-                      index = range(row_count))
-    
-    row_idx = 0
-    for row in table.find_all('tr'):
-        column_idx = 0
-        columns = row.find_all('th') + row.find_all('td')
-        for column in columns:
-            column_text = column.get_text()
-    
-            #print("row_idx %d, cloumn_idx %d, text %s" % (row_idx, column_idx, column_text))
-            df.iat[row_idx, column_idx] = column_text
-            column_idx += 1
-        row_idx += 1
+    Arguments:
+    workers - the number of worker processes, 0 to parse in-process
+    min_batch - the smallest batch of pages parsed by the workers. Smaller
+        batches are parsed in-process, saving the transfer to the workers.
+    """
+    global _parse_workers
+    global _parse_min_batch
 
-    return df
+    if workers is not None and workers != _parse_workers:
+        close_parse_pool()
+        _parse_workers = workers
+
+    if min_batch is not None:
+        _parse_min_batch = min_batch
+
+def close_parse_pool():
+    """
+    Stops the worker processes. They are started again when needed.
+    """
+    global _parse_pool
+
+    with _parse_pool_lock:
+        if _parse_pool is not None:
+            _parse_pool.shutdown()
+            _parse_pool = None
+
+def _get_parse_pool():
+    global _parse_pool
+
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = concurrent.futures.ProcessPoolExecutor(max_workers = _parse_workers)
+
+        return _parse_pool
+
+def page_data(tree):
+    """
+    Extracts the tables and fields of a parsed page as picklable data.
+
+    Arguments:
+    tree - the lxml root element of the page
+
+    Return value:
+    Dict with the "tables" rows (see table_rows()), the "fields" texts as
+    (attr, value, tag) to text (see PageFields.text()), and the "tds"
+    texts (see PageFields.td_texts())
+    """
+    fields = PageFields(tree)
+
+    return { "tables": [table_rows(table) for table in tree.iter("table")],
+             "fields": dict((key, element_text(elements[0]))
+                            for key, elements in fields._elements.items()),
+             "tds": fields.td_texts() }
+
+def _parse_page_data(web_page):
+    """
+    Parses a page into its page data. Runs in the worker processes.
+    """
+    return page_data(parse_html(web_page))
+
+def parse_web_pages(urls, force = False):
+    """
+    Fetches and parses web pages ahead of the scrapers, whose tables and
+    fields are then served from the parse cache. With worker processes
+    configured (see configure_parse_pool()), batches of min_batch pages or
+    more are parsed by the workers, off the GIL of this process. The parse
+    cache should be large enough for the batch (see set_parse_cache_size()).
+
+    Arguments:
+    urls - the URLs to retrieve
+    force - if True, overwrite the cache
+
+    Return value:
+    Dict of url to page data (see page_data()), for the pages retrieved
+    """
+    pages = [(url, page) for url, page in zip(urls, get_web_pages(urls, force))
+             if page is not None]
+
+    results = dict()
+    pending = list()
+    for url, web_page in pages:
+        key = (url, hashlib.sha1(web_page).digest())
+        with _parse_cache_lock:
+            entry = _parse_cache.get(key)
+
+        if entry is None:
+            pending.append((key, web_page))
+        else:
+            if "data" not in entry:
+                entry["data"] = page_data(_entry_tree(entry, web_page))
+            results[url] = entry["data"]
+
+    if _parse_workers > 0 and len(pending) >= _parse_min_batch:
+        chunk_size = max(1, len(pending) // (_parse_workers * 4))
+        try:
+            datas = list(_get_parse_pool().map(_parse_page_data,
+                                               [web_page for key, web_page in pending],
+                                               chunksize = chunk_size))
+        except (OSError, concurrent.futures.process.BrokenProcessPool):
+            # Parse in-process
+            close_parse_pool()
+        else:
+            for (key, web_page), data in zip(pending, datas):
+                _put_parsed_page(key, { "data": data, "frames": dict() })
+                results[key[0]] = data
+            pending = list()
+
+    for key, web_page in pending:
+        tree = parse_html(web_page)
+        data = page_data(tree)
+        _put_parsed_page(key, { "tree": tree,
+                                "tables": list(tree.iter("table")),
+                                "data": data,
+                                "frames": dict() })
+        results[key[0]] = data
+
+    return results
+
+def table_rows(table, spans = False):
+    """
+    Extracts the cell texts of an lxml table, in a single pass.
+
+    Each 'tr' of the table, including those of nested tables, is a row. The
+    'th' cells of a row come first, followed by its 'td' cells.
+
+    Arguments:
+    table - the lxml table element
+    spans - if True, cells with colspan and rowspan attributes are repeated
+        over all the columns and rows they span
+
+    Return value:
+    List of rows, each a list of cell texts
+    """
+    rows = list()
+
+    # Row spans still pending, as column index to [rows left, text]
+    pending = dict()
+
+    for tr in table.iter("tr"):
+        cells = list(tr.iter("th"))
+        cells.extend(tr.iter("td"))
+
+        if not spans:
+            rows.append(["".join(cell.itertext()) for cell in cells])
+            continue
+
+        row = list()
+        for cell in cells:
+            # Fill the columns taken by cells spanning from rows above
+            while len(row) in pending:
+                row.append(_pop_span(pending, len(row)))
+
+            text = "".join(cell.itertext())
+            colspan = _span(cell, "colspan")
+            rowspan = _span(cell, "rowspan")
+
+            for i in range(colspan):
+                if rowspan > 1:
+                    pending[len(row)] = [rowspan - 1, text]
+                row.append(text)
+
+        # Row spans past the last cell of the row
+        while pending and max(pending) >= len(row):
+            if len(row) in pending:
+                row.append(_pop_span(pending, len(row)))
+            else:
+                row.append(float("nan"))
+
+        rows.append(row)
+
+    return rows
+
+def _span(cell, attr):
+    try:
+        return max(1, int(cell.get(attr, 1)))
+    except ValueError:
+        return 1
+
+def _pop_span(pending, column_idx):
+    span = pending[column_idx]
+    span[0] -= 1
+    if span[0] == 0:
+        del pending[column_idx]
+    return span[1]
+
+def table_to_dataframe(table, spans = False):
+    """
+    Converts an lxml table to a DataFrame of cell texts. Short rows are
+    padded with NaN.
+
+    Arguments:
+    table - the lxml table element
+    spans - see table_rows()
+    """
+    return rows_to_dataframe(table_rows(table, spans))
+
+def rows_to_dataframe(rows):
+    """
+    Converts a list of rows of cell texts to a DataFrame. Short rows are
+    padded with NaN.
+    """
+    column_count = 0
+    for row in rows:
+        if column_count < len(row):
+            column_count = len(row)
+
+    nan = float("nan")
+    rows = [row + [nan] * (column_count - len(row)) for row in rows]
+
+    return pd.DataFrame(rows, columns = range(column_count), dtype = object)
 
 def dataframe_promote_1st_row_and_column_as_labels(df):
     """
@@ -105,5 +1107,122 @@ def dataframe_promote_1st_row_and_column_as_labels(df):
 
     return df
 
+# Cell values standing for missing data
+_MISSING_VALUES = ["", "\u2014", "\u2013", "-", "--", "N/A", "NA", "nan", "None", "NaN"]
+
+# Dates, optionally after "As of", with the rest (time, time zone) ignored
+_DATE_PATTERN = r"^(?:[Aa]s [Oo]f\s+)?(\d{1,2}/\d{1,2}/\d{4})\b"
+
+# Unit markers in cells and labels, as (unit, pattern). Billions are
+# converted to millions.
+_UNIT_PATTERNS = [("percent", r"%"),
+                  ("currency", r"\$|\bUSD\b"),
+                  ("millions", r"(?i)\bmil\b|\bbil\b")]
+
+# Unit markers and thousands separators, removed before number conversion
+_NUMBER_NOISE = r"(?i)[$,%\s]|\bUSD\b|\bmil\b|\bbil\b"
+
+def dataframe_to_numeric(df):
+    """
+    Converts a DataFrame of strings to numbers and dates, in one vectorized
+    pass over all the cells. Missing values ("", dashes, "N/A") become NaN,
+    unit markers and thousands separators are removed, and "mm/dd/yyyy"
+    dates (optionally after "As of") become Timestamps.
+
+    Columns with only numbers become float64, and columns with only dates
+    become datetime64. Other columns keep their text cells, with the
+    numbers and dates converted.
+
+    The units found in the cells or labels ("percent", "currency",
+    "millions") are stored as tuples in df.attrs["units"] for the number
+    columns, and in df.attrs["row_units"] for the rows.
+
+    Arguments:
+    df - the DataFrame
+
+    Returns: the converted DataFrame
+    """
+    # Nothing to convert, and pd.concat() needs at least one column
+    if len(df.columns) == 0:
+        result = df.copy()
+        result.attrs["units"] = dict()
+        result.attrs["row_units"] = dict()
+        return result
+
+    shape = df.shape
+
+    # All the cells in one Series, row by row
+    cells = pd.Series(df.to_numpy(dtype = object).ravel(), dtype = object)
+    null = cells.isnull().to_numpy()
+    text = cells.astype(str).str.strip().str.replace("\u2212", "-", regex = False)
+    missing = null | text.isin(_MISSING_VALUES).to_numpy()
+
+    # Numbers
+    numbers = pd.to_numeric(text.str.replace(_NUMBER_NOISE, "", regex = True), errors = "coerce")
+    billions = text.str.contains(r"(?i)\bbil\b", regex = True).to_numpy()
+    numbers[billions] = numbers[billions] * 1000
+    is_number = (numbers.notnull().to_numpy() & ~missing)
+
+    # Dates
+    dates = pd.to_datetime(text.str.extract(_DATE_PATTERN, expand = False),
+                           format = "%m/%d/%Y", errors = "coerce")
+    is_date = dates.notnull().to_numpy() & ~is_number & ~missing
+
+    # Cell units
+    units = [(unit, text.str.contains(pattern, regex = True).to_numpy() & is_number)
+             for unit, pattern in _UNIT_PATTERNS]
+
+    def reshape(values):
+        return values.reshape(shape)
+
+    is_number = reshape(is_number)
+    is_date = reshape(is_date)
+    missing = reshape(missing)
+    numbers = reshape(numbers.to_numpy(dtype = float))
+    dates = reshape(dates.astype(object).to_numpy())
+    texts = reshape(cells.to_numpy())
+    units = [(unit, reshape(mask)) for unit, mask in units]
+
+    columns = dict()
+    numeric = np.zeros(shape[1], dtype = bool)
+    for i in range(shape[1]):
+        if is_number[:, i].any() and (is_number[:, i] | missing[:, i]).all():
+            columns[i] = pd.Series(numbers[:, i], dtype = "float64")
+            numeric[i] = True
+        elif is_date[:, i].any() and (is_date[:, i] | missing[:, i]).all():
+            columns[i] = pd.Series(dates[:, i], dtype = "datetime64[ns]")
+        else:
+            values = texts[:, i].copy()
+            values[is_number[:, i]] = numbers[:, i][is_number[:, i]]
+            values[is_date[:, i]] = dates[:, i][is_date[:, i]]
+            values[missing[:, i]] = np.nan
+            columns[i] = pd.Series(values, dtype = object)
+
+    result = pd.concat(columns, axis = 1)
+    result.index = df.index
+    result.columns = df.columns
+
+    def label_units(label):
+        label = str(label)
+        return [unit for unit, pattern in _UNIT_PATTERNS if re.search(pattern, label)]
+
+    # Column units for the number columns, and row units for the cells of
+    # the other columns (such as quotes, with one field per row)
+    result.attrs["units"] = dict()
+    for i, column in enumerate(df.columns):
+        if not numeric[i]:
+            continue
+        found = [unit for unit, mask in units if mask[:, i].any()] + label_units(column)
+        if found:
+            result.attrs["units"][column] = tuple(sorted(set(found)))
+
+    result.attrs["row_units"] = dict()
+    for i, row in enumerate(df.index):
+        found = [unit for unit, mask in units if mask[i, ~numeric].any()] + label_units(row)
+        if found:
+            result.attrs["row_units"][row] = tuple(sorted(set(found)))
+
+    return result
+
 if __name__ == "__main__":
     pass
@@ -0,0 +1,332 @@
+"""
+Persistent caches for web pages
+"""
+import os
+import re
+import time
+import hashlib
+import sqlite3
+import threading
+import zlib
+import lzma
+from collections import OrderedDict
+
+# Time to live, in seconds, for pages matching a URL pattern. The first
+# matching pattern wins; pages matching no pattern use _DEFAULT_TTL.
+DEFAULT_TTLS = [
+    # Quotes
+    (r"fastquote\.fidelity\.com", 30),
+    (r"/c-header|/quote-banner|/cef-header|Quote\.aspx", 30),
+    # Fund and stock profiles
+    (r"portfolios\.morningstar\.com/fund/summary", 24 * 3600),
+    (r"/c-company-profile|/c-competitors|printreport\.aspx", 24 * 3600),
+    (r"/trailing-total-returns", 24 * 3600),
+    # Historical returns
+    (r"/historical-returns|/performance-history", 7 * 24 * 3600),
+]
+
+_DEFAULT_TTL = 3600
+
+# Memory cache compressors, as (compress, decompress) pairs
+_COMPRESSORS = {
+    None: (None, None),
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+class MemoryCache(object):
+    """
+    Web page cache held in memory, bounded by a byte budget.
+
+    When the stored pages exceed the budget, the least recently used pages
+    are evicted. Pages may optionally be stored compressed, trading CPU time
+    on every hit for a smaller footprint. With a time to live function,
+    pages expire as in the DiskCache.
+    """
+    def __init__(self, max_bytes = 64 * 1024 * 1024, compression = None, ttl = None):
+        """
+        Arguments:
+        max_bytes - the byte budget for the stored pages
+        compression - None, "zlib" or "lzma"
+        ttl - function returning the time to live, in seconds, of a URL
+            (e.g. DiskCache.ttl). Default: pages don't expire
+        """
+        if compression not in _COMPRESSORS:
+            raise ValueError("Unknown compression '%s'" % compression)
+
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.ttl = ttl
+        self._compress, self._decompress = _COMPRESSORS[compression]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+        # Maps url to (stored bytes, raw length, fetch time), least recently
+        # used first
+        self._pages = OrderedDict()
+        self._bytes = 0
+        self._raw_bytes = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, url):
+        with self._lock:
+            return url in self._pages
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pages)
+
+    def get(self, url):
+        """
+        Gets a page from the cache.
+
+        Return value:
+        The page contents, or None if the page is not cached
+        """
+        with self._lock:
+            entry = self._pages.get(url)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if self.ttl is not None and time.time() - entry[2] > self.ttl(url):
+                self._remove(url)
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            self._pages.move_to_end(url)
+            self.hits += 1
+
+        if self._decompress:
+            return self._decompress(entry[0])
+
+        return entry[0]
+
+    def put(self, url, content, fetched = None):
+        """
+        Stores a page in the cache, evicting the least recently used pages
+        to stay within the byte budget. Pages larger than the whole budget
+        are not stored.
+
+        Arguments:
+        url - the page URL
+        content - the page contents
+        fetched - the fetch time of the page, as time.time(). Default: now
+        """
+        stored = self._compress(content) if self._compress else content
+
+        with self._lock:
+            self._remove(url)
+
+            if len(stored) > self.max_bytes:
+                return
+
+            self._pages[url] = (stored, len(content), time.time() if fetched is None else fetched)
+            self._bytes += len(stored)
+            self._raw_bytes += len(content)
+
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._pages)))
+                self.evictions += 1
+
+    def _remove(self, url):
+        entry = self._pages.pop(url, None)
+        if entry is not None:
+            self._bytes -= len(entry[0])
+            self._raw_bytes -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self._bytes = 0
+            self._raw_bytes = 0
+
+    def stats(self):
+        """
+        Returns a dict with the cache counters and the current footprint.
+        """
+        with self._lock:
+            return { "hits": self.hits,
+                     "misses": self.misses,
+                     "evictions": self.evictions,
+                     "expired": self.expired,
+                     "pages": len(self._pages),
+                     "bytes": self._bytes,
+                     "raw_bytes": self._raw_bytes,
+                     "max_bytes": self.max_bytes,
+                     "compression": self.compression }
+
+def page_ttl(url, ttls = None, default_ttl = _DEFAULT_TTL):
+    """
+    Returns the time to live, in seconds, of a URL under a list of (regex,
+    seconds) tuples (default: DEFAULT_TTLS), as DiskCache.ttl() does.
+    """
+    for pattern, ttl in (DEFAULT_TTLS if ttls is None else ttls):
+        if re.search(pattern, url):
+            return ttl
+
+    return default_ttl
+
+class DiskCache(object):
+    """
+    Content-addressed web page cache stored in a SQLite database.
+
+    Page bodies are stored once per SHA-1 digest in the 'blobs' table, and
+    the 'pages' table maps each URL to a digest and to its fetch time.
+    """
+    def __init__(self, path, ttls = None, default_ttl = _DEFAULT_TTL):
+        """
+        Arguments:
+        path - the SQLite database file, created if it does not exist
+        ttls - list of (regex, seconds) tuples. Default: DEFAULT_TTLS
+        default_ttl - time to live for URLs not matching any of the ttls
+        """
+        self.path = path
+        self.default_ttl = default_ttl
+        self.set_ttls(DEFAULT_TTLS if ttls is None else ttls)
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._lock = threading.Lock()
+
+        dir_name = os.path.dirname(path)
+        if dir_name and not os.path.isdir(dir_name):
+            os.makedirs(dir_name)
+
+        self._db = sqlite3.connect(path, check_same_thread = False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest TEXT PRIMARY KEY,
+                content BLOB NOT NULL);
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                fetched REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS pages_digest ON pages (digest);
+            """)
+
+        # The bodies left behind by earlier versions
+        self._db.execute("DELETE FROM blobs WHERE digest NOT IN (SELECT digest FROM pages)")
+        self._db.commit()
+
+    def set_ttls(self, ttls):
+        """
+        Replaces the list of (regex, seconds) time to live patterns.
+        """
+        self._ttls = [(re.compile(pattern), ttl) for pattern, ttl in ttls]
+
+    def ttl(self, url):
+        """
+        Returns the time to live, in seconds, of the given URL.
+        """
+        for pattern, ttl in self._ttls:
+            if pattern.search(url):
+                return ttl
+
+        return self.default_ttl
+
+    def get(self, url, stale_ok = False):
+        """
+        Gets a page from the cache.
+
+        Arguments:
+        url - the URL to look up
+        stale_ok - if True, return the page even if its time to live expired
+
+        Return value:
+        The page contents, or None if the page is not cached or expired
+        """
+        entry = self.get_entry(url, stale_ok)
+
+        return None if entry is None else entry[0]
+
+    def get_entry(self, url, stale_ok = False):
+        """
+        Gets a page from the cache, with its fetch time (see get()).
+
+        Return value:
+        (contents, fetch time) tuple, or None if the page is not cached or
+        expired
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT blobs.content, pages.fetched FROM pages "
+                "JOIN blobs ON blobs.digest = pages.digest "
+                "WHERE pages.url = ?", (url,)).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            content, fetched = row
+            if not stale_ok and time.time() - fetched > self.ttl(url):
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return bytes(content), fetched
+
+    def put(self, url, content):
+        """
+        Stores a page in the cache, replacing any previous copy. The body of
+        the previous copy is removed, unless another page has it.
+        """
+        digest = hashlib.sha1(content).hexdigest()
+
+        with self._lock:
+            row = self._db.execute("SELECT digest FROM pages WHERE url = ?", (url,)).fetchone()
+
+            self._db.execute("INSERT OR IGNORE INTO blobs (digest, content) "
+                             "VALUES (?, ?)", (digest, sqlite3.Binary(content)))
+            self._db.execute("INSERT OR REPLACE INTO pages (url, digest, fetched) "
+                             "VALUES (?, ?, ?)", (url, digest, time.time()))
+
+            if row is not None and row[0] != digest:
+                self._db.execute("DELETE FROM blobs WHERE digest = ? AND NOT EXISTS "
+                                 "(SELECT 1 FROM pages WHERE digest = ?)", (row[0], row[0]))
+            self._db.commit()
+
+    def purge(self, expired_only = True):
+        """
+        Removes pages from the cache, and the page bodies no longer referenced.
+
+        Arguments:
+        expired_only - if False, empty the whole cache
+        """
+        with self._lock:
+            if expired_only:
+                now = time.time()
+                rows = self._db.execute("SELECT url, fetched FROM pages").fetchall()
+                stale = [(url,) for url, fetched in rows
+                         if now - fetched > self.ttl(url)]
+                self._db.executemany("DELETE FROM pages WHERE url = ?", stale)
+            else:
+                self._db.execute("DELETE FROM pages")
+
+            self._db.execute("DELETE FROM blobs WHERE digest NOT IN "
+                             "(SELECT digest FROM pages)")
+            self._db.commit()
+
+    def stats(self):
+        """
+        Returns a dict with the cache hit, miss and size counters.
+        """
+        with self._lock:
+            pages = self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+            blobs, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(content)), 0) FROM blobs").fetchone()
+
+        return { "hits": self.hits,
+                 "misses": self.misses,
+                 "expired": self.expired,
+                 "pages": pages,
+                 "blobs": blobs,
+                 "bytes": size }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -2,22 +2,279 @@
 The configuration module.
 """
 
+import io
 import os
 import stat
+import time
+import tempfile
+import tracemalloc
 import wx
+import numpy as np
 import pandas as pd
 import TickerMain
+import PortfolioDb
+import Format
 import xml.etree.ElementTree as ET
 
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
 #---------------------------------------------------------------------------
 # Get the entire portfolio
 def PortfolioRead():
-    PortfolioReadXml()
+    PortfolioReadFile()
 
 #---------------------------------------------------------------------------
 # Save the entire portfolio
 def PortfolioSave():
-    PortfolioSaveXml()
+    PortfolioSaveFile()
+
+#---------------------------------------------------------------------------
+# The file the portfolio was read from, and is saved to, by PortfolioRead()
+# and PortfolioSave()
+_portfolioFile = None
+
+# The PortfolioDb of _portfolioFile, when it is a SQLite file. Edits are
+# then written to it as they are made (see PortfolioSetValue()).
+_portfolioDb = None
+
+#---------------------------------------------------------------------------
+# The portfolio file formats, fastest to load first, as
+# (description, extension). Arrow requires pyarrow.
+def PortfolioFormats():
+    formats = []
+    if pa is not None:
+        formats.append(("Arrow files", ".arrow"))
+    formats.append(("NumPy files", ".npz"))
+    formats.append(("SQLite files", ".sqlite"))
+    formats.append(("XML files", ".xml"))
+    return formats
+
+#---------------------------------------------------------------------------
+# The wx.FileDialog wildcard of the portfolio file formats, and the
+# extension of each filter index
+def PortfolioWildcard():
+    formats = PortfolioFormats()
+    wildcard = "|".join("%s (*%s)|*%s" % (description, ext, ext) for description, ext in formats)
+    return wildcard + "|All files (*.*)|*.*", [ext for description, ext in formats]
+
+def _PortfolioExtension(fName):
+    return os.path.splitext(fName)[1].lower()
+
+def _PortfolioFormat(fName):
+    """
+    Returns the (reader, writer) of a portfolio file, by extension. Files
+    with unknown extensions are xml.
+    """
+    ext = _PortfolioExtension(fName)
+    if ext == ".arrow" and pa is None:
+        raise ValueError("Reading or writing '%s' requires pyarrow" % fName)
+
+    return _portfolioFormats.get(ext, _portfolioFormats[".xml"])
+
+def _DefaultPortfolioFile(ext = None):
+    """
+    Description:
+    Get the default portfolio file, <standard user path>/tickerScrape.<ext>
+
+    Parameters:
+    ext - the file extension. If None, the extension of the most recently
+        saved tickerScrape file, the fastest format on ties, or else ".xml"
+    """
+    # Get the wxPython standard paths
+    sp = wx.StandardPaths.Get()
+    base = sp.GetUserDataDir() + "/tickerScrape"
+
+    if ext:
+        return base + ext
+
+    newest = None
+    newestTime = None
+    for description, ext in PortfolioFormats():
+        try:
+            mtime = os.path.getmtime(base + ext)
+        except OSError:
+            continue
+        if newest is None or mtime > newestTime:
+            newest = base + ext
+            newestTime = mtime
+
+    return newest or base + ".xml"
+
+def _PortfolioTables():
+    """
+    Returns the portfolio DataFrames, as a dict of element tag (see
+    _xmlColumns) to DataFrame.
+    """
+    return {
+        "holding": holdingsDf,
+        "account": accountsDf,
+        "account-type": accountTypesDf,
+        "category": categoriesDf,
+    }
+
+def _FloatFileString(f, decimals):
+    """
+    Returns the portfolio file string of a number: with the given decimals,
+    or with as many as it takes to read the same number back.
+    """
+    s = Format.FloatToString(f, decimals)
+
+    if s and float(s.replace(",", "")) != f:
+        s = "{:,}".format(f)
+
+    return s
+
+# The numeric and date holdings columns, with their string format in the
+# portfolio files
+_holdingsFormats = {
+    "Units": lambda f: _FloatFileString(f, 3),
+    "Cost Basis": lambda f: _FloatFileString(f, 2),
+    "Purchase Date": Format.DateToString,
+}
+
+def _TypedHoldings(df):
+    """
+    Description:
+    Convert the holdings strings of a portfolio file to numbers and dates.
+    Dates are mm/dd/yyyy, or any other format pandas recognizes.
+
+    Parameters:
+    df - the holdings DataFrame, with string columns
+
+    Returns:
+    The holdings DataFrame with float64 Units and Cost Basis, and datetime64
+    Purchase Date. Blank cells are NaN or NaT. So are cells that can't be
+    read, whose strings are kept in df.attrs["unparsed"] (see HoldingsText())
+    and saved back unchanged.
+    """
+    df = df.copy()
+    unparsed = dict(df.attrs.get("unparsed", dict()))
+
+    for column in ("Units", "Cost Basis", "Purchase Date"):
+        if df[column].dtype != object:
+            continue
+
+        strings = df[column].fillna("").astype(str)
+
+        if column == "Purchase Date":
+            values = pd.to_datetime(strings, format="%m/%d/%Y", errors="coerce")
+
+            # Other date formats, e.g. yyyy-mm-dd
+            retry = values.isna() & (strings.str.strip() != "")
+            if retry.any():
+                values[retry] = [pd.to_datetime(s, errors="coerce") for s in strings[retry]]
+        else:
+            s = strings.str.replace(",", "", regex=False).str.strip().str.lstrip("$")
+            values = pd.to_numeric(s, errors="coerce").astype(np.float64)
+
+        for row in np.flatnonzero(values.isna() & (strings.str.strip() != "")):
+            unparsed[(int(row), column)] = strings.iloc[row]
+
+        df[column] = values
+
+    df.attrs["unparsed"] = unparsed
+
+    return df
+
+def _StringHoldings(df):
+    """
+    Description:
+    Convert the holdings numbers and dates to their portfolio file strings
+
+    Parameters:
+    df - the holdings DataFrame, as returned by _TypedHoldings()
+
+    Returns:
+    The holdings DataFrame with string columns, "" for NaN and NaT, or the
+    string read from the file for cells that could not be read
+    """
+    df = df.copy()
+
+    for column, toString in _holdingsFormats.items():
+        if column == "Purchase Date":
+            # Format each distinct date once, Series.dt.strftime() is slow
+            codes, dates = pd.factorize(df[column])
+            strings = np.array([toString(date) for date in dates] + [""], dtype=object)
+            df[column] = pd.Series(strings[codes], index=df.index, dtype=object)
+        else:
+            df[column] = pd.Series([toString(f) for f in df[column].tolist()],
+                                   index=df.index, dtype=object)
+
+    for (row, column), string in df.attrs.get("unparsed", dict()).items():
+        if row < len(df.index) and df[column].iloc[row] == "":
+            df.loc[df.index[row], column] = string
+
+    return df
+
+def HoldingsText(row, column):
+    """
+    Description:
+    The string read from the portfolio file for a holdings cell that could
+    not be read as a number or date
+
+    Parameters:
+    row - the row number
+    column - the column name
+
+    Returns:
+    The string, or "" if the cell was read or is blank
+    """
+    return holdingsDf.attrs.get("unparsed", dict()).get((row, column), "")
+
+def _MoveUnparsed(tag, function):
+    """
+    Renumber the unparsed holdings cells after a holdings edit, with
+    function(row) returning the new row number, or None for a deleted row.
+    """
+    if tag != "holding":
+        return
+
+    unparsed = dict()
+    for (row, column), string in holdingsDf.attrs.get("unparsed", dict()).items():
+        row = function(row)
+        if row is not None:
+            unparsed[(row, column)] = string
+
+    holdingsDf.attrs["unparsed"] = unparsed
+
+def _StringTables(tables):
+    """
+    Returns the portfolio DataFrames with the holdings as strings, for the
+    xml and SQLite writers.
+    """
+    tables = dict(tables)
+    tables["holding"] = _StringHoldings(tables["holding"])
+
+    return tables
+
+def _CellString(tag, col, value):
+    """
+    Returns the portfolio file string of a cell value.
+    """
+    if tag == "holding":
+        toString = _holdingsFormats.get(holdingsDf.columns[col])
+        if toString is not None:
+            return toString(value)
+
+    return value
+
+#---------------------------------------------------------------------------
+def PortfolioConvert(srcName, dstName):
+    """
+    Description:
+    Convert a portfolio file to another format, e.g. tickerScrape.xml to
+    tickerScrape.arrow, without changing the current portfolio
+
+    Parameters:
+    srcName - the file to read, in the format of its extension
+    dstName - the file to write, in the format of its extension
+    """
+    reader, writer = _PortfolioFormat(dstName)
+    _WriteFileAtomic(dstName, writer(_ReadTables(srcName)))
 
 # The config changed flag
 _configChanged = False
@@ -57,30 +314,26 @@ def AccountFind(acct):
 
 #---------------------------------------------------------------------------
 def AccountChange(acctOld, acctNew):
-    configChanged = False
-
     if acctOld == acctNew:
         return True, None
     
     if AccountFind(acctNew):
         return False, "Account '%s' already configured" % acctNew
 
-    for i in range(accountsDf.shape[0]):
-        if accountsDf.ix[i,"Account Name"] == acctOld:
-            accountsDf.ix[i,"Account Name"] = acctNew
-            configChanged = True
-
-    if not configChanged:
+    accounts = accountsDf["Account Name"] == acctOld
+    if not accounts.any():
         return False, "Account '%s' does not exist" % acctOld
 
+    accountsDf.loc[accounts, "Account Name"] = acctNew
+
     # Also change the holdings
-    for i in range(holdingsDf.shape[0]):
-        if holdingsDf.ix[i,"Account"] == acctOld:
-            holdingsDf.ix[i,"Account"] = acctNew
-            configChanged = True
+    holdingsDf.loc[holdingsDf["Account"] == acctOld, "Account"] = acctNew
 
-    if configChanged:
-        PortfolioChanged(True)
+    if _portfolioDb is not None:
+        _portfolioDb.Rename([("account", "name", acctOld, acctNew),
+                             ("holding", "account", acctOld, acctNew)])
+
+    _PortfolioEdited()
 
     return True, None
 
@@ -102,30 +355,26 @@ def AccountTypesFind(acct):
 
 #---------------------------------------------------------------------------
 def AccountTypesChange(acctTypeOld, acctTypeNew):
-    configChanged = False
-
     if acctTypeOld == acctTypeNew:
         return True, None
 
     if AccountTypesFind(acctTypeNew):
         return False, "Account type '%s' already configured" % acctTypeNew
 
-    for i in range(accountTypesDf.shape[0]):
-        if accountTypesDf.ix[i,"Account Type"] == acctTypeOld:
-            accountTypesDf.ix[i,"Account Type"] = acctTypeNew
-            configChanged = True
-
-    if not configChanged:
+    accountTypes = accountTypesDf["Account Type"] == acctTypeOld
+    if not accountTypes.any():
         return False, "Account type '%s' does not exist" % acctTypeOld
 
+    accountTypesDf.loc[accountTypes, "Account Type"] = acctTypeNew
+
     # Also change the accounts
-    for i in range(accountsDf.shape[0]):
-        if accountsDf.ix[i,"Type"] == acctTypeOld:
-            accountsDf.ix[i,"Type"] = acctTypeNew
-            configChanged = True
+    accountsDf.loc[accountsDf["Type"] == acctTypeOld, "Type"] = acctTypeNew
 
-    if configChanged:
-        PortfolioChanged(True)
+    if _portfolioDb is not None:
+        _portfolioDb.Rename([("account-type", "type", acctTypeOld, acctTypeNew),
+                             ("account", "type", acctTypeOld, acctTypeNew)])
+
+    _PortfolioEdited()
 
     return True, None
 
@@ -147,41 +396,332 @@ def CategoriesFind(acct):
 
 #---------------------------------------------------------------------------
 def CategoriesChange(categoryOld, categoryNew):
-    configChanged = False
-
     if categoryOld == categoryNew:
         return True, None
 
     if CategoriesFind(categoryNew):
         return False, "Category '%s' already configured" % categoryNew
 
-    for i in range(categoriesDf.shape[0]):
-        if categoriesDf.ix[i,"Category Name"] == categoryOld:
-            categoriesDf.ix[i,"Category Name"] = categoryNew
-            configChanged = True
-
-    if not configChanged:
+    categories = categoriesDf["Category Name"] == categoryOld
+    if not categories.any():
         return False, "Category '%s' does not exist" % categoryOld
 
-    if configChanged:
-        PortfolioChanged(True)
+    categoriesDf.loc[categories, "Category Name"] = categoryNew
+
+    if _portfolioDb is not None:
+        _portfolioDb.Rename([("category", "name", categoryOld, categoryNew)])
+
+    _PortfolioEdited()
 
     return True, None
 
 
-def PortfolioReadXml(fileName = None):
+#---------------------------------------------------------------------------
+# Portfolio edits. The views edit the portfolio DataFrames through these,
+# which also write the edit to the SQLite portfolio file, if in use.
+
+def _PortfolioEdited():
+    # Edits of a SQLite portfolio are already saved
+    if _portfolioDb is None:
+        PortfolioChanged(True)
+
+#---------------------------------------------------------------------------
+def PortfolioSetValue(tag, row, col, value):
+    """
+    Description:
+    Set the value of a portfolio DataFrame cell
+
+    Parameters:
+    tag - the xml element tag of the DataFrame (see _xmlColumns)
+    row - the row number
+    col - the column number
+    value - the new value
+    """
+    _PortfolioTables()[tag].iloc[row, col] = value
+
+    if tag == "holding":
+        holdingsDf.attrs.get("unparsed", dict()).pop((row, holdingsDf.columns[col]), None)
+
+    if _portfolioDb is not None:
+        _portfolioDb.SetValue(tag, row, col, _CellString(tag, col, value))
+
+    _PortfolioEdited()
+
+#---------------------------------------------------------------------------
+def PortfolioAddRow(tag, values):
+    """
+    Description:
+    Append a row to a portfolio DataFrame
+
+    Parameters:
+    tag - the xml element tag of the DataFrame (see _xmlColumns)
+    values - the row values, in column order
+    """
+    df = _PortfolioTables()[tag]
+    row = len(df.index)
+    dtypes = df.dtypes
+    df.loc[row] = values
+
+    # Keep the column types, e.g. a NaT in a date column makes it object
+    for column, dtype in dtypes.items():
+        if df[column].dtype != dtype:
+            df[column] = df[column].astype(dtype)
+
+    if _portfolioDb is not None:
+        _portfolioDb.AddRow(tag, row, [_CellString(tag, col, value) for col, value in enumerate(values)])
+
+    _PortfolioEdited()
+
+#---------------------------------------------------------------------------
+def PortfolioDeleteRows(tag, rows):
+    """
+    Description:
+    Delete rows from a portfolio DataFrame
+
+    Parameters:
+    tag - the xml element tag of the DataFrame (see _xmlColumns)
+    rows - the row numbers
+    """
+    df = _PortfolioTables()[tag]
+
+    # Drop the list of rows from the dataframe
+    df.drop(rows, inplace=True)
+    # Reset the dataframe index, and don't add an index column
+    df.reset_index(inplace=True, drop=True)
+
+    deleted = set(rows)
+    _MoveUnparsed(tag, lambda row: None if row in deleted else
+                  row - sum(1 for r in deleted if r < row))
+
+    if _portfolioDb is not None:
+        _portfolioDb.DeleteRows(tag, rows)
+
+    _PortfolioEdited()
+
+#---------------------------------------------------------------------------
+def PortfolioSwapRows(tag, row1, row2):
+    """
+    Description:
+    Swap two rows of a portfolio DataFrame
+
+    Parameters:
+    tag - the xml element tag of the DataFrame (see _xmlColumns)
+    row1, row2 - the row numbers
+    """
+    df = _PortfolioTables()[tag]
+
+    a = df.iloc[row1].copy()
+    b = df.iloc[row2].copy()
+    df.iloc[row1] = b
+    df.iloc[row2] = a
+
+    _MoveUnparsed(tag, lambda row: row2 if row == row1 else row1 if row == row2 else row)
+
+    if _portfolioDb is not None:
+        _portfolioDb.SwapRows(tag, row1, row2)
+
+    _PortfolioEdited()
+
+# The xml element of each portfolio DataFrame, with the element attributes
+# and the DataFrame columns they are read into, in column order
+_xmlColumns = {
+    "holding": [("account", "Account"),
+                ("ticker", "Ticker"),
+                ("units", "Units"),
+                ("cost-basis", "Cost Basis"),
+                ("purchase-date", "Purchase Date")],
+    "account": [("name", "Account Name"),
+                ("number", "Account Number"),
+                ("type", "Type")],
+    "account-type": [("type", "Account Type"),
+                     ("long-term-capital-gains-tax", "Long Term Capital Gains Tax"),
+                     ("short-term-capital-gains-tax", "Short Term Capital Gains Tax"),
+                     ("liquidation-tax", "Liquidation Tax")],
+    "category": [("name", "Category Name"),
+                 ("group", "Category Group"),
+                 ("benchmark", "Benchmark")],
+}
+
+# Statistics of the last portfolio read: the file name, the number of rows
+# per element, the time in seconds, and the peak traced memory in bytes
+# (None unless tracemalloc is tracing, e.g. with PYTHONTRACEMALLOC=1)
+portfolioReadStats = None
+
+def _ReadXmlTables(fName):
+    """
+    Description:
+    Read the portfolio DataFrames of a tickerScrape xml file, in a single
+    pass. Elements are cleared as soon as their attributes are read, so
+    memory stays proportional to the DataFrames, not to the xml tree.
+
+    Parameters:
+    fName - the xml file
+
+    Returns:
+    Dict of element tag (see _xmlColumns) to DataFrame
+    """
+    # One list per column
+    columns = dict((tag, [[] for attrs in attrList])
+                   for tag, attrList in _xmlColumns.items())
+
+    # Accounts, tickers and dates repeat a lot: keep one string per value
+    strings = dict()
+
+    root = None
+    for event, elem in ET.iterparse(fName, events=("start", "end")):
+        if root is None:
+            root = elem
+            continue
+
+        if event != "end":
+            continue
+
+        values = columns.get(elem.tag)
+        if values is not None:
+            attrib = elem.attrib
+            for (attr, column), valueList in zip(_xmlColumns[elem.tag], values):
+                value = attrib.get(attr)
+                valueList.append(strings.setdefault(value, value))
+
+        # Drop the element from the partial tree
+        elem.clear()
+        root.clear()
+
+    tables = dict()
+    for tag, attrList in _xmlColumns.items():
+        names = [column for attr, column in attrList]
+        tables[tag] = pd.DataFrame(dict(zip(names, columns[tag])),
+                                   columns=names, dtype=object)
+
+    return tables
+
+def _ReadArrowTables(fName):
+    """
+    Description:
+    Read the portfolio DataFrames of an Arrow IPC file (see _ArrowBytes()).
+    The file is memory-mapped, and the number and date columns are read in
+    place.
+
+    Parameters:
+    fName - the Arrow file
+
+    Returns:
+    Dict of element tag (see _xmlColumns) to DataFrame
+    """
+    with pa.memory_map(fName) as source:
+        table = pa.ipc.open_file(source).read_all()
+
+        def Values(name):
+            values = table.column(name).chunk(0).flatten()
+            if pa.types.is_string(values.type):
+                return pd.Series(values.to_numpy(zero_copy_only=False), dtype=object)
+            return pd.Series(values.to_numpy(zero_copy_only=False))
+
+        tables = dict()
+        for tag, attrList in _xmlColumns.items():
+            names = [column for attr, column in attrList]
+            tables[tag] = pd.DataFrame(dict((column, Values("%s/%s" % (tag, column))) for column in names),
+                                       columns=names)
+
+        _SetUnparsed(tables["holding"], *[Values("unparsed/%s" % name).tolist() for name in _unparsedNames])
+
+    return tables
+
+def _ReadNpzTables(fName):
+    """
+    Description:
+    Read the portfolio DataFrames of a NumPy .npz file (see _NpzBytes())
+
+    Parameters:
+    fName - the .npz file
+
+    Returns:
+    Dict of element tag (see _xmlColumns) to DataFrame
+    """
+    def Values(values):
+        if values.dtype.kind == "U":
+            return pd.Series(values.astype(object), dtype=object)
+        return pd.Series(values)
+
+    tables = dict()
+    with np.load(fName, allow_pickle=False) as npz:
+        for tag, attrList in _xmlColumns.items():
+            names = [column for attr, column in attrList]
+            tables[tag] = pd.DataFrame(dict((column, Values(npz["%s/%s" % (tag, column)])) for column in names),
+                                       columns=names)
+
+        _SetUnparsed(tables["holding"], *[npz["unparsed/%s" % name].tolist() for name in _unparsedNames])
+
+    return tables
+
+def _ReadSqliteTables(fName):
+    """
+    Description:
+    Read the portfolio DataFrames of a SQLite file (see PortfolioDb)
+
+    Parameters:
+    fName - the SQLite file
+
+    Returns:
+    Dict of element tag (see _xmlColumns) to DataFrame
+    """
+    # Raise OSError for a missing file, rather than creating it
+    open(fName, "rb").close()
+
+    db = PortfolioDb.PortfolioDb(fName, _xmlColumns)
+    try:
+        return db.Frames()
+    finally:
+        db.Close()
+
+def _ReadTables(fName):
+    """
+    Description:
+    Read the portfolio DataFrames of a file, in the format of its extension
+    (see PortfolioFormats()), and record the portfolioReadStats
+
+    Parameters:
+    fName - the portfolio file
+
+    Returns:
+    Dict of element tag (see _xmlColumns) to DataFrame
+    """
+    global portfolioReadStats
+
+    startTime = time.time()
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+
+    reader, writer = _PortfolioFormat(fName)
+    tables = reader(fName)
+    tables["holding"] = _TypedHoldings(tables["holding"])
+
+    portfolioReadStats = {
+        "file": fName,
+        "rows": dict((tag, len(df.index)) for tag, df in tables.items()),
+        "seconds": time.time() - startTime,
+        "peak memory": tracemalloc.get_traced_memory()[1] if tracing else None,
+    }
+
+    return tables
+
+def PortfolioReadFile(fileName = None):
     """
     Description:
-    Read tickerScrape xml format config from fileName
+    Read tickerScrape config from fileName, in the format of its extension
+    (see PortfolioFormats()). Files with other extensions are read as xml.
 
     Parameters:
-    fileName - where to read xml config from. If None, configuration will be
-        read from <standard user path>/tickerScrape.xml
+    fileName - where to read config from. If None, configuration will be
+        read from <standard user path>/tickerScrape.<extension>, the most
+        recently saved format (see _DefaultPortfolioFile())
     """
+    global _portfolioFile
+
     if not fileName:
-        # Get the wxPython standard paths
-        sp = wx.StandardPaths.Get()
-        fName = sp.GetUserDataDir() + "/tickerScrape.xml"
+        fName = _DefaultPortfolioFile()
+        _portfolioFile = fName
     else:
         fName = fileName    
 
@@ -191,63 +731,12 @@ def PortfolioReadXml(fileName = None):
     global categoriesDf
 
     try:
-        tree = ET.parse(fName)
-        root = tree.getroot()
-    
-        # Build the holdings list
-        holdingsList = []
-        for i in root.iter('holding'):
-            holdingsList.append(i.attrib)
-
-        holdingsDf = pd.DataFrame.from_dict(holdingsList)
-        holdingsDf.rename(index=str, columns={"account":"Account", "ticker":"Ticker", "units":"Units", "cost-basis":"Cost Basis", "purchase-date":"Purchase Date"}, inplace=True)
-
-        # Order the columns
-        holdingsDf = holdingsDf[["Account",
-                                 "Ticker", 
-                                 "Units", 
-                                 "Cost Basis", 
-                                 "Purchase Date"]]
-    
-        # Build the accounts list
-        accountsList = []
-        for i in root.iter('account'):
-            accountsList.append(i.attrib)
-            
-        accountsDf = pd.DataFrame.from_dict(accountsList)
-        accountsDf.rename(index=str, columns={"name":"Account Name", "number":"Account Number", "type":"Type"}, inplace=True)
-
-        # Order the columns
-        accountsDf = accountsDf[["Account Name", 
-                                 "Account Number", 
-                                 "Type"]]
-
-        # Build the account types list
-        accountTypesList = []
-        for i in root.iter('account-type'):
-            accountTypesList.append(i.attrib)
-
-        accountTypesDf = pd.DataFrame.from_dict(accountTypesList)
-        accountTypesDf.rename(index=str, columns={"type":"Account Type", "long-term-capital-gains-tax":"Long Term Capital Gains Tax", "short-term-capital-gains-tax":"Short Term Capital Gains Tax", "liquidation-tax":"Liquidation Tax"}, inplace=True)
-    
-        # Order the columns
-        accountTypesDf = accountTypesDf[["Account Type", 
-                                         "Long Term Capital Gains Tax", 
-                                         "Short Term Capital Gains Tax", 
-                                         "Liquidation Tax"]]
-    
-        # Build the categories list
-        categoriesList = []
-        for i in root.iter('category'):
-            categoriesList.append(i.attrib)
-
-        categoriesDf = pd.DataFrame.from_dict(categoriesList)
-        categoriesDf.rename(index=str, columns={"name":"Category Name", "group":"Category Group", "benchmark":"Benchmark"}, inplace=True)
+        tables = _ReadTables(fName)
     
-        # Order the columns
-        categoriesDf = categoriesDf[["Category Name", 
-                                     "Category Group", 
-                                     "Benchmark"]]
+        holdingsDf = tables["holding"]
+        accountsDf = tables["account"]
+        accountTypesDf = tables["account-type"]
+        categoriesDf = tables["category"]
     except OSError as e:
         if fileName:
             # Don't set anything
@@ -257,9 +746,9 @@ def PortfolioReadXml(fileName = None):
         holdingsDf = pd.DataFrame.from_dict({
             "Account": ["", ""],
             "Ticker": ["SPY", "FUSEX"],
-            "Units": ["100", "150"],
-            "Cost Basis": ["150000.00", "100.00"],
-            "Purchase Date": ["2/3/2011", "2/4/2011"]
+            "Units": [100.0, 150.0],
+            "Cost Basis": [150000.00, 100.00],
+            "Purchase Date": pd.to_datetime(["2/3/2011", "2/4/2011"], format="%m/%d/%Y")
         })
         
         # Order the columns
@@ -675,6 +1164,9 @@ def PortfolioReadXml(fileName = None):
         categoriesDf = categoriesDf[["Category Name", 
                                      "Category Group", 
                                      "Benchmark"]]
+
+    # Edits of the default portfolio go to its SQLite file as they are made
+    _AttachPortfolioDb(fName if not fileName else None)
         
     if not fileName:
         PortfolioChanged(False)
@@ -682,42 +1174,296 @@ def PortfolioReadXml(fileName = None):
         PortfolioChanged(True)
    
     
-def PortfolioSaveXml(fileName = None):
+# Characters escaped in xml attribute values. Tabs and newlines are
+# escaped too, or they would read back as spaces.
+_xmlEscapes = str.maketrans({
+    "&": "&amp;",
+    "<": "&lt;",
+    ">": "&gt;",
+    "\"": "&quot;",
+    "\t": "&#9;",
+    "\n": "&#10;",
+    "\r": "&#13;",
+})
+
+def _XmlElements(tag, df):
     """
     Description:
-    Save tickerScrape config to fileName in xml format
+    Serialize the rows of a portfolio DataFrame as xml elements, one column
+    at a time.
 
     Parameters:
-    fileName - where to store the xml file. If None, configuration will be
-        stored in <standard user path>/tickerScrape.xml
+    tag - the element tag (see _xmlColumns)
+    df - the DataFrame
+
+    Returns:
+    The xml text, one element per line
     """
+    attrList = _xmlColumns[tag]
+    if not len(df.index):
+        return ""
 
-    if not fileName:
-        # Get the wxPython standard paths
-        sp = wx.StandardPaths.Get()
-        fName = sp.GetUserDataDir() + "/tickerScrape.xml"
-    else:
-        fName = fileName    
+    # Each column as escaped strings, with missing values as "". The column
+    # is escaped in a single translate() of its NUL-joined values (NUL is
+    # not allowed in xml, so it can't be in a value).
+    columns = list()
+    for attr, column in attrList:
+        values = df[column]
+        values = values.where(values.notna(), "").tolist()
+        columns.append("\0".join(map(str, values)).translate(_xmlEscapes).split("\0"))
 
-    with open(fName, "w") as f:
-        f.write("<wx-portfolio version=\"1.0\">\n")
+    template = " <%s %s/>\n" % (tag, " ".join("%s=\"%%s\"" % attr for attr, column in attrList))
 
-        for i in range(holdingsDf.shape[0]):
-            f.write(" <holding account=\"%s\" ticker=\"%s\" units=\"%s\" cost-basis=\"%s\" purchase-date=\"%s\"/>\n" % (holdingsDf.ix[i, "Account"], holdingsDf.ix[i, "Ticker"], holdingsDf.ix[i, "Units"], holdingsDf.ix[i, "Cost Basis"], holdingsDf.ix[i, "Purchase Date"]))
+    return "".join([template % values for values in zip(*columns)])
 
-        for i in range(accountsDf.shape[0]):
-            f.write(" <account name=\"%s\" number=\"%s\" type=\"%s\"/>\n" % (accountsDf.ix[i, "Account Name"], accountsDf.ix[i, "Account Number"], accountsDf.ix[i, "Type"]))
+def _XmlText(tables):
+    """
+    Description:
+    Serialize portfolio DataFrames in tickerScrape xml format
+
+    Parameters:
+    tables - dict of element tag (see _xmlColumns) to DataFrame
+    """
+    tables = _StringTables(tables)
+
+    return "".join(["<wx-portfolio version=\"1.0\">\n"] +
+                   [_XmlElements(tag, tables[tag]) for tag in _xmlColumns] +
+                   ["</wx-portfolio>\n"])
+
+def _ColumnStrings(df, column):
+    """
+    Returns a DataFrame column as a list of strings, with missing values as "".
+    """
+    values = df[column]
+    return [str(value) for value in values.where(values.notna(), "").tolist()]
+
+# The arrays of the unparsed holdings cells (see HoldingsText()) in the
+# binary portfolio files, named "unparsed/<name>"
+_unparsedNames = ("row", "column", "text")
+
+def _UnparsedLists(df):
+    """
+    Returns the unparsed holdings cells as lists of rows, columns and strings.
+    """
+    cells = sorted(df.attrs.get("unparsed", dict()).items())
+    return ([row for (row, column), text in cells],
+            [column for (row, column), text in cells],
+            [text for (row, column), text in cells])
+
+def _SetUnparsed(df, rows, columns, texts):
+    """
+    Sets the unparsed holdings cells from lists of rows, columns and strings.
+    """
+    df.attrs["unparsed"] = dict(((int(row), column), text)
+                                for row, column, text in zip(rows, columns, texts))
+
+def _ArrowBytes(tables):
+    """
+    Description:
+    Serialize portfolio DataFrames as an Arrow IPC file. The file holds a
+    single row, with one list column per DataFrame column, named
+    "<element tag>/<column>" (see _xmlColumns), so that the DataFrames of
+    different lengths share one schema. Number and date columns are stored
+    as float64 and timestamp lists, the others as string lists. The
+    unparsed holdings cells are stored in "unparsed/<name>" columns (see
+    _unparsedNames).
+
+    Parameters:
+    tables - dict of element tag (see _xmlColumns) to DataFrame
+    """
+    def ListArray(values):
+        return pa.ListArray.from_arrays(pa.array([0, len(values)], type=pa.int32()), values)
+
+    arrays = dict()
+    for tag, attrList in _xmlColumns.items():
+        df = tables[tag]
+        for attr, column in attrList:
+            if df[column].dtype == object:
+                values = pa.array(_ColumnStrings(df, column), type=pa.string())
+            else:
+                values = pa.array(df[column].to_numpy(), from_pandas=df[column].dtype.kind == "M")
+            arrays["%s/%s" % (tag, column)] = ListArray(values)
+
+    for name, values, valueType in zip(_unparsedNames, _UnparsedLists(tables["holding"]),
+                                  (pa.int64(), pa.string(), pa.string())):
+        arrays["unparsed/%s" % name] = ListArray(pa.array(values, type=valueType))
+
+    table = pa.table(arrays)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    return sink.getvalue().to_pybytes()
+
+def _SqliteBytes(tables):
+    """
+    Description:
+    Serialize portfolio DataFrames as a SQLite file (see PortfolioDb)
+
+    Parameters:
+    tables - dict of element tag (see _xmlColumns) to DataFrame
+    """
+    tables = _StringTables(tables)
+
+    fd, tmpName = tempfile.mkstemp(suffix=".sqlite")
+    os.close(fd)
+
+    try:
+        db = PortfolioDb.PortfolioDb(tmpName, _xmlColumns)
+        try:
+            db.Replace(tables)
+        finally:
+            db.Close()
+
+        with open(tmpName, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(tmpName)
+
+def _NpzBytes(tables):
+    """
+    Description:
+    Serialize portfolio DataFrames as an uncompressed NumPy .npz file, with
+    one array per DataFrame column, named "<element tag>/<column>" (see
+    _xmlColumns). Number and date columns are stored as float64 and
+    datetime64 arrays, the others as unicode arrays. The unparsed holdings
+    cells are stored in "unparsed/<name>" arrays (see _unparsedNames).
+
+    Parameters:
+    tables - dict of element tag (see _xmlColumns) to DataFrame
+    """
+    arrays = dict()
+    for tag, attrList in _xmlColumns.items():
+        df = tables[tag]
+        for attr, column in attrList:
+            if df[column].dtype == object:
+                arrays["%s/%s" % (tag, column)] = np.array(_ColumnStrings(df, column), dtype=str)
+            else:
+                arrays["%s/%s" % (tag, column)] = df[column].to_numpy()
+
+    for name, values, dtype in zip(_unparsedNames, _UnparsedLists(tables["holding"]),
+                                   (np.int64, str, str)):
+        arrays["unparsed/%s" % name] = np.array(values, dtype=dtype)
+
+    f = io.BytesIO()
+    np.savez(f, **arrays)
+
+    return f.getvalue()
+
+def _WriteFileAtomic(fName, data):
+    """
+    Description:
+    Write a file through a temporary file in the same directory, flushed to
+    disk, then renamed over fName. A crash leaves either the old file or
+    the new one, never a partial file.
+
+    Parameters:
+    fName - the file name
+    data - the file contents, text (written as UTF-8) or bytes
+    """
+    dirName = os.path.dirname(os.path.abspath(fName))
+    fd, tmpName = tempfile.mkstemp(dir=dirName, prefix=".tickerScrape-", suffix=".tmp")
+
+    try:
+        if isinstance(data, bytes):
+            f = os.fdopen(fd, "wb")
+        else:
+            f = os.fdopen(fd, "w", encoding="utf-8")
+
+        with f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # Keep the mode of the file being replaced, else as open() would
+        # create it (mkstemp creates 0600)
+        try:
+            mode = stat.S_IMODE(os.stat(fName).st_mode)
+        except OSError:
+            umask = os.umask(0)
+            os.umask(umask)
+            mode = 0o666 & ~umask
+        os.chmod(tmpName, mode)
+        os.replace(tmpName, fName)
+    except BaseException:
+        try:
+            os.remove(tmpName)
+        except OSError:
+            pass
+        raise
+
+    # Make the rename itself durable (not supported on Windows)
+    try:
+        dirFd = os.open(dirName, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dirFd)
+    except OSError:
+        pass
+    finally:
+        os.close(dirFd)
+
+# The (reader, writer) of each portfolio file extension
+_portfolioFormats = {
+    ".xml": (_ReadXmlTables, _XmlText),
+    ".arrow": (_ReadArrowTables, _ArrowBytes),
+    ".npz": (_ReadNpzTables, _NpzBytes),
+    ".sqlite": (_ReadSqliteTables, _SqliteBytes),
+}
+
+def _AttachPortfolioDb(fName):
+    """
+    Description:
+    Open the PortfolioDb of the default portfolio file, when it is a SQLite
+    file, and close the previous one
+
+    Parameters:
+    fName - the default portfolio file, or None
+    """
+    global _portfolioDb
+
+    if _portfolioDb is not None:
+        _portfolioDb.Close()
+        _portfolioDb = None
+
+    if fName and _PortfolioExtension(fName) == ".sqlite":
+        _portfolioDb = PortfolioDb.PortfolioDb(fName, _xmlColumns)
+
+def PortfolioSaveFile(fileName = None):
+    """
+    Description:
+    Save tickerScrape config to fileName, in the format of its extension
+    (see PortfolioFormats()). Files with other extensions are saved as xml.
 
-        for i in range(accountTypesDf.shape[0]):
-            f.write(" <account-type type=\"%s\" long-term-capital-gains-tax=\"%s\" short-term-capital-gains-tax=\"%s\" liquidation-tax=\"%s\"/>\n" % (accountTypesDf.ix[i, "Account Type"], accountTypesDf.ix[i, "Long Term Capital Gains Tax"], accountTypesDf.ix[i, "Short Term Capital Gains Tax"], accountTypesDf.ix[i, "Liquidation Tax"]))
+    Parameters:
+    fileName - where to store the config. If None, configuration will be
+        stored in the file it was read from, or else in
+        <standard user path>/tickerScrape.xml
+    """
 
-        for i in range(categoriesDf.shape[0]):
-            f.write(" <category name=\"%s\" group=\"%s\" benchmark=\"%s\"/>\n" % (categoriesDf.ix[i, "Category Name"], categoriesDf.ix[i, "Category Group"], categoriesDf.ix[i, "Benchmark"]))
+    if not fileName:
+        fName = _portfolioFile or _DefaultPortfolioFile(".xml")
 
-        f.write("</wx-portfolio>\n")
+        # The edits are already in the SQLite file
+        if _portfolioDb is not None and _portfolioDb.fileName == fName:
+            PortfolioChanged(False)
+            return
+    else:
+        fName = fileName    
 
-        os.chmod(fName, stat.S_IRUSR|stat.S_IWUSR|stat.S_IRGRP|stat.S_IROTH)
+    reader, writer = _PortfolioFormat(fName)
+
+    if _portfolioDb is not None and _portfolioDb.fileName == fName:
+        # Saving over the SQLite file in use
+        _AttachPortfolioDb(None)
+        _WriteFileAtomic(fName, writer(_PortfolioTables()))
+        _AttachPortfolioDb(fName)
+    else:
+        _WriteFileAtomic(fName, writer(_PortfolioTables()))
 
     if not fileName:
+        _AttachPortfolioDb(fName)
         PortfolioChanged(False)
     
@@ -22,3 +22,21 @@ def StringToFloat(s):
         return None
 
     return f
+
+# Convert float to string with thousands separators, "" for a missing number
+def FloatToString(f, decimals = 2):
+
+    # Parameter check
+    if f is None or f != f:
+        return ""
+
+    return "{:,.{}f}".format(f, decimals)
+
+# Convert date to mm/dd/yyyy string, "" for a missing date
+def DateToString(d):
+
+    # Parameter check
+    if d is None or d != d:
+        return ""
+
+    return "{:02d}/{:02d}/{:04d}".format(d.month, d.day, d.year)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+"""
+Times the portfolio save and load on a synthetic portfolio, in each file
+format.
+
+    python src/PortfolioBenchmark.py --holdings 100000
+"""
+
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+from tabulate import tabulate
+import Config
+
+def MakePortfolio(holdings, accounts = 20, tickers = 500):
+    """
+    Description:
+    Fill the Config DataFrames with a synthetic portfolio
+
+    Parameters:
+    holdings - the number of holdings
+    accounts - the number of accounts
+    tickers - the number of distinct tickers
+    """
+    rows = range(holdings)
+
+    Config.holdingsDf = pd.DataFrame({
+        "Account": pd.Series(["Account %d" % (i % accounts) for i in rows], dtype=object),
+        "Ticker": pd.Series(["T%03d" % (i % tickers) for i in rows], dtype=object),
+        "Units": np.arange(holdings) * 1.5,
+        "Cost Basis": np.arange(holdings) * 10.25,
+        "Purchase Date": pd.to_datetime(["%d/%d/2011" % (i % 12 + 1, i % 28 + 1) for i in rows],
+                                        format="%m/%d/%Y"),
+    })
+
+    Config.accountsDf = pd.DataFrame({
+        "Account Name": ["Account %d" % i for i in range(accounts)],
+        "Account Number": [str(100 + i) for i in range(accounts)],
+        "Type": ["Brokerage"] * accounts,
+    }, dtype=object)
+
+    Config.accountTypesDf = pd.DataFrame({
+        "Account Type": ["Brokerage", "IRA"],
+        "Long Term Capital Gains Tax": ["15%", ""],
+        "Short Term Capital Gains Tax": ["35%", ""],
+        "Liquidation Tax": ["", "35%"],
+    }, dtype=object)
+
+    Config.categoriesDf = pd.DataFrame({
+        "Category Name": ["Large Blend", "Intermediate-Term Bond"],
+        "Category Group": ["U.S. Equity", "Taxable Bond"],
+        "Benchmark": ["SPY", "AGG"],
+    }, dtype=object)
+
+def _Time(function, *args):
+    """
+    Returns the (seconds, peak traced bytes) of a call.
+    """
+    start = time.time()
+    function(*args)
+    seconds = time.time() - start
+
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return seconds, peak
+
+def Benchmark(holdings):
+    """
+    Description:
+    Time the save and load of a synthetic portfolio
+
+    Parameters:
+    holdings - the number of holdings
+
+    Returns:
+    DataFrame with the time, peak memory and file size per operation
+    """
+    MakePortfolio(holdings)
+
+    rows = list()
+    with tempfile.TemporaryDirectory() as tmpDir:
+        for description, ext in Config.PortfolioFormats():
+            fName = os.path.join(tmpDir, "tickerScrape" + ext)
+
+            seconds, peak = _Time(Config.PortfolioSaveFile, fName)
+            size = os.path.getsize(fName)
+            rows.append([ext[1:], "save", seconds, peak / 1e6, size / 1e6])
+
+            seconds, peak = _Time(Config.PortfolioReadFile, fName)
+            rows.append([ext[1:], "load", seconds, peak / 1e6, size / 1e6])
+
+    return pd.DataFrame(rows, columns=["Format", "Operation", "Seconds", "Peak MB", "File MB"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Time the portfolio save and load.')
+    parser.add_argument('--holdings', type=int, default=100000, help='Number of holdings (default 100000)')
+    args = parser.parse_args()
+
+    df = Benchmark(args.holdings)
+    print(tabulate(df, headers='keys', tablefmt='psql', showindex=False, floatfmt='.3f'))
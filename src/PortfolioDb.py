@@ -0,0 +1,211 @@
+"""
+SQLite storage for the portfolio.
+"""
+
+import sqlite3
+import pandas as pd
+
+#---------------------------------------------------------------------------
+# The SQL name of an xml element tag or attribute, quoted ("group" is an
+# SQL keyword)
+def _SqlName(name, suffix = ""):
+    return '"%s%s"' % (name.replace("-", "_"), suffix)
+
+# The indexed columns of each table, as xml (element tag, attribute)
+_indexes = [
+    ("holding", "account"),
+    ("holding", "ticker"),
+    ("account", "name"),
+    ("account", "type"),
+    ("account-type", "type"),
+    ("category", "name"),
+]
+
+class PortfolioDb(object):
+    """
+    The portfolio DataFrames stored in a SQLite database, one table per
+    DataFrame, with the rows in DataFrame order.
+
+    Each edit is written in its own transaction, so that saving a single
+    change does not rewrite the portfolio.
+    """
+    def __init__(self, fileName, columns):
+        """
+        Parameters:
+        fileName - the SQLite file, created if it does not exist
+        columns - dict of xml element tag to the (attribute, DataFrame
+            column) pairs of its DataFrame (see Config._xmlColumns)
+        """
+        self.fileName = fileName
+        self.columns = columns
+
+        self._db = sqlite3.connect(fileName)
+
+        with self._db:
+            for tag, attrList in columns.items():
+                table = _SqlName(tag)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS %s (position INTEGER NOT NULL, %s)" %
+                    (table, ", ".join("%s TEXT" % _SqlName(attr) for attr, column in attrList)))
+                self._db.execute(
+                    "CREATE INDEX IF NOT EXISTS %s ON %s (position)" %
+                    (_SqlName(tag, "_position_index"), table))
+
+            for tag, attr in _indexes:
+                self._db.execute(
+                    "CREATE INDEX IF NOT EXISTS %s ON %s (%s)" %
+                    (_SqlName(tag, "_%s_index" % attr.replace("-", "_")), _SqlName(tag), _SqlName(attr)))
+
+    def _Attributes(self, tag):
+        return [_SqlName(attr) for attr, column in self.columns[tag]]
+
+    def Close(self):
+        self._db.close()
+
+    def Frame(self, tag):
+        """
+        Description:
+        Materialize the DataFrame of a table
+
+        Parameters:
+        tag - the xml element tag of the table
+
+        Returns:
+        DataFrame with the Config column names, in row order
+        """
+        rows = self._db.execute(
+            "SELECT %s FROM %s ORDER BY position" %
+            (", ".join(self._Attributes(tag)), _SqlName(tag))).fetchall()
+
+        names = [column for attr, column in self.columns[tag]]
+        return pd.DataFrame(rows, columns=names, dtype=object)
+
+    def Frames(self):
+        """
+        Returns the DataFrames of all the tables, as a dict of element tag
+        to DataFrame.
+        """
+        return dict((tag, self.Frame(tag)) for tag in self.columns)
+
+    def Replace(self, tables):
+        """
+        Description:
+        Replace the contents of all the tables, in a single transaction
+
+        Parameters:
+        tables - dict of element tag to DataFrame
+        """
+        with self._db:
+            for tag, df in tables.items():
+                table = _SqlName(tag)
+                attrs = self._Attributes(tag)
+                names = [column for attr, column in self.columns[tag]]
+
+                values = df[names].astype(object)
+                values = values.where(values.notna(), None)
+
+                self._db.execute("DELETE FROM %s" % table)
+                self._db.executemany(
+                    "INSERT INTO %s (position, %s) VALUES (?, %s)" %
+                    (table, ", ".join(attrs), ", ".join("?" * len(attrs))),
+                    [(position,) + tuple(row) for position, row in
+                     enumerate(values.itertuples(index=False, name=None))])
+
+    def SetValue(self, tag, row, col, value):
+        """
+        Description:
+        Set the value of a cell
+
+        Parameters:
+        tag - the xml element tag of the table
+        row - the row number
+        col - the column number, in DataFrame order
+        value - the new value
+        """
+        with self._db:
+            self._db.execute(
+                "UPDATE %s SET %s = ? WHERE position = ?" %
+                (_SqlName(tag), self._Attributes(tag)[col]),
+                (value, row))
+
+    def AddRow(self, tag, row, values):
+        """
+        Description:
+        Add a row
+
+        Parameters:
+        tag - the xml element tag of the table
+        row - the row number, after the last row
+        values - the row values, in DataFrame column order
+        """
+        attrs = self._Attributes(tag)
+
+        with self._db:
+            self._db.execute(
+                "INSERT INTO %s (position, %s) VALUES (?, %s)" %
+                (_SqlName(tag), ", ".join(attrs), ", ".join("?" * len(attrs))),
+                [row] + list(values))
+
+    def DeleteRows(self, tag, rows):
+        """
+        Description:
+        Delete rows, and renumber the rows after them
+
+        Parameters:
+        tag - the xml element tag of the table
+        rows - the row numbers
+        """
+        if not rows:
+            return
+
+        table = _SqlName(tag)
+        rows = sorted(set(rows))
+
+        with self._db:
+            self._db.execute(
+                "DELETE FROM %s WHERE position IN (%s)" % (table, ",".join("?" * len(rows))),
+                rows)
+
+            # Shift each range of rows between deleted rows at once
+            for shift, row in enumerate(rows, 1):
+                end = rows[shift] if shift < len(rows) else None
+                if end is None:
+                    self._db.execute(
+                        "UPDATE %s SET position = position - ? WHERE position > ?" % table,
+                        (shift, row))
+                else:
+                    self._db.execute(
+                        "UPDATE %s SET position = position - ? WHERE position > ? AND position < ?" % table,
+                        (shift, row, end))
+
+    def SwapRows(self, tag, row1, row2):
+        """
+        Description:
+        Swap two rows
+
+        Parameters:
+        tag - the xml element tag of the table
+        row1, row2 - the row numbers
+        """
+        with self._db:
+            self._db.execute(
+                "UPDATE %s SET position = CASE position WHEN ? THEN ? ELSE ? END "
+                "WHERE position IN (?, ?)" % _SqlName(tag),
+                (row1, row2, row1, row1, row2))
+
+    def Rename(self, changes):
+        """
+        Description:
+        Replace values in columns, e.g. an account name in the accounts and
+        the holdings, in a single transaction. Uses the column indexes.
+
+        Parameters:
+        changes - list of (tag, attribute, old value, new value), with the
+            xml element tag and attribute of the column
+        """
+        with self._db:
+            for tag, attr, old, new in changes:
+                self._db.execute(
+                    "UPDATE %s SET %s = ? WHERE %s = ?" %
+                    (_SqlName(tag), _SqlName(attr), _SqlName(attr)),
+                    (new, old))
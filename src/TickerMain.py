@@ -2588,8 +2588,7 @@ class TickerScrapeFrame(wx.Frame):
 
     # Menu methods
     def OnFileLoad(self, *event):
-        wildcard = "XML files (*.xml)|*.xml|" \
-                   "All files (*.*)|*.*"
+        wildcard, extensions = Config.PortfolioWildcard()
         
         # Create the dialog
         dlg = wx.FileDialog(
@@ -2609,7 +2608,7 @@ class TickerScrapeFrame(wx.Frame):
             # This returns a Python list of files that were selected.
             paths = dlg.GetPaths()
             
-            Config.PortfolioReadXml(paths[0])
+            Config.PortfolioReadFile(paths[0])
 
             self.SetStatusBarText("Portfolio loaded from '%s'" % paths[0])
 
@@ -2622,8 +2621,7 @@ class TickerScrapeFrame(wx.Frame):
         self.SetStatusBarText("Portfolio saved")
 
     def OnFileSaveAs(self, *event):
-        wildcard = "XML files (*.xml)|*.xml|" \
-                   "All files (*.*)|*.*"
+        wildcard, extensions = Config.PortfolioWildcard()
 
         # Create the dialog.
         dlg = wx.FileDialog(
@@ -2637,14 +2635,21 @@ class TickerScrapeFrame(wx.Frame):
 
         # This sets the default filter that the user will initially see. 
         # Otherwise, the first filter in the list will be used by default.
-        dlg.SetFilterIndex(0)
+        dlg.SetFilterIndex(extensions.index(".xml"))
         
         # Show the dialog and retrieve the user response. If it is 
         # the OK response, process the data.
         if dlg.ShowModal() == wx.ID_OK:
             path = dlg.GetPath()
+
+            # Save in the format of the selected filter, unless the file
+            # name has the extension of another format
+            index = dlg.GetFilterIndex()
+            if index < len(extensions) and \
+               os.path.splitext(path)[1].lower() not in extensions:
+                path += extensions[index]
             
-            Config.PortfolioSaveXml(path)
+            Config.PortfolioSaveFile(path)
 
             self.SetStatusBarText("Portfolio saved to %s" % path)
 
@@ -73,8 +73,7 @@ class AccountTypesModel(dv.DataViewIndexListModel):
                 return ret
             else:
                 # Simple change of values
-                Config.accountTypesDf.iloc[row, dataFrameCol] = value
-                Config.PortfolioChanged(True)
+                Config.PortfolioSetValue("account-type", row, dataFrameCol, value)
 
             return True
 
@@ -110,7 +109,7 @@ class AccountTypesModel(dv.DataViewIndexListModel):
     def AddRow(self, id, value):
         #self.log.write('AddRow(%s)' % value)
         # update data structure
-        Config.accountTypesDf.loc[id-1] = value
+        Config.PortfolioAddRow("account-type", value)
         # notify views
         self.RowAppended()
 
@@ -118,9 +117,7 @@ class AccountTypesModel(dv.DataViewIndexListModel):
         #self.log.write('DeleteRows(%s)' % rows)
 
         # Drop the list of rows from the dataframe
-        Config.accountTypesDf.drop(rows, inplace=True)
-        # Reset the dataframe index, and don't add an index column
-        Config.accountTypesDf.reset_index(inplace=True, drop=True)
+        Config.PortfolioDeleteRows("account-type", rows)
 
         # notify the view(s) using this model that it has been removed
         self.Reset(Config.accountTypesDf.shape[0])        
@@ -130,11 +127,7 @@ class AccountTypesModel(dv.DataViewIndexListModel):
 
         if rows:
             for row in rows:
-                a = Config.accountTypesDf.iloc[row-1].copy()
-                b = Config.accountTypesDf.iloc[row].copy()
-                Config.accountTypesDf.iloc[row-1] = b
-                Config.accountTypesDf.iloc[row] = a
-                Config.PortfolioChanged(True)
+                Config.PortfolioSwapRows("account-type", row-1, row)
 
             # notify the view(s) using this model that it has been removed
             self.Reset(Config.accountTypesDf.shape[0])        
@@ -144,11 +137,7 @@ class AccountTypesModel(dv.DataViewIndexListModel):
 
         if rows:
             for row in rows:
-                a = Config.accountTypesDf.iloc[row+1].copy()
-                b = Config.accountTypesDf.iloc[row].copy()
-                Config.accountTypesDf.iloc[row+1] = b
-                Config.accountTypesDf.iloc[row] = a
-                Config.PortfolioChanged(True)
+                Config.PortfolioSwapRows("account-type", row+1, row)
 
             # notify the view(s) using this model that it has been removed
             self.Reset(Config.accountTypesDf.shape[0])        
@@ -73,8 +73,7 @@ class AccountsModel(dv.DataViewIndexListModel):
                 return ret
             else:
                 # Simple change of values
-                Config.accountsDf.iloc[row, dataFrameCol] = value
-                Config.PortfolioChanged(True)
+                Config.PortfolioSetValue("account", row, dataFrameCol, value)
 
             return True
 
@@ -115,7 +114,7 @@ class AccountsModel(dv.DataViewIndexListModel):
     def AddRow(self, id, value):
         #self.log.write('AddRow(%s)' % value)
         # update data structure
-        Config.accountsDf.loc[id-1] = value
+        Config.PortfolioAddRow("account", value)
         # notify views
         self.RowAppended()
 
@@ -123,9 +122,7 @@ class AccountsModel(dv.DataViewIndexListModel):
         #self.log.write('DeleteRows(%s)' % rows)
 
         # Drop the list of rows from the dataframe
-        Config.accountsDf.drop(rows, inplace=True)
-        # Reset the dataframe index, and don't add an index column
-        Config.accountsDf.reset_index(inplace=True, drop=True)
+        Config.PortfolioDeleteRows("account", rows)
 
         # notify the view(s) using this model that it has been removed
         self.Reset(Config.accountsDf.shape[0])        
@@ -135,11 +132,7 @@ class AccountsModel(dv.DataViewIndexListModel):
 
         if rows:
             for row in rows:
-                a = Config.accountsDf.iloc[row-1].copy()
-                b = Config.accountsDf.iloc[row].copy()
-                Config.accountsDf.iloc[row-1] = b
-                Config.accountsDf.iloc[row] = a
-                Config.PortfolioChanged(True)
+                Config.PortfolioSwapRows("account", row-1, row)
 
             # notify the view(s) using this model that it has been removed
             self.Reset(Config.accountsDf.shape[0])        
@@ -149,11 +142,7 @@ class AccountsModel(dv.DataViewIndexListModel):
 
         if rows:
             for row in rows:
-                a = Config.accountsDf.iloc[row+1].copy()
-                b = Config.accountsDf.iloc[row].copy()
-                Config.accountsDf.iloc[row+1] = b
-                Config.accountsDf.iloc[row] = a
-                Config.PortfolioChanged(True)
+                Config.PortfolioSwapRows("account", row+1, row)
 
             # notify the view(s) using this model that it has been removed
             self.Reset(Config.accountsDf.shape[0])        
@@ -72,8 +72,7 @@ class CategoriesModel(dv.DataViewIndexListModel):
                 return ret
             else:
                 # Simple change of values
-                Config.categoriesDf.iloc[row, dataFrameCol] = value
-                Config.PortfolioChanged(True)
+                Config.PortfolioSetValue("category", row, dataFrameCol, value)
 
             return True
 
@@ -109,7 +108,7 @@ class CategoriesModel(dv.DataViewIndexListModel):
     def AddRow(self, id, value):
         #self.log.write('AddRow(%s)' % value)
         # update data structure
-        Config.categoriesDf.loc[id-1] = value
+        Config.PortfolioAddRow("category", value)
         # notify views
         self.RowAppended()
 
@@ -117,9 +116,7 @@ class CategoriesModel(dv.DataViewIndexListModel):
         #self.log.write('DeleteRows(%s)' % rows)
 
         # Drop the list of rows from the dataframe
-        Config.categoriesDf.drop(rows, inplace=True)
-        # Reset the dataframe index, and don't add an index column
-        Config.categoriesDf.reset_index(inplace=True, drop=True)
+        Config.PortfolioDeleteRows("category", rows)
 
         # notify the view(s) using this model that it has been removed
         self.Reset(Config.categoriesDf.shape[0])        
@@ -129,11 +126,7 @@ class CategoriesModel(dv.DataViewIndexListModel):
 
         if rows:
             for row in rows:
-                a = Config.categoriesDf.iloc[row-1].copy()
-                b = Config.categoriesDf.iloc[row].copy()
-                Config.categoriesDf.iloc[row-1] = b
-                Config.categoriesDf.iloc[row] = a
-                Config.PortfolioChanged(True)
+                Config.PortfolioSwapRows("category", row-1, row)
 
             # notify the view(s) using this model that it has been removed
             self.Reset(Config.categoriesDf.shape[0])        
@@ -143,11 +136,7 @@ class CategoriesModel(dv.DataViewIndexListModel):
 
         if rows:
             for row in rows:
-                a = Config.categoriesDf.iloc[row+1].copy()
-                b = Config.categoriesDf.iloc[row].copy()
-                Config.categoriesDf.iloc[row+1] = b
-                Config.categoriesDf.iloc[row] = a
-                Config.PortfolioChanged(True)
+                Config.PortfolioSwapRows("category", row+1, row)
 
             # notify the view(s) using this model that it has been removed
             self.Reset(Config.categoriesDf.shape[0])        
@@ -4,6 +4,7 @@
 import wx
 import wx.dataview as dv
 import os, sys
+import numpy as np
 import pandas as pd
 import Config
 import Format
@@ -53,6 +54,10 @@ class HoldingsModel(dv.DataViewIndexListModel):
         dv.DataViewIndexListModel.__init__(self, Config.holdingsDf.shape[0])
         self.log = log
 
+        # Load the known ticker names in one go, without the network
+        tickers = Config.holdingsDf["Ticker"].dropna().astype(str).str.upper()
+        morningstar.preload(tickers.unique().tolist())
+
     # Convert model column to data frame column
     def _GetDataFrameCol(self, modelCol):
         dataFrameCol = None
@@ -109,12 +114,24 @@ class HoldingsModel(dv.DataViewIndexListModel):
         
         value = ""
         if dataFrameCol is not None:
-            value = str(Config.holdingsDf.iloc[row, dataFrameCol])
+            value = Config.holdingsDf.iloc[row, dataFrameCol]
+
+        if col == _GetColumnIdx("Units"):
+            value = Format.FloatToString(value, 3)
+        elif col == _GetColumnIdx("Cost Basis"):
+            value = Format.FloatToString(value, 2)
 
-        if col == _GetColumnIdx("Cost Basis"):
             # Prepend a dollar sign
             if value != "":
                 value = "$" + value
+        elif col == _GetColumnIdx("Purchase Date"):
+            value = Format.DateToString(value)
+        else:
+            value = str(value)
+
+        if value == "" and dataFrameCol is not None:
+            # Show the file's string of a cell that couldn't be read
+            value = Config.HoldingsText(row, Config.holdingsDf.columns[dataFrameCol])
             
         #self.log.write("GetValue: (%d,%d) %s\n" % (row, col, value))
         return value
@@ -130,8 +147,7 @@ class HoldingsModel(dv.DataViewIndexListModel):
             return False
 
         if dataFrameCol is not None:
-            Config.holdingsDf.iloc[row, dataFrameCol] = parsedValue
-            Config.PortfolioChanged(True)
+            Config.PortfolioSetValue("holding", row, dataFrameCol, parsedValue)
             return True
 
         return False
@@ -153,7 +169,7 @@ class HoldingsModel(dv.DataViewIndexListModel):
                 self.log.write("Invalid number of units '%s'\n" % (value))
                 return None
                 
-            value = "{:,.3f}".format(f)
+            value = f
 
         elif col == _GetColumnIdx("Cost Basis"):
             f = Format.StringToFloat(value)
@@ -161,14 +177,13 @@ class HoldingsModel(dv.DataViewIndexListModel):
                 self.log.write("Invalid cost basis '%s', enter a dollar amount\n" % (value))
                 return None
                 
-            value = "{:,.2f}".format(f)
+            value = f
 
         elif col == _GetColumnIdx("Purchase Date"):
             try:
                 dt = wx.DateTime()
                 dt.ParseDate(value)
-                date = "{:02d}/{:02d}/{:04d}".format(dt.GetMonth()+1, dt.GetDay(), dt.GetYear())
-                value = date
+                value = pd.Timestamp(dt.GetYear(), dt.GetMonth()+1, dt.GetDay())
             except:
                 self.log.write("Invalid date format '%s', enter date as mm/dd/yyyy.\n" % (value))
                 return None                
@@ -198,7 +213,7 @@ class HoldingsModel(dv.DataViewIndexListModel):
     def AddRow(self, id, value):
         #self.log.write('AddRow(%s)' % value)
         # update data structure
-        Config.holdingsDf.loc[id-1] = value
+        Config.PortfolioAddRow("holding", value)
         # notify views
         self.RowAppended()
 
@@ -206,9 +221,7 @@ class HoldingsModel(dv.DataViewIndexListModel):
         #self.log.write('DeleteRows(%s)' % rows)
 
         # Drop the list of rows from the dataframe
-        Config.holdingsDf.drop(rows, inplace=True)
-        # Reset the dataframe index, and don't add an index column
-        Config.holdingsDf.reset_index(inplace=True, drop=True)
+        Config.PortfolioDeleteRows("holding", rows)
 
         # notify the view(s) using this model that it has been removed
         self.Reset(Config.holdingsDf.shape[0])        
@@ -218,11 +231,7 @@ class HoldingsModel(dv.DataViewIndexListModel):
 
         if rows:
             for row in rows:
-                a = Config.holdingsDf.iloc[row-1].copy()
-                b = Config.holdingsDf.iloc[row].copy()
-                Config.holdingsDf.iloc[row-1] = b
-                Config.holdingsDf.iloc[row] = a
-                Config.PortfolioChanged(True)
+                Config.PortfolioSwapRows("holding", row-1, row)
 
             # notify the view(s) using this model that it has been removed
             self.Reset(Config.holdingsDf.shape[0])        
@@ -232,11 +241,7 @@ class HoldingsModel(dv.DataViewIndexListModel):
 
         if rows:
             for row in rows:
-                a = Config.holdingsDf.iloc[row+1].copy()
-                b = Config.holdingsDf.iloc[row].copy()
-                Config.holdingsDf.iloc[row+1] = b
-                Config.holdingsDf.iloc[row] = a
-                Config.PortfolioChanged(True)
+                Config.PortfolioSwapRows("holding", row+1, row)
 
             # notify the view(s) using this model that it has been removed
             self.Reset(Config.holdingsDf.shape[0])        
@@ -375,7 +380,7 @@ class HoldingsPanel(wx.Panel):
         # Add some bogus data to a new row in the model's data
         id = len(Config.holdingsDf) + 1
         #self.log.write("OnAddRow() id %d\n" % id)
-        value = ["", "New ticker", "", "", ""]
+        value = ["", "New ticker", np.nan, np.nan, pd.NaT]
         self.model.AddRow(id, value)
 
         # Clear the selection
@@ -20,97 +20,40 @@ def GetWindow(frame, nb, log):
         Config.GetHoldings()
 
     # Make an account list
-    accountList = list()
+    accountList = Config.accountsDf["Account Name"].drop_duplicates().tolist()
 
-    for i in range(Config.accountsDf.shape[0]):
-        account = Config.accountsDf.ix[i, "Account Name"]
-        
-        if account in accountList:
-            continue
+    # Sum the units and cost basis per account and ticker. A sum is unset
+    # if any of its holdings is unset.
+    groups = Config.holdingsDf.groupby(["Account", "Ticker"], sort=False)
+    sums = groups[["Units", "Cost Basis"]].sum()
+    sums = sums.mask(groups[["Units", "Cost Basis"]].count().ne(groups.size(), axis=0))
+    sums["Per Share"] = sums["Cost Basis"] / sums["Units"].where(sums["Units"] != 0)
 
-        accountList.append(account)
+    sumsAccounts = set(sums.index.get_level_values("Account"))
 
-    # Make list of per-account tickers
-    tickerList = list()
+    # Create the performance rows
+    rows = list()
+    for account in accountList:
+        rows.append([account, "", "", "", ""])
 
-    # For each ticker in the config...
-    for i in range(Config.holdingsDf.shape[0]):
-        ticker = Config.holdingsDf.ix[i, "Ticker"]
+        if account in sumsAccounts:
+            for ticker, units, costBasis, perShare in sums.loc[account].itertuples():
+                name = morningstar.ticker_name(str(ticker).upper())
 
-        if ticker in tickerList:
-            continue
+                if perShare == perShare:
+                    perShareString = "$" + Format.FloatToString(perShare, 2) + "/Share"
+                    costBasisString = " $" + Format.FloatToString(costBasis, 2)
+                else:
+                    perShareString = ""
+                    costBasisString = ""
 
-        tickerList.append(ticker)
+                rows.append([ticker, "", Format.FloatToString(units, 3), "", perShareString])
+                rows.append([" " + (name or ""), "", "", "", costBasisString])
 
-    # Create a performance dataframe
-    pf = pd.DataFrame(index = np.arange(0, len(accountList) + len(tickerList)),
-                      columns = ["Ticker", "Last Price", "Units", "Current Value", "Cost Basis"])
+        rows.append(["", "", "", "", ""])
 
-    row = 0
-    for account in accountList:
-        pf.ix[row, "Ticker"] = account
-        pf.ix[row, "Last Price"] = ""
-        pf.ix[row, "Units"] = ""
-        pf.ix[row, "Current Value"] = ""
-        pf.ix[row, "Cost Basis"] = ""
-        row = row+1
-        for i in range(Config.holdingsDf.shape[0]):
-            if Config.holdingsDf.ix[i, "Account"] != account:
-                continue
-            
-            pf.ix[row, "Ticker"] = ticker
-            pf.ix[row+1, "Ticker"] = " " + morningstar.ticker_name(ticker.upper())
-
-            # Compute the units
-            units = 0
-            unitsSet = True
-            costBasis = 0
-            costBasisSet = True
-            
-            for j in range(Config.holdingsDf.shape[0]):
-                if Config.holdingsDf.ix[j, "Ticker"] != ticker:
-                    continue
-                if Config.holdingsDf.ix[j, "Account"] != account:
-                    continue
-
-                units1 = Config.holdingsDf.ix[j, "Units"]
-                costBasis1 = Config.holdingsDf.ix[j, "Cost Basis"]
-
-                if units1:
-                    units = units + Format.StringToFloat(units1)
-                else:
-                    unitsSet = False
-                if costBasis1:
-                    costBasis = costBasis + Format.StringToFloat(costBasis1)
-                else:
-                    costBasisSet = False
-
-            if unitsSet:
-                pf.ix[row, "Units"] = "{:,.3f}".format(units)
-            else:
-                pf.ix[row, "Units"] = ""
-            pf.ix[row+1, "Units"] = ""
-            
-            pf.ix[row, "Last Price"] = ""
-            pf.ix[row+1, "Last Price"] = ""
-
-            pf.ix[row, "Current Value"] = ""
-            pf.ix[row+1, "Current Value"] = ""
-
-            if unitsSet and units and costBasisSet:
-                pf.ix[row, "Cost Basis"] = "$" + "{:,.2f}".format(costBasis/units) + "/Share"
-                pf.ix[row+1, "Cost Basis"] = " $" + "{:,.2f}".format(costBasis, 2)
-            else:
-                pf.ix[row, "Cost Basis"] = ""
-            
-            row = row+2
-    
-        pf.ix[row, "Ticker"] = ""
-        pf.ix[row, "Last Price"] = ""
-        pf.ix[row, "Units"] = ""
-        pf.ix[row, "Current Value"] = ""
-        pf.ix[row, "Cost Basis"] = ""
-        row = row+1
+    # Create a performance dataframe
+    pf = pd.DataFrame(rows, columns = ["Ticker", "Last Price", "Units", "Current Value", "Cost Basis"])
 
     # Promote 1st column as new index
     pf2 = pf.set_index("Ticker")
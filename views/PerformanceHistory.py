@@ -17,26 +17,26 @@ def GetWindow(frame, nb, log):
     if Config.holdingsDf is None:
         Config.GetHoldings()
 
-    # Get the SPY performance history
-    pfh1 = morningstar.performance_history("SPY")
+    # The holdings tickers, in order
+    tickerList = list(Config.holdingsDf["Ticker"].drop_duplicates())
 
-    # Remove last row
-    pfh = pfh1.drop(pfh1.index[[0]])
+    # Get the SPY and holdings performance in one go
+    panel, failed = morningstar.performance_history_many(["SPY"] + tickerList)
+    for ticker in failed:
+        log.write("%s: %s\n" % (ticker, failed[ticker]))
 
-    tickerList = list()
+    frames = list()
 
-    # For each ticker in the config...
-    for i in range(Config.holdingsDf.shape[0]):
-        ticker = Config.holdingsDf.ix[i, "Ticker"]
-        
-        if ticker in tickerList:
-            continue
+    # Remove the SPY row, keep its benchmark row
+    if "SPY" in panel.index.get_level_values(0):
+        pfh1 = panel.loc["SPY"]
+        frames.append(pfh1.drop(pfh1.index[[0]]))
 
-        tickerList.append(ticker)
+    for ticker in tickerList:
+        if ticker not in failed:
+            frames.append(panel.loc[ticker])
 
-        df = morningstar.performance_history(ticker)
-        if df is not None:
-            pfh = pfh.append(df)
+    pfh = pd.concat(frames) if frames else pd.DataFrame()
 
     # Revert the column order so the most recent performance is displayed
     # on left
@@ -17,27 +17,27 @@ def GetWindow(frame, nb, log):
     if Config.holdingsDf is None:
         Config.GetHoldings()
 
-    # Get the SPY performance history
-    pfh1 = morningstar.trailing_total_returns("SPY")
+    # The holdings tickers, in order
+    tickerList = list(Config.holdingsDf["Ticker"].drop_duplicates())
 
-    # Remove last row
-    pfh = pfh1.drop(pfh1.index[[0]])
+    # Get the SPY and holdings performance in one go
+    panel, failed = morningstar.trailing_total_returns_many(["SPY"] + tickerList)
+    for ticker in failed:
+        log.write("%s: %s\n" % (ticker, failed[ticker]))
 
-    tickerList = list()
+    frames = list()
 
-    # For each ticker in the config...
-    for i in range(Config.holdingsDf.shape[0]):
-        ticker = Config.holdingsDf.ix[i, "Ticker"]
-        
-        if ticker in tickerList:
-            continue
+    # Remove the SPY row, keep its benchmark row
+    if "SPY" in panel.index.get_level_values(0):
+        pfh1 = panel.loc["SPY"]
+        frames.append(pfh1.drop(pfh1.index[[0]]))
 
-        tickerList.append(ticker)
+    for ticker in tickerList:
+        if ticker not in failed:
+            frames.append(panel.loc[ticker])
+
+    pfh = pd.concat(frames) if frames else pd.DataFrame()
 
-        df = morningstar.trailing_total_returns(ticker)
-        if df is not None:
-            pfh = pfh.append(df)
-            
     win = DataFrameViewCtrl.Panel(nb, pfh, log)
     return win
 